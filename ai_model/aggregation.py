@@ -0,0 +1,282 @@
+"""
+Vectorized Aggregation for WeatherEyes
+Analizy w kolumnach NumPy, kalibracja pewności per źródło i posterior
+warunków pogodowych ważony pewnością i świeżością - bez pętli po słownikach
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+CONDITIONS = ('sunny', 'cloudy', 'rainy', 'snow', 'stormy', 'foggy', 'clear')
+CONDITION_CODES = {name: code for code, name in enumerate(CONDITIONS)}
+UNKNOWN = -1
+
+AGGREGATION_HALF_LIFE_S = float(os.getenv('AGGREGATION_HALF_LIFE_S', '1800'))
+CALIBRATION_PATH = os.getenv('CALIBRATION_PATH', 'data/calibration.json')
+
+# Pewność po kalibracji trzymana z dala od 0 i 1 (log pool)
+_EPS = 1e-4
+
+
+def _epoch(value) -> float:
+    if value is None:
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return np.nan
+
+
+class AnalysisColumns:
+    """
+    Kolumnowy bufor analiz: kod warunku (int8), pewność (float32), czas (float64),
+    kod źródła (int16) i waga próbkowania (float32). Dopisywanie z rezerwą pojemności
+    (podwajanie), odczyt jako widoki bez kopiowania.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self._condition = np.empty(capacity, dtype=np.int8)
+        self._confidence = np.empty(capacity, dtype=np.float32)
+        self._timestamp = np.empty(capacity, dtype=np.float64)
+        self._source = np.empty(capacity, dtype=np.int16)
+        self._weight = np.empty(capacity, dtype=np.float32)
+        self.sources: List[str] = []
+        self._source_codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @classmethod
+    def from_analyses(cls, analyses: Iterable[Dict]) -> 'AnalysisColumns':
+        columns = cls()
+        columns.extend(analyses)
+        return columns
+
+    def source_code(self, source: str) -> int:
+        code = self._source_codes.get(source)
+        if code is None:
+            code = self._source_codes[source] = len(self.sources)
+            self.sources.append(source)
+        return code
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed <= len(self._condition):
+            return
+        capacity = max(needed, 2 * len(self._condition))
+        for name in ('_condition', '_confidence', '_timestamp', '_source', '_weight'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def extend(self, analyses: Iterable[Dict]):
+        """Dopisuje wyniki analiz (słowniki z OpenAIVisionAnalyzer)"""
+        analyses = list(analyses)
+        count = len(analyses)
+        self._reserve(count)
+        start, end = self._size, self._size + count
+        self._condition[start:end] = np.fromiter(
+            (CONDITION_CODES.get(a.get('weather_condition'), UNKNOWN) for a in analyses), np.int8, count)
+        self._confidence[start:end] = np.fromiter(
+            (a.get('confidence', 0.0) or 0.0 for a in analyses), np.float32, count)
+        self._timestamp[start:end] = np.fromiter(
+            (_epoch(a.get('timestamp')) for a in analyses), np.float64, count)
+        self._source[start:end] = np.fromiter(
+            (self.source_code(a.get('source', 'unknown')) for a in analyses), np.int16, count)
+        self._weight[start:end] = np.fromiter(
+            (a.get('sampling_weight', 1.0) for a in analyses), np.float32, count)
+        self._size = end
+
+    def extend_arrays(self, condition: np.ndarray, confidence: np.ndarray, timestamp: np.ndarray,
+                      source: np.ndarray, weight: Optional[np.ndarray] = None):
+        """Dopisuje gotowe kolumny (kody źródeł wg self.sources)"""
+        count = len(condition)
+        self._reserve(count)
+        start, end = self._size, self._size + count
+        self._condition[start:end] = condition
+        self._confidence[start:end] = confidence
+        self._timestamp[start:end] = timestamp
+        self._source[start:end] = source
+        self._weight[start:end] = 1.0 if weight is None else weight
+        self._size = end
+
+    @property
+    def condition(self) -> np.ndarray:
+        return self._condition[:self._size]
+
+    @property
+    def confidence(self) -> np.ndarray:
+        return self._confidence[:self._size]
+
+    @property
+    def timestamp(self) -> np.ndarray:
+        return self._timestamp[:self._size]
+
+    @property
+    def source(self) -> np.ndarray:
+        return self._source[:self._size]
+
+    @property
+    def weight(self) -> np.ndarray:
+        return self._weight[:self._size]
+
+
+class CalibrationCurves:
+    """
+    Krzywe kalibracji per źródło: odcinkowo liniowe, monotoniczne mapowanie
+    zgłoszonej pewności na empiryczną trafność. Źródła bez krzywej - bez zmian.
+    """
+
+    def __init__(self, curves: Optional[Dict[str, Dict[str, List[float]]]] = None):
+        self.curves = curves or {}
+
+    def calibrate(self, confidence: np.ndarray, source: np.ndarray, sources: List[str]) -> np.ndarray:
+        """Skalibrowana pewność; jedno np.interp na źródło, nie na analizę"""
+        result = confidence.astype(np.float64)
+        for code in np.unique(source):
+            curve = self.curves.get(sources[code])
+            if curve:
+                mask = source == code
+                result[mask] = np.interp(result[mask], curve['x'], curve['y'])
+        return result
+
+    def fit(self, source_name: str, confidence: np.ndarray, correct: np.ndarray, bins: int = 10):
+        """
+        Krzywa z danych oznaczonych (pewność, czy trafne): trafność w przedziałach
+        pewności, wymuszona monotoniczność (pool adjacent violators).
+        """
+        confidence = np.asarray(confidence, dtype=np.float64)
+        correct = np.asarray(correct, dtype=np.float64)
+        edges = np.linspace(0.0, 1.0, bins + 1)
+        index = np.clip(np.digitize(confidence, edges) - 1, 0, bins - 1)
+        counts = np.bincount(index, minlength=bins).astype(np.float64)
+        hits = np.bincount(index, weights=correct, minlength=bins)
+        filled = counts > 0
+        x = ((edges[:-1] + edges[1:]) / 2)[filled]
+        y, n = (hits[filled] / counts[filled]).tolist(), counts[filled].tolist()
+
+        # Pool adjacent violators - trafność nie może spadać ze wzrostem pewności
+        blocks = []
+        for value, weight in zip(y, n):
+            blocks.append([value, weight, 1])
+            while len(blocks) > 1 and blocks[-2][0] > blocks[-1][0]:
+                v2, w2, c2 = blocks.pop()
+                v1, w1, c1 = blocks.pop()
+                blocks.append([(v1 * w1 + v2 * w2) / (w1 + w2), w1 + w2, c1 + c2])
+        monotone = [value for value, _, size in blocks for _ in range(size)]
+
+        self.curves[source_name] = {'x': [0.0] + x.tolist() + [1.0],
+                                    'y': [monotone[0]] + monotone + [monotone[-1]]}
+        return self.curves[source_name]
+
+    def save(self, path: str = CALIBRATION_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(self.curves, indent=2), encoding='utf-8')
+
+    @classmethod
+    def load(cls, path: str = CALIBRATION_PATH) -> 'CalibrationCurves':
+        """Krzywe z pliku JSON; brak pliku = brak kalibracji"""
+        try:
+            return cls(json.loads(Path(path).read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            return cls()
+
+
+def aggregate(columns: AnalysisColumns, calibration: Optional[CalibrationCurves] = None,
+              half_life_s: Optional[float] = AGGREGATION_HALF_LIFE_S, now: Optional[float] = None,
+              method: str = 'linear', since: Optional[float] = None) -> Dict:
+    """
+    Posterior warunków pogodowych ze wszystkich analiz.
+
+    Każda analiza głosuje rozkładem: skalibrowana pewność p na swój warunek,
+    (1 - p) po równo na pozostałe. Waga głosu = waga próbkowania × 0.5^(wiek/half_life).
+    method='linear' - ważona średnia rozkładów (odporna na pojedyncze błędy),
+    method='log' - znormalizowana średnia geometryczna (mocniej nagradza zgodne, pewne głosy).
+    """
+    k = len(CONDITIONS)
+    valid = columns.condition >= 0
+    if since is not None:
+        valid &= columns.timestamp >= since
+    condition = columns.condition[valid].astype(np.intp)
+    if condition.size == 0:
+        return {'error': 'Brak analiz do agregacji', 'analyses': 0}
+
+    confidence = columns.confidence[valid]
+    if calibration is not None and calibration.curves:
+        confidence = calibration.calibrate(confidence, columns.source[valid], columns.sources)
+    p = np.clip(confidence.astype(np.float64), _EPS, 1.0 - _EPS)
+    q = (1.0 - p) / (k - 1)
+
+    weight = columns.weight[valid].astype(np.float64)
+    if half_life_s:
+        timestamp = columns.timestamp[valid]
+        reference = now if now is not None else np.nanmax(timestamp)
+        age = np.nan_to_num(reference - timestamp, nan=0.0).clip(min=0.0)
+        weight = weight * np.exp2(-age / half_life_s)
+    total_weight = weight.sum()
+
+    if method == 'log':
+        own = np.bincount(condition, weights=weight * np.log(p), minlength=k)
+        other = np.bincount(condition, weights=weight * np.log(q), minlength=k)
+        log_posterior = (own + other.sum() - other) / total_weight
+        posterior = np.exp(log_posterior - log_posterior.max())
+        posterior /= posterior.sum()
+    else:
+        own = np.bincount(condition, weights=weight * p, minlength=k)
+        other = np.bincount(condition, weights=weight * q, minlength=k)
+        posterior = (own + other.sum() - other) / total_weight
+
+    counts = np.bincount(condition, minlength=k)
+    dominant = int(posterior.argmax())
+    return {
+        'dominant_weather': CONDITIONS[dominant],
+        'posterior_confidence': round(float(posterior[dominant]), 4),
+        'posterior': {name: round(float(value), 4) for name, value in zip(CONDITIONS, posterior)},
+        'counts': {name: int(count) for name, count in zip(CONDITIONS, counts) if count},
+        'mean_confidence': round(float((weight * p).sum() / total_weight), 4),
+        'effective_n': round(float(total_weight ** 2 / (weight ** 2).sum()), 1),
+        'analyses': int(condition.size),
+        'method': method
+    }
+
+# Test function
+def test_aggregation():
+    """Test vectorized aggregation"""
+
+    import time
+
+    print("🧮 Testing vectorized aggregation...")
+
+    rng = np.random.default_rng(7)
+    n = 100_000
+    columns = AnalysisColumns(capacity=n)
+    columns.source_code('openai_vision')
+    columns.source_code('demo_openai_vision')
+    now = time.time()
+    columns.extend_arrays(
+        condition=rng.choice(len(CONDITIONS), n, p=[0.15, 0.3, 0.4, 0.02, 0.05, 0.05, 0.03]).astype(np.int8),
+        confidence=rng.uniform(0.3, 0.95, n).astype(np.float32),
+        timestamp=now - rng.uniform(0, 7200, n),
+        source=rng.integers(0, 2, n).astype(np.int16)
+    )
+
+    calibration = CalibrationCurves()
+    calibration.fit('demo_openai_vision', rng.uniform(0, 1, 5000), rng.uniform(0, 1, 5000) < 0.5)
+
+    start = time.perf_counter()
+    result = aggregate(columns, calibration, now=now)
+    print(f"✅ {n} analiz w {(time.perf_counter() - start) * 1000:.1f} ms: "
+          f"{result['dominant_weather']} ({result['posterior_confidence']:.1%})")
+    print(f"📊 {result['posterior']}")
+
+if __name__ == "__main__":
+    test_aggregation()
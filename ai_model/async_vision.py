@@ -0,0 +1,306 @@
+"""
+Async OpenAI Vision Client for WeatherEyes
+Analiza zdjęć w asyncio (np. python-telegram-bot v20) - pula połączeń httpx,
+limit równoległości przez semafor i wyniki batcha jako async iterator
+"""
+
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python ai_model/async_vision.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_model.budget import CostBudgeter
+from ai_model.failover import BackendUnavailableError, VisionRouter, classify_locally, is_backend_failure
+from ai_model.geo import resolve_location
+from ai_model.image_encoding import build_json_body
+from ai_model.openai_vision import OpenAIVisionAnalyzer
+from ai_model.preprocess import file_dhash
+from ai_model.quality import QualityGate
+from ai_model.sampling import AdaptiveSampler, candidate
+from monitoring.metrics import metrics
+from monitoring.log_config import get_logger, correlation_context
+from storage.corpus import InteractionCorpus
+
+logger = get_logger(__name__)
+
+# Ile analiz jednocześnie "w locie" i ile połączeń trzyma pula
+ASYNC_MAX_CONCURRENCY = int(os.getenv('OPENAI_ASYNC_CONCURRENCY', '64'))
+ASYNC_MAX_CONNECTIONS = int(os.getenv('OPENAI_ASYNC_MAX_CONNECTIONS', '100'))
+
+# Kawałki body wysyłane do gniazda
+BODY_CHUNK_SIZE = 64 * 1024
+
+
+async def _iter_body(body: bytearray, chunk_size: int = BODY_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Body w kawałkach - httpx nie kopiuje całego bytearray do bytes"""
+    view = memoryview(body)
+    for offset in range(0, len(view), chunk_size):
+        yield bytes(view[offset:offset + chunk_size])
+
+
+class AsyncOpenAIVisionAnalyzer(OpenAIVisionAnalyzer):
+    """
+    Asynchroniczna wersja OpenAIVisionAnalyzer z tym samym schematem wyniku.
+    Prompt, parsowanie odpowiedzi, tryb demo i odpowiedzi błędów są wspólne z klientem sync.
+
+    Użycie:
+        async with AsyncOpenAIVisionAnalyzer() as analyzer:
+            async for result in analyzer.batch_analyze_images(paths):
+                ...
+    """
+
+    def __init__(self, max_concurrency: int = ASYNC_MAX_CONCURRENCY,
+                 max_connections: int = ASYNC_MAX_CONNECTIONS, timeout: float = 60.0,
+                 budgeter: Optional[CostBudgeter] = None, quality_gate: Optional[QualityGate] = None,
+                 router: Optional[VisionRouter] = None, prompt_variant: Optional[str] = None,
+                 corpus: Optional[InteractionCorpus] = None):
+        super().__init__(budgeter, quality_gate, router, prompt_variant, corpus)
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Klient tworzony leniwie, w pętli zdarzeń, która go używa
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+        return self._client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def analyze_image(self, image_path: str, additional_context: str = "",
+                            location: Optional[Dict] = None, priority: str = 'normal') -> Dict:
+        """Asynchroniczna analiza zdjęcia - wynik jak w OpenAIVisionAnalyzer.analyze_image"""
+
+        # Każde zadanie asyncio ma własną kopię kontekstu, więc correlation id się nie mieszają
+        with correlation_context() as correlation_id:
+            async with self.semaphore:
+                result = await self._analyze_image_async(image_path, additional_context, priority)
+            result['correlation_id'] = correlation_id
+            resolved = await asyncio.to_thread(resolve_location, image_path, location)
+            if resolved:
+                result['location'] = resolved
+            return result
+
+    async def _analyze_image_async(self, image_path: str, additional_context: str = "",
+                                   priority: str = 'normal') -> Dict:
+
+        if self.corpus and self.corpus.replaying:
+            return await asyncio.to_thread(self._replay_analysis, image_path, additional_context)
+
+        if self.api_key == 'demo_key':
+            metrics.inc('analyses_total', source='demo_openai_vision')
+            return self._get_demo_analysis(image_path)
+
+        # Dekodowanie i miary jakości to CPU - poza pętlą zdarzeń
+        quality = await asyncio.to_thread(self._check_quality, image_path)
+        if quality and quality['action'] == 'reject':
+            return self._get_quality_skipped_response(image_path, quality)
+        detail = None
+        if quality and quality['action'] == 'downgrade':
+            priority, detail = 'low', 'low'
+
+        result = await self._request_analysis_async(image_path, additional_context, priority, detail)
+        if quality:
+            result['quality'] = quality
+        return result
+
+    async def _request_analysis_async(self, image_path: str, additional_context: str, priority: str,
+                                      detail: Optional[str] = None) -> Dict:
+
+        plan = await asyncio.to_thread(self._plan_budget, image_path, additional_context, priority, detail)
+        if plan and not plan['allowed']:
+            return self._get_budget_skipped_response(image_path, plan)
+
+        try:
+            payload = self._build_payload(image_path, additional_context, plan, detail)
+
+            # Odczyt pliku i base64 poza pętlą zdarzeń
+            try:
+                with metrics.timer('encode'):
+                    body = await asyncio.to_thread(build_json_body, payload, image_path)
+            except (OSError, ValueError) as e:
+                logger.error("Błąd kodowania zdjęcia", extra={'image_path': image_path, 'error': str(e)})
+                metrics.inc('analyses_total', source='error')
+                self._release_budget(plan)
+                return self._get_error_response("Nie można załadować zdjęcia")
+            metrics.inc('upload_bytes_total', len(body))
+
+            return await self._send_with_failover_async(payload, body, image_path, plan)
+
+        except Exception as e:
+            logger.error("OpenAI Vision API Error", extra={'image_path': image_path, 'error': str(e)})
+            metrics.inc('fallback_total', path='error_response')
+            metrics.inc('analyses_total', source='error')
+            self._release_budget(plan)
+            return self._get_error_response(str(e))
+
+    async def _send_with_failover_async(self, payload: Dict, body: bytearray, image_path: str,
+                                        plan: Optional[Dict] = None) -> Dict:
+        """Jak OpenAIVisionAnalyzer._send_with_failover, na puli httpx"""
+        last_error = "wszystkie circuit breakery otwarte"
+        for backend in self.router.candidates():
+            recorded = False
+            try:
+                if backend.kind == 'local':
+                    backend.breaker.record(True)
+                    recorded = True
+                    self._release_budget(plan)
+                    metrics.inc('analyses_total', source='local_classifier')
+                    return dict(await asyncio.to_thread(classify_locally, image_path), backend=backend.name)
+
+                if backend.model != payload['model']:
+                    body = await asyncio.to_thread(build_json_body, dict(payload, model=backend.model), image_path)
+                headers = backend.headers(self.api_key)
+                headers['Content-Length'] = str(len(body))
+
+                start = time.perf_counter()
+                try:
+                    response = await self.client.post(
+                        backend.url, headers=headers, content=_iter_body(body),
+                        timeout=httpx.Timeout(backend.timeout_s, connect=backend.connect_timeout_s))
+                    status, error = response.status_code, f"HTTP {response.status_code}"
+                except httpx.HTTPError as e:
+                    status, error = None, str(e) or type(e).__name__
+                duration = time.perf_counter() - start
+                metrics.observe('stage_seconds', duration, stage='request')
+
+                if not is_backend_failure(status):
+                    backend.breaker.record(True, duration)
+                    recorded = True
+                    processing_ms = response.headers.get('openai-processing-ms')
+                    if processing_ms:
+                        metrics.observe('stage_seconds', float(processing_ms) / 1000, stage='model')
+                    response.raise_for_status()
+                    result = response.json()
+                    await asyncio.to_thread(self._record_interaction, image_path, payload, result, backend)
+                    return self._parse_completion(result, image_path, plan, backend)
+
+                backend.breaker.record(False, duration)
+                recorded = True
+            finally:
+                # Anulowanie albo wyjątek przed record() zwalnia miejsce na próbę half-open
+                if not recorded:
+                    backend.breaker.release()
+
+            last_error = f"{backend.name}: {error}"
+            metrics.inc('fallback_total', path='failover')
+            logger.warning("Vision backend failure", extra={
+                'backend': backend.name, 'error': error, 'duration_s': round(duration, 3), 'image_path': image_path
+            })
+
+        raise BackendUnavailableError(last_error)
+
+    async def _sampled(self, image_path: str, context: str, location: Optional[Dict], priority: str,
+                       sampler: AdaptiveSampler, item: Dict) -> Dict:
+        """Analiza zdjęcia wybranego przez sampler: waga próbkowania i dHash do historii nowości"""
+        start = time.perf_counter()
+        analysis = await self.analyze_image(image_path, context, location, priority)
+        sampler.observe(latency_s=time.perf_counter() - start)
+        analysis['sampling_weight'] = item['sampling_weight']
+        if 'error' not in analysis:
+            sampler.remember(item['dhash'])
+        return analysis
+
+    async def batch_analyze_images(self, image_paths: List[str], context: str = "",
+                                   location: Optional[Dict] = None, priority: str = 'normal',
+                                   sampler: Optional[AdaptiveSampler] = None) -> AsyncIterator[Dict]:
+        """
+        Analizuje listę zdjęć współbieżnie i zwraca wyniki w kolejności ukończenia.
+        Liczbę zapytań w locie ogranicza semafor (max_concurrency), nie rozmiar listy.
+        Z samplerem - jak w OpenAIVisionAnalyzer.batch_analyze_images.
+        """
+
+        if not sampler:
+            async for result in self._run_tasks([
+                    asyncio.create_task(self.analyze_image(image_path, context, location, priority))
+                    for image_path in image_paths]):
+                yield result
+            return
+
+        dhashes = await asyncio.gather(*(asyncio.to_thread(file_dhash, path) for path in image_paths))
+        round_info = sampler.sample([candidate(path, dhash=dhash) for path, dhash in zip(image_paths, dhashes)])
+        async for result in self._run_tasks([
+                asyncio.create_task(self._sampled(item['image_path'], context, location, priority, sampler, item))
+                for item in round_info['selected']], sampler):
+            yield result
+
+        deferred = sampler.take_deferred()
+        if deferred:
+            logger.warning("Zdjęcia odroczone przez sampler", extra={'deferred': len(deferred)})
+        for item in deferred:
+            yield self._get_sampler_deferred_response(item['image_path'])
+
+    async def _run_tasks(self, tasks: List[asyncio.Task],
+                         sampler: Optional[AdaptiveSampler] = None) -> AsyncIterator[Dict]:
+        """Wyniki zadań w kolejności ukończenia; przerwana iteracja anuluje pozostałe"""
+        try:
+            for done, future in enumerate(asyncio.as_completed(tasks), start=1):
+                result = await future
+                if sampler:
+                    sampler.observe(queue_depth=len(tasks) - done)
+                logger.info("Przeanalizowano zdjęcie", extra={
+                    'sampled': True, 'index': done, 'total': len(tasks),
+                    'image': Path(result.get('image_path', '')).name
+                })
+                yield result
+        finally:
+            # Przerwana iteracja - nie zostawiaj zadań w tle
+            for task in tasks:
+                task.cancel()
+
+    async def batch_analyze_list(self, image_paths: List[str], context: str = "",
+                                 location: Optional[Dict] = None, priority: str = 'normal',
+                                 sampler: Optional[AdaptiveSampler] = None) -> List[Dict]:
+        """Jak batch_analyze_images, ale zbiera wyniki do listy"""
+        return [result async for result in
+                self.batch_analyze_images(image_paths, context, location, priority, sampler)]
+
+# Test function
+async def test_async_vision():
+    """Test async OpenAI Vision analyzer"""
+
+    from monitoring.log_config import setup_logging
+
+    setup_logging(fmt="text")
+
+    print("⚡ Testing Async OpenAI Vision Analyzer...")
+
+    paths = [f"demo_{weather}_{i}.jpg" for i in range(25) for weather in ('sunny', 'rain', 'cloud', 'snow')]
+    start = time.perf_counter()
+    async with AsyncOpenAIVisionAnalyzer(max_concurrency=32) as analyzer:
+        results = await analyzer.batch_analyze_list(paths, "Zdjęcie z wydarzenia SHAMAN 2024")
+        summary = analyzer.get_weather_summary_from_images(results)
+    print(f"✅ {len(results)} analiz w {time.perf_counter() - start:.2f}s: {summary['summary']}")
+
+if __name__ == "__main__":
+    asyncio.run(test_async_vision())
@@ -0,0 +1,297 @@
+"""
+Cost Budgeter for WeatherEyes
+Szacowanie tokenów zdjęcia i promptu przed wysłaniem, rozliczanie faktycznego `usage`
+oraz limity minutowe/dzienne egzekwowane przez detail, max_tokens i sampling
+"""
+
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from datetime import date
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python ai_model/budget.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.metrics import estimate_cost_usd, metrics
+from monitoring.log_config import get_logger
+
+logger = get_logger(__name__)
+
+# gpt-4o: detail=low to stała liczba tokenów, detail=high - kafelki 512 px
+LOW_DETAIL_TOKENS = 85
+TILE_TOKENS = 170
+# Najgorszy przypadek high (2048×1024 → 1536×768 → 6 kafelków), gdy nie znamy wymiarów
+MAX_HIGH_DETAIL_TOKENS = LOW_DETAIL_TOKENS + 6 * TILE_TOKENS
+
+# Narzut wiadomości chat/completions (rola, separatory)
+MESSAGE_OVERHEAD_TOKENS = 10
+
+PRIORITIES = ('low', 'normal', 'high')
+
+# Progi wykorzystania budżetu per priorytet: (od kiedy detail=low, od kiedy sampling, od kiedy stop)
+PRIORITY_THRESHOLDS = {
+    'low': (0.3, 0.5, 0.8),
+    'normal': (0.5, 0.8, 1.0)
+}
+
+# max_tokens odpowiedzi wg trybu (JSON wyniku mieści się w ~250 tokenach)
+MAX_TOKENS = {'high': 500, 'low': 300}
+
+
+def image_tokens(width: Optional[int], height: Optional[int], detail: str = 'high') -> int:
+    """Tokeny zdjęcia wg reguł OpenAI Vision (fit 2048×2048, krótszy bok 768, kafelki 512)"""
+    if detail == 'low':
+        return LOW_DETAIL_TOKENS
+    if not width or not height:
+        return MAX_HIGH_DETAIL_TOKENS
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return LOW_DETAIL_TOKENS + tiles * TILE_TOKENS
+
+
+def text_tokens(text: str) -> int:
+    """Przybliżenie tokenów tekstu (~4 znaki/token; polskie znaki liczą się drożej)"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 2)
+
+
+def image_size(image_path: str) -> Tuple[Optional[int], Optional[int]]:
+    """Wymiary zdjęcia z nagłówka (bez dekodowania pikseli)"""
+    try:
+        from PIL import Image
+        with Image.open(image_path) as image:
+            return image.size
+    except Exception:
+        return None, None
+
+
+class CostBudgeter:
+    """
+    Budżet tokenów/kosztu OpenAI na minutę i na dzień.
+
+    plan() przed wysłaniem szacuje koszt i rezerwuje go w budżecie, commit()
+    zastępuje rezerwację faktycznym `usage`. Im bliżej limitu, tym tańszy tryb:
+    detail=low i mniejsze max_tokens, potem sampling, a na końcu pomijanie.
+    Zdjęcia o priorytecie 'high' są analizowane zawsze.
+    """
+
+    def __init__(self, tokens_per_minute: Optional[int] = None, tokens_per_day: Optional[int] = None,
+                 usd_per_day: Optional[float] = None):
+        self.tokens_per_minute = tokens_per_minute
+        self.tokens_per_day = tokens_per_day
+        self.usd_per_day = usd_per_day
+        self._lock = threading.Lock()
+        self._minute: deque = deque()  # (czas, tokeny)
+        self._minute_tokens = 0
+        self._day = date.today()
+        self._day_tokens = 0
+        self._day_usd = 0.0
+        # Korekta szacunków na podstawie faktycznego usage (średnia krocząca)
+        self._prompt_ratio = 1.0
+        self._completion_tokens = {detail: float(tokens) * 0.6 for detail, tokens in MAX_TOKENS.items()}
+
+    @classmethod
+    def from_env(cls) -> Optional['CostBudgeter']:
+        """Budżet z OPENAI_BUDGET_* albo None, gdy żaden limit nie jest ustawiony"""
+        per_minute = int(os.getenv('OPENAI_BUDGET_TOKENS_PER_MINUTE', '0'))
+        per_day = int(os.getenv('OPENAI_BUDGET_TOKENS_PER_DAY', '0'))
+        usd_per_day = float(os.getenv('OPENAI_BUDGET_USD_PER_DAY', '0'))
+        if not (per_minute or per_day or usd_per_day):
+            return None
+        return cls(per_minute or None, per_day or None, usd_per_day or None)
+
+    def _roll(self, now: float):
+        while self._minute and now - self._minute[0][0] >= 60:
+            self._minute_tokens -= self._minute.popleft()[1]
+        if date.today() != self._day:
+            self._day, self._day_tokens, self._day_usd = date.today(), 0, 0.0
+
+    def utilization(self) -> Dict[str, float]:
+        """Wykorzystanie każdego limitu (0.0 - 1.0+)"""
+        with self._lock:
+            self._roll(time.monotonic())
+            return self._utilization()
+
+    def _utilization(self) -> Dict[str, float]:
+        usage = {}
+        if self.tokens_per_minute:
+            usage['minute_tokens'] = self._minute_tokens / self.tokens_per_minute
+        if self.tokens_per_day:
+            usage['day_tokens'] = self._day_tokens / self.tokens_per_day
+        if self.usd_per_day:
+            usage['day_usd'] = self._day_usd / self.usd_per_day
+        return usage
+
+    def estimate(self, prompt: str, width: Optional[int] = None, height: Optional[int] = None,
+                 detail: str = 'high') -> Dict:
+        """Szacowane tokeny i koszt zapytania"""
+        raw_text_tokens = text_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS
+        image_part = image_tokens(width, height, detail)
+        prompt_tokens = math.ceil(raw_text_tokens * self._prompt_ratio) + image_part
+        completion_tokens = math.ceil(self._completion_tokens[detail])
+        return {
+            'text_tokens': raw_text_tokens,
+            'image_tokens': image_part,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'cost_usd': estimate_cost_usd(prompt_tokens, completion_tokens)
+        }
+
+    def plan(self, image_path: str, prompt: str, priority: str = 'normal',
+             size: Optional[Tuple[int, int]] = None, detail: Optional[str] = None) -> Dict:
+        """
+        Decyzja przed wysłaniem: {'allowed', 'detail', 'max_tokens', 'estimate', 'reason', ...}.
+        Dopuszczone zapytanie rezerwuje szacowane tokeny do czasu commit()/release().
+        `detail` wymusza tryb (np. obniżenie przez bramkę jakości) - szacunek i max_tokens dla niego.
+        """
+        forced_detail = detail
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        width, height = size or image_size(image_path)
+
+        with self._lock:
+            now = time.monotonic()
+            self._roll(now)
+            usage = self._utilization()
+            level = max(usage.values(), default=0.0)
+
+            if priority == 'high':
+                # Priorytet wysoki zawsze przechodzi; po przekroczeniu limitu w tańszym trybie
+                detail, allowed, reason = ('low' if level >= 1.0 else 'high'), True, 'priority'
+            else:
+                low_from, sample_from, stop_at = PRIORITY_THRESHOLDS[priority]
+                detail = 'low' if level >= low_from else 'high'
+                allowed, reason = True, 'within_budget'
+                if level >= stop_at:
+                    allowed, reason = False, 'budget_exhausted'
+                elif level >= sample_from:
+                    keep = (stop_at - level) / (stop_at - sample_from)
+                    allowed = random.random() < keep
+                    reason = 'sampled_in' if allowed else 'sampled_out'
+            detail = forced_detail or detail
+
+            estimate = self.estimate(prompt, width, height, detail)
+            plan = {
+                'allowed': allowed,
+                'priority': priority,
+                'detail': detail,
+                'max_tokens': MAX_TOKENS[detail],
+                'estimate': estimate,
+                'utilization': round(level, 4),
+                'reason': reason,
+                '_reserved': None
+            }
+            if allowed:
+                reservation = (now, estimate['total_tokens'])
+                self._minute.append(reservation)
+                self._minute_tokens += estimate['total_tokens']
+                self._day_tokens += estimate['total_tokens']
+                self._day_usd += estimate['cost_usd']
+                plan['_reserved'] = reservation
+            elif usage.get('minute_tokens', 0) >= 1.0 and self._minute:
+                # Limit minutowy zwalnia się sam - podpowiedź, kiedy ponowić
+                plan['retry_after'] = round(60 - (now - self._minute[0][0]), 2)
+
+        metrics.inc('budget_decisions_total', priority=priority, detail=detail, decision=reason)
+        for window, value in usage.items():
+            metrics.set_gauge('budget_utilization', value, window=window)
+        if not allowed:
+            logger.info("Budget skip", extra={'sampled': True, 'image_path': image_path,
+                                              'reason': reason, 'utilization': plan['utilization']})
+        return plan
+
+    def _unreserve(self, plan: Dict) -> Optional[Dict]:
+        reservation = plan.get('_reserved')
+        if not reservation:
+            return None
+        plan['_reserved'] = None
+        try:
+            self._minute.remove(reservation)
+            self._minute_tokens -= reservation[1]
+        except ValueError:
+            pass  # rezerwacja już wypadła z okna minutowego
+        self._day_tokens -= plan['estimate']['total_tokens']
+        self._day_usd -= plan['estimate']['cost_usd']
+        return plan['estimate']
+
+    def commit(self, plan: Dict, usage: Optional[Dict], model: Optional[str] = None):
+        """Zastępuje rezerwację faktycznym usage z odpowiedzi (koszt wg cennika modelu, który odpowiedział)"""
+        with self._lock:
+            estimate = self._unreserve(plan)
+            if not usage:
+                return
+            prompt_tokens = usage.get('prompt_tokens', 0) or 0
+            completion_tokens = usage.get('completion_tokens', 0) or 0
+            cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0) or 0
+            total = prompt_tokens + completion_tokens
+            now = time.monotonic()
+            self._minute.append((now, total))
+            self._minute_tokens += total
+            self._day_tokens += total
+            self._day_usd += estimate_cost_usd(prompt_tokens, completion_tokens, cached_tokens, model)
+
+            # Kalibracja: przelicznik tekstu promptu i średnia długość odpowiedzi
+            if estimate and prompt_tokens > estimate['image_tokens']:
+                ratio = (prompt_tokens - estimate['image_tokens']) / estimate['text_tokens']
+                self._prompt_ratio = 0.9 * self._prompt_ratio + 0.1 * max(0.5, min(3.0, ratio))
+            self._completion_tokens[plan['detail']] = (
+                0.9 * self._completion_tokens[plan['detail']] + 0.1 * completion_tokens)
+
+    def release(self, plan: Dict):
+        """Zwalnia rezerwację zapytania, które się nie powiodło"""
+        with self._lock:
+            self._unreserve(plan)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._roll(time.monotonic())
+            return {
+                'minute_tokens': self._minute_tokens,
+                'day_tokens': self._day_tokens,
+                'day_usd': round(self._day_usd, 6),
+                'limits': {'tokens_per_minute': self.tokens_per_minute, 'tokens_per_day': self.tokens_per_day,
+                           'usd_per_day': self.usd_per_day},
+                'utilization': {k: round(v, 4) for k, v in self._utilization().items()},
+                'prompt_ratio': round(self._prompt_ratio, 3),
+                'avg_completion_tokens': {k: round(v, 1) for k, v in self._completion_tokens.items()}
+            }
+
+# Test function
+def test_budget():
+    """Test cost budgeter"""
+
+    print("💰 Testing cost budgeter...")
+
+    print(f"🖼️ 4000x3000 high: {image_tokens(4000, 3000)} tokenów, low: {image_tokens(4000, 3000, 'low')}")
+
+    budgeter = CostBudgeter(tokens_per_day=20000)
+    decisions = {}
+    for i in range(40):
+        priority = 'high' if i % 10 == 0 else 'normal'
+        plan = budgeter.plan(f"img_{i}.jpg", "Przeanalizuj to zdjęcie", priority, size=(4000, 3000))
+        decisions[(priority, plan['detail'], plan['reason'])] = decisions.get((priority, plan['detail'], plan['reason']), 0) + 1
+        if plan['allowed']:
+            budgeter.commit(plan, {'prompt_tokens': plan['estimate']['prompt_tokens'], 'completion_tokens': 250})
+
+    for decision, count in sorted(decisions.items()):
+        print(f"✅ {decision}: {count}")
+    print(f"📊 {budgeter.stats()}")
+
+    # Obniżenie przez bramkę jakości: szacunek, rezerwacja i max_tokens dla detail=low
+    forced = CostBudgeter(tokens_per_day=20000).plan("img.jpg", "Przeanalizuj", size=(4000, 3000), detail='low')
+    assert forced['detail'] == 'low' and forced['estimate']['image_tokens'] == image_tokens(4000, 3000, 'low')
+    print(f"✅ Wymuszony detail=low: {forced['estimate']['total_tokens']} tokenów, max_tokens {forced['max_tokens']}")
+
+if __name__ == "__main__":
+    test_budget()
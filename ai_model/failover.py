@@ -0,0 +1,338 @@
+"""
+Vision Backend Failover for WeatherEyes
+Circuit breaker na każdy backend analizy (błędy / wolne odpowiedzi), timeouty
+i uporządkowana lista zapasowych backendów: inne API zgodne z OpenAI,
+inny model albo lokalny klasyfikator
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python ai_model/failover.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.metrics import metrics
+from monitoring.log_config import get_logger
+
+logger = get_logger(__name__)
+
+OPENAI_TIMEOUT_S = float(os.getenv('OPENAI_TIMEOUT_S', '30'))
+OPENAI_CONNECT_TIMEOUT_S = float(os.getenv('OPENAI_CONNECT_TIMEOUT_S', '5'))
+
+BREAKER_FAILURE_RATE = float(os.getenv('BREAKER_FAILURE_RATE', '0.5'))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '5'))
+BREAKER_WINDOW_S = float(os.getenv('BREAKER_WINDOW_S', '60'))
+BREAKER_SLOW_CALL_S = float(os.getenv('BREAKER_SLOW_CALL_S', '20'))
+BREAKER_OPEN_S = float(os.getenv('BREAKER_OPEN_S', '30'))
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class BackendUnavailableError(Exception):
+    """Żaden backend nie przyjął zapytania (awarie albo otwarte breakery)"""
+
+
+def is_backend_failure(status: Optional[int]) -> bool:
+    """Błąd po stronie backendu (liczy się do breakera i uruchamia failover): sieć/timeout, 408, 429, 5xx"""
+    return status is None or status in (408, 429) or status >= 500
+
+
+class CircuitBreaker:
+    """
+    closed - zapytania przechodzą; w oknie window_s liczony jest odsetek porażek
+             (błąd albo odpowiedź wolniejsza niż slow_call_s). Po min_calls zapytaniach
+             i odsetku >= failure_rate breaker się otwiera.
+    open - zapytania odrzucane od razu (fail fast) przez open_s sekund.
+    half_open - przechodzi najwyżej `probes` zapytań próbnych; sukces zamyka breaker,
+                porażka otwiera go ponownie.
+    """
+
+    def __init__(self, name: str, failure_rate: float = BREAKER_FAILURE_RATE, min_calls: int = BREAKER_MIN_CALLS,
+                 window_s: float = BREAKER_WINDOW_S, slow_call_s: float = BREAKER_SLOW_CALL_S,
+                 open_s: float = BREAKER_OPEN_S, probes: int = 1):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_s = window_s
+        self.slow_call_s = slow_call_s
+        self.open_s = open_s
+        self.probes = probes
+        self._lock = threading.Lock()
+        self._calls: deque = deque()  # (czas, porażka)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        metrics.set_gauge('circuit_state', _STATE_VALUES[CLOSED], backend=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_s:
+                return HALF_OPEN
+            return self._state
+
+    def _transition(self, state: str, now: float):
+        previous, self._state = self._state, state
+        if state == OPEN:
+            self._opened_at = now
+        if state in (OPEN, CLOSED):
+            self._calls.clear()
+        self._probes_in_flight = self._probe_successes = 0
+        metrics.set_gauge('circuit_state', _STATE_VALUES[state], backend=self.name)
+        metrics.inc('circuit_transitions_total', backend=self.name, state=state)
+        log = logger.warning if state == OPEN else logger.info
+        log("Circuit breaker", extra={'backend': self.name, 'from': previous, 'to': state})
+
+    def allow(self) -> bool:
+        """Czy wysłać zapytanie; True zobowiązuje do wywołania record()"""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN:
+                if now - self._opened_at < self.open_s:
+                    metrics.inc('circuit_rejected_total', backend=self.name)
+                    return False
+                self._transition(HALF_OPEN, now)
+            if self._state == HALF_OPEN:
+                if self._probes_in_flight >= self.probes:
+                    metrics.inc('circuit_rejected_total', backend=self.name)
+                    return False
+                self._probes_in_flight += 1
+            return True
+
+    def record(self, success: bool, duration_s: float = 0.0):
+        """Wynik zapytania; wolna odpowiedź liczy się jak porażka"""
+        failure = not success or duration_s > self.slow_call_s
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failure:
+                    self._transition(OPEN, now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.probes:
+                        self._transition(CLOSED, now)
+                return
+            if self._state == OPEN:
+                return
+
+            self._calls.append((now, failure))
+            while self._calls and now - self._calls[0][0] > self.window_s:
+                self._calls.popleft()
+            failures = sum(1 for _, failed in self._calls if failed)
+            if len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.failure_rate:
+                self._transition(OPEN, now)
+
+    def release(self):
+        """Zapytanie przerwane bez wyniku (np. anulowane zadanie) - zwalnia miejsce na próbę"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            failures = sum(1 for _, failed in self._calls if failed)
+            return {'backend': self.name, 'state': self._state, 'calls': len(self._calls), 'failures': failures}
+
+
+class VisionBackend:
+    """
+    Jeden backend analizy. kind='openai' - dowolne API chat/completions zgodne z OpenAI
+    (base_url, model, klucz z api_key_env), kind='local' - classify_locally, bez sieci.
+    Główny klucz OPENAI_API_KEY trafia tylko do backendu z use_primary_key=True
+    (główne API albo jawna zgoda w konfiguracji) - nie do dowolnego base_url zapasowego.
+    """
+
+    def __init__(self, name: str, base_url: Optional[str] = None, model: str = 'gpt-4o',
+                 api_key: Optional[str] = None, kind: str = 'openai', timeout_s: float = OPENAI_TIMEOUT_S,
+                 connect_timeout_s: float = OPENAI_CONNECT_TIMEOUT_S, breaker: Optional[CircuitBreaker] = None,
+                 use_primary_key: bool = False):
+        if kind not in ('openai', 'local'):
+            raise ValueError(f"Unknown backend kind: {kind}")
+        if kind == 'openai' and not base_url:
+            raise ValueError(f"Backend {name} needs base_url")
+        self.name = name
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.model = model
+        self.api_key = api_key
+        self.use_primary_key = use_primary_key
+        self.kind = kind
+        self.timeout_s = timeout_s
+        self.connect_timeout_s = connect_timeout_s
+        self.breaker = breaker or CircuitBreaker(name)
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'VisionBackend':
+        """{"name", "base_url", "model", "api_key_env", "use_primary_key", "kind", "timeout_s", "connect_timeout_s"}"""
+        config = dict(config)
+        api_key_env = config.pop('api_key_env', None)
+        if api_key_env:
+            config['api_key'] = os.getenv(api_key_env)
+        return cls(**config)
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/chat/completions"
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """(connect, read) - format timeout dla requests"""
+        return self.connect_timeout_s, self.timeout_s
+
+    @property
+    def has_credentials(self) -> bool:
+        return self.kind == 'local' or bool(self.api_key) or self.use_primary_key
+
+    def headers(self, default_api_key: str) -> Dict:
+        headers = {"Content-Type": "application/json"}
+        api_key = self.api_key or (default_api_key if self.use_primary_key else None)
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        return headers
+
+
+class VisionRouter:
+    """Uporządkowana lista backendów; pierwszy to główne API (OPENAI_BASE_URL)"""
+
+    def __init__(self, backends: List[VisionBackend]):
+        if not backends:
+            raise ValueError("VisionRouter needs at least one backend")
+        self.backends = backends
+
+    @classmethod
+    def from_env(cls, primary_base_url: str) -> 'VisionRouter':
+        """Główny backend + VISION_FALLBACKS (lista JSON konfiguracji VisionBackend.from_config)"""
+        backends = [VisionBackend('primary', primary_base_url, use_primary_key=True)]
+        fallbacks = os.getenv('VISION_FALLBACKS', '').strip()
+        for config in json.loads(fallbacks) if fallbacks else []:
+            backend = VisionBackend.from_config(config)
+            if not backend.has_credentials:
+                # Bez własnego klucza główny klucz nie poleci do obcego base_url
+                logger.warning("Fallback backend skipped: no api_key_env (or use_primary_key)", extra={
+                    'backend': backend.name, 'base_url': backend.base_url, 'api_key_env': config.get('api_key_env')
+                })
+                continue
+            backends.append(backend)
+        return cls(backends)
+
+    def candidates(self) -> Iterator[VisionBackend]:
+        """
+        Backendy w kolejności, z pominięciem otwartych breakerów. Leniwie - allow()
+        (i ewentualne zajęcie miejsca na próbę half-open) dopiero gdy poprzedni zawiódł.
+        """
+        for backend in self.backends:
+            if backend.breaker.allow():
+                yield backend
+
+    def status(self) -> List[Dict]:
+        return [dict(backend.breaker.stats(), model=backend.model, kind=backend.kind) for backend in self.backends]
+
+
+def classify_locally(image_path: str) -> Dict:
+    """
+    Awaryjny klasyfikator bez sieci: kolor i jasność górnej części kadru.
+    Rozróżnia tylko sunny / cloudy / foggy / rainy, z niską pewnością (<= 0.5).
+    """
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        image.draft('RGB', (128, 128))
+        image = image.convert('RGB')
+        image.thumbnail((128, 128))
+        rgb = np.asarray(image, dtype=np.float32)
+
+    top = rgb[:max(1, int(rgb.shape[0] * 0.4))]
+    r, g, b = (float(top[..., i].mean()) for i in range(3))
+    luminance = (0.299 * r + 0.587 * g + 0.114 * b) / 255
+    blueness = (b - r) / 255
+    contrast = float((0.299 * rgb[..., 0] + 0.587 * rgb[..., 1] + 0.114 * rgb[..., 2]).std()) / 255
+
+    if blueness > 0.12 and luminance > 0.4:
+        condition, confidence, sky = 'sunny', 0.5, 'niebieskie'
+    elif contrast < 0.08 and luminance > 0.5:
+        condition, confidence, sky = 'foggy', 0.35, 'jednolite, jasne'
+    elif luminance < 0.35:
+        condition, confidence, sky = 'rainy', 0.3, 'ciemne, szare'
+    else:
+        condition, confidence, sky = 'cloudy', 0.4, 'szare'
+
+    return {
+        "weather_condition": condition,
+        "confidence": confidence,
+        "description": f"Lokalna ocena awaryjna - {condition}",
+        "details": {
+            "sky_condition": sky,
+            "visibility": "nieznana",
+            "precipitation": "nieznane",
+            "lighting": "jasno" if luminance > 0.5 else "pochmurno" if luminance > 0.25 else "ciemno"
+        },
+        "reasoning": (f"Klasyfikator lokalny (API niedostępne): jasność {luminance:.2f}, "
+                      f"przewaga błękitu {blueness:.2f}, kontrast {contrast:.2f}"),
+        "timestamp": datetime.now().isoformat(),
+        "source": "local_classifier",
+        "image_path": image_path,
+        "model": "local-heuristic"
+    }
+
+# Test function
+def test_failover():
+    """Test circuit breaker and failover against local stub servers"""
+
+    import tempfile
+    from pathlib import Path
+    from PIL import Image
+
+    from ai_model.openai_vision import OpenAIVisionAnalyzer
+    from benchmarks.mock_servers import MockOpenAIServer
+
+    print("🔌 Testing circuit breaker & failover...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = str(Path(tmp) / "sky.jpg")
+        Image.new('RGB', (640, 480), (110, 160, 235)).save(image_path)
+
+        with MockOpenAIServer(error_rate=1.0, seed=1) as broken, MockOpenAIServer(seed=2) as backup:
+            router = VisionRouter([
+                VisionBackend('primary', f"{broken.url}/v1", use_primary_key=True,
+                              breaker=CircuitBreaker('primary', min_calls=3, open_s=0.5)),
+                VisionBackend('backup', f"{backup.url}/v1", model='gpt-4o-mini', api_key='backup_key'),
+                VisionBackend('local', kind='local')
+            ])
+            analyzer = OpenAIVisionAnalyzer(router=router)
+            analyzer.api_key = 'stub_key'
+
+            results = [analyzer.analyze_image(image_path) for _ in range(10)]
+            # min_calls=3 porażek otwiera breaker - pozostałe 7 idzie od razu do backupu
+            assert broken.stats['requests'] == 3, broken.stats
+            assert backup.stats['requests'] == 10, backup.stats
+            assert router.status()[0]['state'] == OPEN
+            print(f"✅ Awaria: główny stub dostał {broken.stats['requests']} z 10 zapytań, "
+                  f"backup {backup.stats['requests']}, wyniki z {sorted({r.get('backend', 'primary') for r in results})}")
+            print(f"📊 {router.status()[0]}")
+
+            broken.error_rate = 0.0
+            time.sleep(0.6)
+            result = analyzer.analyze_image(image_path)
+            assert result.get('backend', 'primary') == 'primary' and router.status()[0]['state'] == CLOSED
+            print(f"✅ Po open_s: próba half-open -> {result.get('backend', 'primary')}, stan {router.status()[0]['state']}")
+
+            backup.error_rate = 1.0
+            broken.error_rate = 1.0
+            result = analyzer.analyze_image(image_path)
+            assert result['source'] == 'local_classifier' and result['backend'] == 'local'
+            print(f"✅ Oba API padły: {result['source']} {result['weather_condition']} ({result['confidence']})")
+
+if __name__ == "__main__":
+    test_failover()
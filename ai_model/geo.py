@@ -0,0 +1,213 @@
+"""
+Geo Partitioning for WeatherEyes
+Lokalizacja analiz (EXIF GPS lub kontekst), siatka geohash i podsumowania per komórka
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+GEOHASH_PRECISION = int(os.getenv('GEOHASH_PRECISION', '6'))  # ~1.2 km × 0.6 km
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {ch: i for i, ch in enumerate(_BASE32)}
+
+# Tag EXIF GPSInfo i jego pola
+_EXIF_GPS_IFD = 0x8825
+_GPS_LAT_REF, _GPS_LAT, _GPS_LON_REF, _GPS_LON = 1, 2, 3, 4
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Koduje współrzędne do geohash o zadanej długości"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def geohash_decode(geohash: str) -> Tuple[float, float]:
+    """Środek komórki geohash jako (lat, lon)"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for ch in geohash:
+        value = _BASE32_INDEX[ch]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def _dms_to_degrees(dms, ref: str) -> float:
+    degrees, minutes, seconds = (float(x) for x in dms)
+    value = degrees + minutes / 60 + seconds / 3600
+    return -value if ref in ('S', 'W') else value
+
+
+def extract_gps(image_path: str) -> Optional[Tuple[float, float]]:
+    """Współrzędne z EXIF GPS zdjęcia albo None"""
+    try:
+        from PIL import Image
+        with Image.open(image_path) as image:
+            gps = image.getexif().get_ifd(_EXIF_GPS_IFD)
+        if not gps or _GPS_LAT not in gps or _GPS_LON not in gps:
+            return None
+        return (_dms_to_degrees(gps[_GPS_LAT], gps.get(_GPS_LAT_REF, 'N')),
+                _dms_to_degrees(gps[_GPS_LON], gps.get(_GPS_LON_REF, 'E')))
+    except Exception:
+        return None
+
+
+def resolve_location(image_path: str, location: Optional[Dict] = None,
+                     precision: int = GEOHASH_PRECISION) -> Optional[Dict]:
+    """
+    Lokalizacja analizy: EXIF GPS ma pierwszeństwo, potem kontekst
+    ({'lat', 'lon'} i/lub {'name'}). Zwraca None, gdy nic nie wiadomo.
+    """
+    location = dict(location or {})
+    gps = extract_gps(image_path)
+    if gps:
+        location.update({'lat': gps[0], 'lon': gps[1], 'source': 'exif'})
+    elif 'lat' in location and 'lon' in location:
+        location.setdefault('source', 'context')
+    elif not location.get('name'):
+        return None
+    else:
+        location.setdefault('source', 'context')
+
+    if 'lat' in location and 'lon' in location:
+        location['geohash'] = geohash_encode(float(location['lat']), float(location['lon']), precision)
+    return location
+
+
+def location_key(analysis: Dict, precision: int = GEOHASH_PRECISION) -> Optional[str]:
+    """Klucz komórki analizy: geohash przycięty do precision albo nazwa miejsca"""
+    location = analysis.get('location') or {}
+    if location.get('geohash'):
+        return location['geohash'][:precision]
+    return location.get('name')
+
+
+def location_keys(analysis: Dict, precision: int = GEOHASH_PRECISION) -> List[str]:
+    """
+    Wszystkie klucze, pod którymi można subskrybować analizę: nazwa miejsca
+    oraz komórka geohash i jej prefiksy (subskrypcja większego obszaru)
+    """
+    location = analysis.get('location') or {}
+    keys = [location['name']] if location.get('name') else []
+    geohash = location.get('geohash') or ''
+    keys += [geohash[:length] for length in range(min(precision, len(geohash)), 0, -1)]
+    return keys
+
+
+class GeoPartitionedAnalyses:
+    """
+    Analizy podzielone na komórki geohash. Dostęp do komórki to jeden lookup w dict,
+    a podsumowania i wykrywanie zmian liczone są niezależnie per komórka.
+    """
+
+    def __init__(self, precision: int = GEOHASH_PRECISION, default_cell: str = 'unknown'):
+        self.precision = precision
+        self.default_cell = default_cell
+        self.cells: Dict[str, List[Dict]] = {}
+        self.names: Dict[str, str] = {}
+        self._geohash_cells = set()
+
+    def add(self, analysis: Dict) -> str:
+        cell = location_key(analysis, self.precision) or self.default_cell
+        self.cells.setdefault(cell, []).append(analysis)
+        if (analysis.get('location') or {}).get('geohash'):
+            self._geohash_cells.add(cell)
+        name = (analysis.get('location') or {}).get('name')
+        if name:
+            self.names.setdefault(cell, name)
+        return cell
+
+    def extend(self, analyses: List[Dict]):
+        for analysis in analyses:
+            self.add(analysis)
+
+    def cell(self, key: str) -> List[Dict]:
+        """Analizy komórki (geohash dowolnej długości ≥ precision albo nazwa miejsca)"""
+        return self.cells.get(key) or self.cells.get(key[:self.precision], [])
+
+    def label(self, cell: str) -> str:
+        """Czytelna nazwa komórki do alertów (nazwa miejsca albo geohash)"""
+        return self.names.get(cell, cell)
+
+    def summaries(self, summarize: Callable[[List[Dict]], Dict], max_workers: int = 8) -> Dict[str, Dict]:
+        """Podsumowanie każdej komórki równolegle, np. analyzer.get_weather_summary_from_images"""
+        keys = list(self.cells)
+        if not keys:
+            return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(keys)))) as pool:
+            results = list(pool.map(lambda key: summarize(self.cells[key]), keys))
+        summaries = {}
+        for key, summary in zip(keys, results):
+            summary['cell'] = key
+            summary['location'] = self.label(key)
+            if key in self._geohash_cells:
+                summary['center'] = geohash_decode(key)
+            summaries[key] = summary
+        return summaries
+
+    @staticmethod
+    def detect_changes(previous: Dict[str, Dict], current: Dict[str, Dict]) -> List[Dict]:
+        """Komórki, w których zmieniła się dominująca pogoda - gotowe dane do alertu lokalnego"""
+        changes = []
+        for cell, summary in current.items():
+            before = previous.get(cell)
+            if not before or 'error' in before or 'error' in summary:
+                continue
+            if before['dominant_weather'] != summary['dominant_weather']:
+                changes.append({
+                    'cell': cell,
+                    'location': summary.get('location', cell),
+                    'previous_weather': before['dominant_weather'],
+                    'current_weather': summary['dominant_weather'],
+                    'confidence': summary.get('confidence', 0),
+                    'timestamp': datetime.now().isoformat()
+                })
+        return changes
+
+# Test function
+def test_geo():
+    """Test geohash partitioning"""
+
+    print("🗺️ Testing geo partitioning...")
+
+    warsaw = geohash_encode(52.2297, 21.0122)
+    print(f"📍 Warszawa: {warsaw} → {geohash_decode(warsaw)}")
+
+    index = GeoPartitionedAnalyses()
+    index.add({'weather_condition': 'sunny', 'confidence': 0.9,
+               'location': resolve_location('missing.jpg', {'lat': 52.2297, 'lon': 21.0122, 'name': 'Warszawa'})})
+    index.add({'weather_condition': 'rainy', 'confidence': 0.8,
+               'location': resolve_location('missing.jpg', {'lat': 50.0647, 'lon': 19.9450, 'name': 'Kraków'})})
+
+    def summarize(analyses):
+        return {'dominant_weather': analyses[0]['weather_condition'], 'confidence': analyses[0]['confidence']}
+
+    for cell, summary in index.summaries(summarize).items():
+        print(f"✅ {cell}: {summary}")
+
+if __name__ == "__main__":
+    test_geo()
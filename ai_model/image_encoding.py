@@ -0,0 +1,104 @@
+"""
+Streaming Image Encoding for WeatherEyes
+Kodowanie zdjęcia do base64 bezpośrednio w gotowe body JSON (mmap + memoryview)
+"""
+
+import binascii
+import json
+import mimetypes
+import mmap
+import os
+from typing import Dict
+
+# Znacznik w payloadzie, w miejsce którego trafia base64 zdjęcia
+IMAGE_PLACEHOLDER = "__WEATHEREYES_IMAGE_BASE64__"
+
+# Wielokrotność 3 bajtów - każdy chunk koduje się do pełnych 4-znakowych grup bez paddingu
+CHUNK_SIZE = 3 * 64 * 1024
+
+
+def base64_length(size: int) -> int:
+    """Długość base64 (z paddingiem) dla `size` bajtów"""
+    return 4 * ((size + 2) // 3)
+
+
+def image_mime_type(image_path: str) -> str:
+    """MIME typ zdjęcia na podstawie rozszerzenia (domyślnie image/jpeg)"""
+    mime, _ = mimetypes.guess_type(image_path)
+    return mime if mime and mime.startswith('image/') else 'image/jpeg'
+
+
+def image_data_url_template(image_path: str) -> str:
+    """Data URL ze znacznikiem zamiast danych - do wstawienia w payload"""
+    return f"data:{image_mime_type(image_path)};base64,{IMAGE_PLACEHOLDER}"
+
+
+def stream_base64_into(target: memoryview, source: memoryview, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Koduje `source` do base64 kawałkami prosto w `target`.
+    Jednocześnie w pamięci jest tylko jeden zakodowany chunk.
+    """
+    written = 0
+    for offset in range(0, len(source), chunk_size):
+        encoded = binascii.b2a_base64(source[offset:offset + chunk_size], newline=False)
+        target[written:written + len(encoded)] = encoded
+        written += len(encoded)
+    return written
+
+
+def build_json_body(payload: Dict, image_path: str) -> bytearray:
+    """
+    Serializuje payload do JSON i wstawia base64 zdjęcia w miejsce IMAGE_PLACEHOLDER.
+
+    Body jest alokowane raz w docelowym rozmiarze; plik czytany przez mmap,
+    więc szczytowe zużycie pamięci to ~jedna kopia zakodowanego zdjęcia
+    zamiast bytes → base64 bytes → str → f-string → JSON.
+    """
+    serialized = json.dumps(payload).encode('utf-8')
+    marker = IMAGE_PLACEHOLDER.encode('ascii')
+    split_at = serialized.index(marker)
+    prefix, suffix = serialized[:split_at], serialized[split_at + len(marker):]
+
+    with open(image_path, 'rb') as image_file:
+        size = os.fstat(image_file.fileno()).st_size
+        body = bytearray(len(prefix) + base64_length(size) + len(suffix))
+        view = memoryview(body)
+        view[:len(prefix)] = prefix
+        position = len(prefix)
+
+        if size:
+            with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as source:
+                    position += stream_base64_into(view[position:], source)
+
+        view[position:position + len(suffix)] = suffix
+        view.release()
+
+    return body
+
+# Test function
+def test_image_encoding():
+    """Test streaming encoding against the naive path"""
+
+    import base64
+    import tempfile
+
+    print("🧪 Testing streaming image encoding...")
+
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
+        tmp.write(os.urandom(1024 * 1024 + 7))
+        path = tmp.name
+
+    payload = {'image_url': {'url': image_data_url_template(path), 'detail': 'high'}}
+    streamed = build_json_body(payload, path)
+
+    with open(path, 'rb') as f:
+        naive_payload = {'image_url': {'url': f"data:image/jpeg;base64,{base64.b64encode(f.read()).decode()}",
+                                       'detail': 'high'}}
+    naive = json.dumps(naive_payload).encode('utf-8')
+    os.unlink(path)
+
+    print(f"✅ Identyczne body: {bytes(streamed) == naive} ({len(streamed)} bajtów)")
+
+if __name__ == "__main__":
+    test_image_encoding()
@@ -0,0 +1,302 @@
+"""
+Keyframe Extraction for WeatherEyes
+Video Stories i animowane GIF/WebP: lokalne dekodowanie klatek, wykrywanie zmian
+sceny różnicą histogramów i analiza tylko klatek kluczowych - wynik na cały klip
+"""
+
+import hashlib
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python ai_model/keyframes.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.metrics import metrics
+from monitoring.log_config import get_logger
+
+logger = get_logger(__name__)
+
+VIDEO_SUFFIXES = {'.mp4', '.mov', '.m4v', '.webm', '.avi', '.mkv'}
+ANIMATED_SUFFIXES = {'.gif', '.webp'}
+
+KEYFRAME_SAMPLE_FPS = float(os.getenv('KEYFRAME_SAMPLE_FPS', '2'))
+KEYFRAME_SCENE_THRESHOLD = float(os.getenv('KEYFRAME_SCENE_THRESHOLD', '0.35'))
+KEYFRAME_MAX = int(os.getenv('KEYFRAME_MAX', '3'))
+KEYFRAME_DIR = os.getenv('KEYFRAME_DIR', 'data/keyframes')
+
+# Histogram HSV: odcień 16 × nasycenie 4 × jasność 4 = 256 przedziałów
+_HIST_BINS = (16, 4, 4)
+_HIST_SIDE = 64
+
+
+def is_clip(media_path: str) -> bool:
+    """Wideo albo animacja z więcej niż jedną klatką (zwykły GIF/WebP to zdjęcie)"""
+    suffix = Path(media_path).suffix.lower()
+    if suffix in VIDEO_SUFFIXES:
+        return True
+    if suffix not in ANIMATED_SUFFIXES:
+        return False
+    try:
+        from PIL import Image
+        with Image.open(media_path) as image:
+            return getattr(image, 'n_frames', 1) > 1
+    except (ImportError, OSError):
+        return False
+
+
+def color_histogram(image) -> np.ndarray:
+    """Znormalizowany histogram HSV pomniejszonej klatki (suma = 1)"""
+    small = np.asarray(image.convert('RGB').resize((_HIST_SIDE, _HIST_SIDE)).convert('HSV'))
+    h, s, v = (small[..., i].astype(np.intp) * bins // 256 for i, bins in enumerate(_HIST_BINS))
+    codes = (h * _HIST_BINS[1] + s) * _HIST_BINS[2] + v
+    hist = np.bincount(codes.ravel(), minlength=int(np.prod(_HIST_BINS))).astype(np.float64)
+    hist = hist.reshape(_HIST_BINS)
+    # Wygładzenie po (kołowym) odcieniu - drobna zmiana koloru na granicy przedziałów nie jest cięciem sceny
+    hist = 0.5 * hist + 0.25 * (np.roll(hist, 1, axis=0) + np.roll(hist, -1, axis=0))
+    return hist.ravel() / hist.sum()
+
+
+def histogram_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Odległość całkowitej zmienności w [0, 1]: 0 - identyczne rozkłady kolorów"""
+    return 0.5 * float(np.abs(a - b).sum())
+
+
+def _animated_frames(media_path: str, sample_fps: float) -> Iterator[Tuple[float, object]]:
+    from PIL import Image, ImageSequence
+
+    step = 1.0 / sample_fps
+    next_time = 0.0
+    elapsed = 0.0
+    with Image.open(media_path) as image:
+        for frame in ImageSequence.Iterator(image):
+            # Siatka co step od początku klipu - długość klatek nie przesuwa kolejnych próbek
+            if elapsed + 1e-9 >= next_time:
+                yield elapsed, frame.convert('RGB')
+                while next_time <= elapsed + 1e-9:
+                    next_time += step
+            elapsed += (frame.info.get('duration') or 100) / 1000
+
+
+def _video_frames(media_path: str, sample_fps: float) -> Iterator[Tuple[float, object]]:
+    try:
+        import cv2
+    except ImportError:
+        raise RuntimeError("Do klatek wideo potrzebny jest opencv-python-headless")
+    from PIL import Image
+
+    capture = cv2.VideoCapture(media_path)
+    if not capture.isOpened():
+        raise OSError(f"Nie można otworzyć wideo: {media_path}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, round(fps / sample_fps))
+        index = 0
+        # grab() bez retrieve() pomija dekodowanie do RGB klatek, których nie próbkujemy
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    yield index / fps, Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            index += 1
+    finally:
+        capture.release()
+
+
+def iter_frames(media_path: str, sample_fps: float = KEYFRAME_SAMPLE_FPS) -> Iterator[Tuple[float, object]]:
+    """(czas w sekundach, klatka PIL RGB) co ~1/sample_fps sekundy"""
+    if Path(media_path).suffix.lower() in VIDEO_SUFFIXES:
+        return _video_frames(media_path, sample_fps)
+    return _animated_frames(media_path, sample_fps)
+
+
+class KeyframeExtractor:
+    """
+    Dzieli klip na sceny: nowa scena zaczyna się, gdy histogram klatki odbiega od średniej
+    bieżącej sceny o więcej niż `threshold` (i scena trwa już min_scene_s). Z każdej sceny
+    zostaje klatka najbliższa jej średniemu histogramowi; przy więcej niż max_keyframes
+    scenach - najdłuższe. Waga klatki kluczowej = udział jej sceny w czasie klipu.
+
+    Klatki są przetwarzane strumieniowo - w pamięci tylko histogram i kandydat bieżącej sceny.
+    """
+
+    def __init__(self, sample_fps: float = KEYFRAME_SAMPLE_FPS, threshold: float = KEYFRAME_SCENE_THRESHOLD,
+                 max_keyframes: int = KEYFRAME_MAX, min_scene_s: float = 1.0, max_side: int = 1024,
+                 output_dir: str = KEYFRAME_DIR):
+        self.sample_fps = sample_fps
+        self.threshold = threshold
+        self.max_keyframes = max_keyframes
+        self.min_scene_s = min_scene_s
+        self.max_side = max_side
+        self.output_dir = output_dir
+
+    def detect_scenes(self, frames: Iterator[Tuple[float, object]]) -> Tuple[List[Dict], int]:
+        """Sceny [{'start_s', 'end_s', 'time_s', 'image'}] i liczba przejrzanych klatek"""
+        scenes: List[Dict] = []
+        scene = None
+        sampled = 0
+
+        def close(scene, end_s):
+            time_s, image, _ = scene['candidate']
+            scenes.append({'start_s': scene['start_s'], 'end_s': end_s, 'time_s': time_s, 'image': image})
+
+        last_time = 0.0
+        for time_s, frame in frames:
+            sampled += 1
+            last_time = time_s
+            hist = color_histogram(frame)
+            if scene is not None:
+                mean = scene['hist_sum'] / scene['count']
+                if (histogram_distance(hist, mean) > self.threshold and
+                        time_s - scene['start_s'] >= self.min_scene_s):
+                    close(scene, time_s)
+                    scene = None
+            if scene is None:
+                scene = {'start_s': time_s, 'count': 0, 'hist_sum': np.zeros_like(hist), 'candidate': None}
+            scene['count'] += 1
+            scene['hist_sum'] += hist
+
+            # Reprezentant: klatka najbliższa bieżącej średniej histogramu sceny
+            mean = scene['hist_sum'] / scene['count']
+            candidate = scene['candidate']
+            if candidate is None or histogram_distance(hist, mean) < histogram_distance(candidate[2], mean):
+                frame.thumbnail((self.max_side, self.max_side))
+                scene['candidate'] = (time_s, frame, hist)
+
+        if scene is not None:
+            close(scene, last_time + 1.0 / self.sample_fps)
+        return scenes, sampled
+
+    def extract(self, media_path: str) -> Dict:
+        """Klatki kluczowe zapisane jako JPEG + metadane klipu"""
+        scenes, sampled = self.detect_scenes(iter_frames(media_path, self.sample_fps))
+        duration = scenes[-1]['end_s'] if scenes else 0.0
+
+        kept = sorted(scenes, key=lambda s: s['end_s'] - s['start_s'], reverse=True)[:self.max_keyframes]
+        kept.sort(key=lambda s: s['time_s'])
+        kept_duration = sum(s['end_s'] - s['start_s'] for s in kept) or 1.0
+
+        Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+        # Nazwa zachowuje nazwę klipu (tryb demo rozpoznaje pogodę po nazwie pliku)
+        prefix = f"{Path(media_path).stem}_{hashlib.sha1(str(Path(media_path).resolve()).encode()).hexdigest()[:8]}"
+        keyframes = []
+        for scene in kept:
+            path = str(Path(self.output_dir) / f"{prefix}_{int(scene['time_s'] * 1000):07d}ms.jpg")
+            scene['image'].save(path, 'JPEG', quality=85)
+            keyframes.append({
+                'path': path,
+                'time_s': round(scene['time_s'], 2),
+                'start_s': round(scene['start_s'], 2),
+                'end_s': round(scene['end_s'], 2),
+                'weight': round((scene['end_s'] - scene['start_s']) / kept_duration, 4)
+            })
+
+        metrics.inc('clip_frames_total', sampled, stage='sampled')
+        metrics.inc('clip_frames_total', len(keyframes), stage='keyframe')
+        logger.info("Klatki kluczowe", extra={
+            'media': Path(media_path).name, 'duration_s': round(duration, 2), 'frames_sampled': sampled,
+            'scenes': len(scenes), 'keyframes': len(keyframes)
+        })
+        return {'media_path': media_path, 'duration_s': round(duration, 2), 'frames_sampled': sampled,
+                'scenes': len(scenes), 'keyframes': keyframes}
+
+
+def fold_clip_results(media_path: str, extraction: Dict, results: List[Dict]) -> Dict:
+    """
+    Wyniki klatek -> jeden wynik klipu w schemacie analyze_image.
+    Warunek wygrywa sumą waga_sceny × pewność; pewność klipu = ten udział
+    wśród poprawnych klatek. Opis i szczegóły z najpewniejszej klatki zwycięskiego warunku.
+    """
+    frames = [{'time_s': kf['time_s'], 'weight': kf['weight'],
+               'weather_condition': r.get('weather_condition'), 'confidence': r.get('confidence', 0.0)}
+              for kf, r in zip(extraction['keyframes'], results)]
+    valid = [(kf, r) for kf, r in zip(extraction['keyframes'], results)
+             if r.get('weather_condition') and r.get('weather_condition') != 'unknown']
+
+    if not valid:
+        clip = dict(results[0]) if results else {
+            'weather_condition': 'unknown', 'confidence': 0.0, 'source': 'error',
+            'error': 'Brak klatek do analizy', 'description': 'Błąd analizy: brak klatek'}
+    else:
+        scores: Dict[str, float] = {}
+        for kf, r in valid:
+            scores[r['weather_condition']] = scores.get(r['weather_condition'], 0.0) + kf['weight'] * r.get('confidence', 0.0)
+        dominant = max(scores, key=scores.get)
+        total_weight = sum(kf['weight'] for kf, _ in valid) or 1.0
+        _, best = max(((kf, r) for kf, r in valid if r['weather_condition'] == dominant),
+                      key=lambda pair: pair[1].get('confidence', 0.0))
+        clip = dict(best)
+        clip['weather_condition'] = dominant
+        clip['confidence'] = round(scores[dominant] / total_weight, 3)
+        clip['keyframe_path'] = best.get('image_path')
+
+    clip['image_path'] = media_path
+    clip['media_type'] = 'clip'
+    clip['clip'] = {key: extraction[key] for key in ('duration_s', 'frames_sampled', 'scenes')}
+    clip['clip']['frames'] = frames
+    return clip
+
+
+def analyze_clip(analyzer, media_path: str, additional_context: str = "", location: Optional[Dict] = None,
+                 priority: str = 'normal', extractor: Optional[KeyframeExtractor] = None) -> Dict:
+    """Analiza klipu: tylko klatki kluczowe idą przez analyzer.analyze_image"""
+    extractor = extractor or KeyframeExtractor()
+    try:
+        extraction = extractor.extract(media_path)
+    except (OSError, RuntimeError) as e:
+        logger.error("Błąd dekodowania klipu", extra={'media': media_path, 'error': str(e)})
+        result = analyzer._get_error_response(f"Nie można zdekodować klipu: {e}")
+        result['image_path'] = media_path
+        return result
+
+    results = []
+    for keyframe in extraction['keyframes']:
+        context = f"{additional_context} Klatka {keyframe['time_s']:.1f}s z {extraction['duration_s']:.0f}s Story.".strip()
+        results.append(analyzer.analyze_image(keyframe['path'], context, location, priority))
+    return fold_clip_results(media_path, extraction, results)
+
+
+def analyze_media(analyzer, media_path: str, additional_context: str = "", location: Optional[Dict] = None,
+                  priority: str = 'normal', extractor: Optional[KeyframeExtractor] = None) -> Dict:
+    """Zdjęcie -> analyze_image, wideo/animacja -> analyze_clip"""
+    if is_clip(media_path):
+        return analyze_clip(analyzer, media_path, additional_context, location, priority, extractor)
+    return analyzer.analyze_image(media_path, additional_context, location, priority)
+
+# Test function
+def test_keyframes():
+    """Test keyframe extraction"""
+
+    import tempfile
+    from PIL import Image
+
+    print("🎞️ Testing keyframe extraction...")
+
+    class DemoAnalyzer:
+        def analyze_image(self, image_path, context="", location=None, priority='normal'):
+            return {'weather_condition': 'sunny', 'confidence': 0.9, 'image_path': image_path}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 15 s "Story" jako GIF: 10 s słońca, potem 5 s deszczu (10 klatek/s)
+        path = str(Path(tmp) / "demo_sunny_story.gif")
+        rng = np.random.default_rng(3)
+        sky = [np.array([120, 180, 250]), np.array([95, 100, 110])]
+        frames = [Image.fromarray(np.clip(sky[i >= 100] + rng.normal(0, 12, (568, 320, 3)), 0, 255).astype(np.uint8))
+                  for i in range(150)]
+        frames[0].save(path, save_all=True, append_images=frames[1:], duration=100, loop=0)
+
+        extractor = KeyframeExtractor(output_dir=str(Path(tmp) / "keyframes"))
+        extraction = extractor.extract(path)
+        assert extraction['frames_sampled'] == 30, extraction['frames_sampled']
+        print(f"✅ {extraction['frames_sampled']} klatek -> {len(extraction['keyframes'])} kluczowe: "
+              f"{[(kf['time_s'], kf['weight']) for kf in extraction['keyframes']]}")
+
+        result = analyze_media(DemoAnalyzer(), path, extractor=extractor)
+        print(f"📊 Klip: {result['weather_condition']} ({result['confidence']:.0%}), {result['clip']['frames']}")
+
+if __name__ == "__main__":
+    test_keyframes()
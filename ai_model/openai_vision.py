@@ -12,47 +12,58 @@ import requests
 from pathlib import Path
 from dotenv import load_dotenv
 import random
+import sys
+import time
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python ai_model/openai_vision.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_model.aggregation import AnalysisColumns, CalibrationCurves, aggregate
+from ai_model.budget import CostBudgeter
+from ai_model.failover import (BackendUnavailableError, VisionBackend, VisionRouter, classify_locally,
+                               is_backend_failure)
+from ai_model.geo import resolve_location
+from ai_model.quality import QualityGate
+from ai_model.sampling import AdaptiveSampler, candidate
+from ai_model.image_encoding import build_json_body, image_data_url_template
+from ai_model.preprocess import file_dhash
+from ai_model.prompts import PROMPT_VARIANT, build_messages, prompt_text, system_prompt
+from storage.corpus import InteractionCorpus
+from monitoring.metrics import metrics, usage_cost_usd
+from monitoring.log_config import get_logger, correlation_context
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
 class OpenAIVisionAnalyzer:
-    def __init__(self):
+    def __init__(self, budgeter: Optional[CostBudgeter] = None, quality_gate: Optional[QualityGate] = None,
+                 router: Optional[VisionRouter] = None, prompt_variant: Optional[str] = None,
+                 corpus: Optional[InteractionCorpus] = None):
         self.api_key = os.getenv('OPENAI_API_KEY', 'demo_key')
-        self.base_url = "https://api.openai.com/v1/chat/completions"
-        
-        # Weather classification prompt
-        self.weather_prompt = """
-        Przeanalizuj to zdjęcie i określ warunki pogodowe. 
-        
-        BARDZO WAŻNE: Zwróć odpowiedź w formacie JSON z następującymi polami:
-        {
-            "weather_condition": "sunny|cloudy|rainy|snow|stormy|foggy|clear",
-            "confidence": [LICZBA OD 0.0 DO 1.0 - jak bardzo jesteś pewny swojej oceny],
-            "description": "Krótki opis warunków pogodowych w języku polskim",
-            "details": {
-                "sky_condition": "opis nieba",
-                "visibility": "dobra|średnia|słaba",
-                "precipitation": "brak|deszcz|śnieg|grad",
-                "lighting": "jasno|pochmurno|ciemno"
-            },
-            "reasoning": "Dlaczego określiłeś takie warunki pogodowe i dlaczego taki confidence"
-        }
+        # Budżet tokenów/kosztu (OPENAI_BUDGET_*); None = bez limitów
+        self.budgeter = budgeter if budgeter is not None else CostBudgeter.from_env()
+        # Lokalny filtr jakości przed API (QUALITY_*); None przy QUALITY_GATE=off
+        self.quality_gate = quality_gate if quality_gate is not None else QualityGate.from_env()
+        # Krzywe kalibracji pewności per źródło (CALIBRATION_PATH); brak pliku = bez kalibracji
+        self.calibration = CalibrationCurves.load()
+        # OPENAI_BASE_URL pozwala wskazać dowolne API zgodne z OpenAI (np. lokalny stub do benchmarków)
+        api_base = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1').rstrip('/')
+        self.base_url = f"{api_base}/chat/completions"
+        # Główny backend + zapasowe (VISION_FALLBACKS), każdy z circuit breakerem i timeoutem
+        self.router = router or VisionRouter.from_env(api_base)
         
-        CONFIDENCE GUIDELINES:
-        - 0.9-1.0: Bardzo wyraźne warunki pogodowe, dobre oświetlenie, czyste zdjęcie
-        - 0.7-0.9: Jasne warunki pogodowe, dobre zdjęcie
-        - 0.5-0.7: Średnio czytelne warunki, możliwe alternatywy
-        - 0.3-0.5: Trudne do określenia, słabe oświetlenie/jakość
-        - 0.0-0.3: Bardzo trudne lub niemożliwe do określenia
+        # Wariant instrukcji (PROMPT_VARIANT: full | compact) - stały prefiks każdego zapytania
+        self.prompt_variant = prompt_variant or PROMPT_VARIANT
         
-        Skoncentruj się na:
-        - Stanie nieba (czyste, pochmurne, zachmurzone)
-        - Opadach (deszcz, śnieg, ich intensywność)
-        - Widoczności i oświetleniu
-        - Ogólnych warunkach atmosferycznych
-        
-        MUSI ZWRÓCIĆ: poprawny JSON z confidence jako liczba (nie tekst)!
-        """
+        # Nagrywanie / odtwarzanie odpowiedzi API (VISION_CORPUS_MODE); None = zwykłe zapytania
+        self.corpus = corpus if corpus is not None else InteractionCorpus.from_env()
+    
+    @property
+    def weather_prompt(self) -> str:
+        """Instrukcje analizy (wiadomość system)"""
+        return system_prompt(self.prompt_variant)
     
     def encode_image(self, image_path: str) -> str:
         """Koduje zdjęcie do base64"""
@@ -60,132 +71,326 @@ class OpenAIVisionAnalyzer:
             with open(image_path, "rb") as image_file:
                 return base64.b64encode(image_file.read()).decode('utf-8')
         except Exception as e:
-            print(f"Błąd kodowania zdjęcia {image_path}: {e}")
+            logger.error("Błąd kodowania zdjęcia", extra={'image_path': image_path, 'error': str(e)})
             return None
     
-    def analyze_image(self, image_path: str, additional_context: str = "") -> Dict:
+    def analyze_image(self, image_path: str, additional_context: str = "",
+                      location: Optional[Dict] = None, priority: str = 'normal') -> Dict:
         """
-        Analizuje zdjęcie używając OpenAI Vision API
+        Analizuje zdjęcie używając OpenAI Vision API.
+        Wynik dostaje correlation_id, który przechodzi dalej do alertów,
+        oraz lokalizację (EXIF GPS albo `location` z kontekstu: lat/lon/name) z geohashem.
+        Przy ustawionym budżecie priority ('low'|'normal'|'high') decyduje o trybie i pomijaniu.
         """
         
+        with correlation_context() as correlation_id:
+            result = self._analyze_image(image_path, additional_context, priority)
+            result['correlation_id'] = correlation_id
+            resolved = resolve_location(image_path, location)
+            if resolved:
+                result['location'] = resolved
+            return result
+    
+    def _analyze_image(self, image_path: str, additional_context: str = "", priority: str = 'normal') -> Dict:
+        
+        if self.corpus and self.corpus.replaying:
+            return self._replay_analysis(image_path, additional_context)
+        
         if self.api_key == 'demo_key':
+            metrics.inc('analyses_total', source='demo_openai_vision')
             return self._get_demo_analysis(image_path)
         
+        quality = self._check_quality(image_path)
+        if quality and quality['action'] == 'reject':
+            return self._get_quality_skipped_response(image_path, quality)
+        detail = None
+        if quality and quality['action'] == 'downgrade':
+            priority, detail = 'low', 'low'
+        
+        result = self._request_analysis(image_path, additional_context, priority, detail)
+        if quality:
+            result['quality'] = quality
+        return result
+    
+    def _request_analysis(self, image_path: str, additional_context: str, priority: str,
+                          detail: Optional[str] = None) -> Dict:
+        
+        plan = self._plan_budget(image_path, additional_context, priority, detail)
+        if plan and not plan['allowed']:
+            return self._get_budget_skipped_response(image_path, plan)
+        
         try:
-            # Koduj zdjęcie
-            base64_image = self.encode_image(image_path)
-            if not base64_image:
-                return self._get_error_response("Nie można załadować zdjęcia")
-            
-            # Przygotuj prompt z kontekstem
-            full_prompt = self.weather_prompt
-            if additional_context:
-                full_prompt += f"\n\nDodatkowy kontekst: {additional_context}"
-            
-            # API request
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
-            
-            payload = {
-                "model": "gpt-4o",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": full_prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{base64_image}",
-                                    "detail": "high"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                "max_tokens": 500,
-                "temperature": 0.1
-            }
-            
-            response = requests.post(self.base_url, headers=headers, json=payload)
-            response.raise_for_status()
+            headers = self._request_headers()
+            payload = self._build_payload(image_path, additional_context, plan, detail)
             
-            result = response.json()
-            content = result['choices'][0]['message']['content']
+            # Koduj zdjęcie strumieniowo do gotowego body (bez pośrednich kopii)
+            try:
+                with metrics.timer('encode'):
+                    body = build_json_body(payload, image_path)
+            except (OSError, ValueError) as e:
+                logger.error("Błąd kodowania zdjęcia", extra={'image_path': image_path, 'error': str(e)})
+                metrics.inc('analyses_total', source='error')
+                self._release_budget(plan)
+                return self._get_error_response("Nie można załadować zdjęcia")
+            metrics.inc('upload_bytes_total', len(body))
             
-            # Parse JSON response
+            return self._send_with_failover(payload, body, image_path, plan)
+        
+        except Exception as e:
+            logger.error("OpenAI Vision API Error", extra={'image_path': image_path, 'error': str(e)})
+            metrics.inc('fallback_total', path='error_response')
+            metrics.inc('analyses_total', source='error')
+            self._release_budget(plan)
+            return self._get_error_response(str(e))
+    
+    def _send_with_failover(self, payload: Dict, body: bytearray, image_path: str,
+                            plan: Optional[Dict] = None) -> Dict:
+        """
+        Wysyła zapytanie do kolejnych backendów routera. Backend z otwartym breakerem
+        jest pomijany bez czekania; błąd sieci/timeout/429/5xx przechodzi do następnego.
+        Błąd 4xx to problem zapytania, nie backendu - bez failoveru.
+        """
+        last_error = "wszystkie circuit breakery otwarte"
+        for backend in self.router.candidates():
+            recorded = False
             try:
-                # OpenAI często zwraca JSON w markdown code block
-                content_clean = content.strip()
-                
-                # Usuń markdown code block jeśli jest
-                if content_clean.startswith('```json'):
-                    # Znajdź pierwszy ```json i ostatni ```
-                    start_idx = content_clean.find('```json') + 7
-                    end_idx = content_clean.rfind('```')
-                    if end_idx > start_idx:
-                        content_clean = content_clean[start_idx:end_idx].strip()
-                elif content_clean.startswith('```'):
-                    # Ogólny markdown block
-                    start_idx = content_clean.find('\n') + 1
-                    end_idx = content_clean.rfind('```')
-                    if end_idx > start_idx:
-                        content_clean = content_clean[start_idx:end_idx].strip()
+                if backend.kind == 'local':
+                    backend.breaker.record(True)
+                    recorded = True
+                    self._release_budget(plan)
+                    metrics.inc('analyses_total', source='local_classifier')
+                    return dict(classify_locally(image_path), backend=backend.name)
                 
-                print(f"🔍 Parsing JSON: {content_clean[:100]}...")
+                if backend.model != payload['model']:
+                    body = build_json_body(dict(payload, model=backend.model), image_path)
                 
-                weather_data = json.loads(content_clean)
+                start = time.perf_counter()
+                try:
+                    # request = upload + czas modelu + pobranie odpowiedzi
+                    with metrics.timer('request'):
+                        response = requests.post(backend.url, headers=backend.headers(self.api_key), data=body,
+                                                 timeout=backend.timeout)
+                    status, error = response.status_code, f"HTTP {response.status_code}"
+                except requests.RequestException as e:
+                    status, error = None, str(e)
+                duration = time.perf_counter() - start
                 
-                # Walidacja i normalizacja confidence
-                if 'confidence' in weather_data:
-                    conf = weather_data['confidence']
-                    # Upewnij się że confidence jest liczbą
-                    if isinstance(conf, str):
-                        # Spróbuj wyciągnąć liczbę z tekstu
-                        import re
-                        conf_match = re.search(r'(\d+\.?\d*)', conf)
-                        if conf_match:
-                            conf = float(conf_match.group(1))
-                            # Jeśli > 1, prawdopodobnie procent (np. 85)
-                            if conf > 1:
-                                conf = conf / 100
-                        else:
-                            conf = 0.5  # Fallback
-                    
-                    # Ograniczyj do zakresu 0-1
-                    weather_data['confidence'] = max(0.0, min(1.0, float(conf)))
-                else:
-                    # Jeśli brak confidence, ustaw bazując na jakości odpowiedzi
-                    if weather_data.get('weather_condition') != 'unknown':
-                        weather_data['confidence'] = 0.7  # Umiarkowany confidence
-                    else:
-                        weather_data['confidence'] = 0.3  # Niski confidence
+                if not is_backend_failure(status):
+                    backend.breaker.record(True, duration)
+                    recorded = True
+                    # OpenAI podaje czas przetwarzania po stronie modelu w nagłówku
+                    processing_ms = response.headers.get('openai-processing-ms')
+                    if processing_ms:
+                        metrics.observe('stage_seconds', float(processing_ms) / 1000, stage='model')
+                    response.raise_for_status()
+                    result = response.json()
+                    self._record_interaction(image_path, payload, result, backend)
+                    return self._parse_completion(result, image_path, plan, backend)
                 
-                # Dodaj metadata
-                weather_data['timestamp'] = datetime.now().isoformat()
-                weather_data['source'] = 'openai_vision'
-                weather_data['image_path'] = image_path
-                weather_data['model'] = 'gpt-4o'
-                weather_data['raw_response'] = content  # Zachowaj oryginalną odpowiedź
-                
-                print(f"✅ OpenAI Vision: {weather_data.get('weather_condition', 'unknown')} (confidence: {weather_data.get('confidence', 0):.2f})")
-                
-                return weather_data
-                
-            except json.JSONDecodeError as e:
-                print(f"⚠️ JSON Parse Error: {e}")
-                print(f"Raw content: {content}")
-                # Jeśli AI nie zwróciło JSON, spróbuj wyciągnąć informacje
-                return self._extract_weather_from_text(content, image_path)
+                backend.breaker.record(False, duration)
+                recorded = True
+            finally:
+                # Wyjątek przed record() nie może zostawić zajętego miejsca na próbę half-open
+                if not recorded:
+                    backend.breaker.release()
+            
+            last_error = f"{backend.name}: {error}"
+            metrics.inc('fallback_total', path='failover')
+            logger.warning("Vision backend failure", extra={
+                'backend': backend.name, 'error': error, 'duration_s': round(duration, 3), 'image_path': image_path
+            })
         
+        raise BackendUnavailableError(last_error)
+    
+    def _record_interaction(self, image_path: str, payload: Dict, result: Dict, backend: VisionBackend):
+        """Zapis odpowiedzi do korpusu (VISION_CORPUS_MODE=record); błąd zapisu nie psuje analizy"""
+        if not (self.corpus and self.corpus.recording):
+            return
+        try:
+            self.corpus.record(image_path, payload, result, backend.model)
         except Exception as e:
-            print(f"OpenAI Vision API Error: {e}")
-            return self._get_error_response(str(e))
+            logger.warning("Corpus record failed", extra={'image_path': image_path, 'error': str(e)})
+    
+    def _replay_analysis(self, image_path: str, additional_context: str = "") -> Dict:
+        """Odpowiedź z korpusu zamiast API: to samo parsowanie, bez zapytania, budżetu i bramki jakości"""
+        entry = self.corpus.lookup(image_path, self._build_payload(image_path, additional_context))
+        if entry is None:
+            metrics.inc('analyses_total', source='error')
+            return self._get_error_response("Brak nagrania w korpusie")
+        return self.analyze_recorded(entry, image_path)
+    
+    def analyze_recorded(self, entry: Dict, image_path: Optional[str] = None) -> Dict:
+        """Wynik analizy z nagrania korpusu (InteractionCorpus.lookup / entries)"""
+        return self._parse_completion(entry['response'], image_path or entry['image_path'], replayed=entry)
+    
+    def _check_quality(self, image_path: str) -> Optional[Dict]:
+        """Ocena jakości przed wysłaniem (None, gdy bramka jest wyłączona)"""
+        if not self.quality_gate:
+            return None
+        return self.quality_gate.check(image_path)
+    
+    def _plan_budget(self, image_path: str, additional_context: str, priority: str,
+                     detail: Optional[str] = None) -> Optional[Dict]:
+        """Decyzja budżetu przed wysłaniem (None, gdy budżet nie jest ustawiony); detail - tryb wymuszony"""
+        if not self.budgeter:
+            return None
+        return self.budgeter.plan(image_path, prompt_text(additional_context, self.prompt_variant), priority,
+                                  detail=detail)
+    
+    def _release_budget(self, plan: Optional[Dict]):
+        if plan and self.budgeter:
+            self.budgeter.release(plan)
+    
+    def _request_headers(self) -> Dict:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+    
+    def _build_payload(self, image_path: str, additional_context: str = "",
+                       plan: Optional[Dict] = None, detail: Optional[str] = None) -> Dict:
+        """
+        Payload zapytania ze znacznikiem w miejscu base64 zdjęcia; detail/max_tokens z planu budżetu.
+        `detail` wymusza tryb niezależnie od planu (np. obniżenie przez bramkę jakości).
+        """
+        if detail is None:
+            detail = plan['detail'] if plan else "high"
+        
+        # Stałe instrukcje jako pierwsza wiadomość, kontekst i zdjęcie na końcu (prefiks dla cache promptów)
+        return {
+            "model": "gpt-4o",
+            "messages": build_messages(
+                # Znacznik - base64 zdjęcia trafia prosto do body JSON
+                image_data_url_template(image_path), detail, additional_context, self.prompt_variant
+            ),
+            "max_tokens": plan['max_tokens'] if plan else 500,
+            "temperature": 0.1
+        }
+    
+    def _parse_completion(self, result: Dict, image_path: str, plan: Optional[Dict] = None,
+                          backend: Optional[VisionBackend] = None, replayed: Optional[Dict] = None) -> Dict:
+        """
+        Zamienia odpowiedź chat/completions na wynik analizy (wspólne dla klienta sync i async).
+        `replayed` - nagranie z korpusu: czas i model z nagrania, koszt bez liczenia w metrykach.
+        """
+        
+        model = backend.model if backend else 'gpt-4o'
+        content = result['choices'][0]['message']['content']
+        usage = result.get('usage')
+        if replayed:
+            model = replayed.get('model') or model
+            cost_usd = usage_cost_usd(usage, model)
+        else:
+            cost_usd = metrics.record_openai_usage(usage, model=model)
+        if plan and self.budgeter:
+            self.budgeter.commit(plan, usage, model)
+        budget = self._budget_info(plan)
+        
+        # Parse JSON response
+        try:
+            # OpenAI często zwraca JSON w markdown code block
+            content_clean = content.strip()
+            
+            # Usuń markdown code block jeśli jest
+            if content_clean.startswith('```json'):
+                # Znajdź pierwszy ```json i ostatni ```
+                start_idx = content_clean.find('```json') + 7
+                end_idx = content_clean.rfind('```')
+                if end_idx > start_idx:
+                    content_clean = content_clean[start_idx:end_idx].strip()
+            elif content_clean.startswith('```'):
+                # Ogólny markdown block
+                start_idx = content_clean.find('\n') + 1
+                end_idx = content_clean.rfind('```')
+                if end_idx > start_idx:
+                    content_clean = content_clean[start_idx:end_idx].strip()
+            
+            logger.debug("Parsing JSON", extra={'content_preview': content_clean[:100]})
+            
+            with metrics.timer('parse'):
+                weather_data = json.loads(content_clean)
+            
+            # Walidacja i normalizacja confidence
+            if 'confidence' in weather_data:
+                conf = weather_data['confidence']
+                # Upewnij się że confidence jest liczbą
+                if isinstance(conf, str):
+                    # Spróbuj wyciągnąć liczbę z tekstu
+                    import re
+                    conf_match = re.search(r'(\d+\.?\d*)', conf)
+                    if conf_match:
+                        conf = float(conf_match.group(1))
+                        # Jeśli > 1, prawdopodobnie procent (np. 85)
+                        if conf > 1:
+                            conf = conf / 100
+                    else:
+                        conf = 0.5  # Fallback
+                
+                # Ograniczyj do zakresu 0-1
+                weather_data['confidence'] = max(0.0, min(1.0, float(conf)))
+            else:
+                # Jeśli brak confidence, ustaw bazując na jakości odpowiedzi
+                if weather_data.get('weather_condition') != 'unknown':
+                    weather_data['confidence'] = 0.7  # Umiarkowany confidence
+                else:
+                    weather_data['confidence'] = 0.3  # Niski confidence
+            
+            # Dodaj metadata
+            weather_data['timestamp'] = datetime.now().isoformat()
+            weather_data['source'] = 'openai_vision'
+            weather_data['image_path'] = image_path
+            weather_data['model'] = model
+            if backend and backend.name != 'primary':
+                weather_data['backend'] = backend.name
+            weather_data['raw_response'] = content  # Zachowaj oryginalną odpowiedź
+            weather_data['usage'] = usage
+            weather_data['cost_usd'] = round(cost_usd, 6)
+            if budget:
+                weather_data['budget'] = budget
+            if replayed:
+                self._mark_replayed(weather_data, replayed)
+            metrics.inc('analyses_total', source='openai_vision')
+            
+            logger.info("OpenAI Vision result", extra={
+                'sampled': True,
+                'image_path': image_path,
+                'weather_condition': weather_data.get('weather_condition', 'unknown'),
+                'confidence': weather_data.get('confidence', 0)
+            })
+            
+            return weather_data
+            
+        except json.JSONDecodeError as e:
+            logger.warning("JSON Parse Error", extra={'error': str(e), 'content_length': len(content)})
+            logger.debug("Raw content", extra={'raw_content': content})
+            # Jeśli AI nie zwróciło JSON, spróbuj wyciągnąć informacje
+            metrics.inc('fallback_total', path='text_extraction')
+            metrics.inc('analyses_total', source='openai_vision_text')
+            with metrics.timer('fallback_parse'):
+                fallback = self._extract_weather_from_text(content, image_path)
+            fallback['usage'] = usage
+            fallback['model'] = model
+            if backend and backend.name != 'primary':
+                fallback['backend'] = backend.name
+            fallback['cost_usd'] = round(cost_usd, 6)
+            if budget:
+                fallback['budget'] = budget
+            if replayed:
+                self._mark_replayed(fallback, replayed)
+            return fallback
+    
+    @staticmethod
+    def _mark_replayed(analysis: Dict, entry: Dict):
+        """Czas analizy = czas nagrania (wiek analizy w agregacji jak przy nagraniu)"""
+        analysis['timestamp'] = datetime.fromtimestamp(entry['recorded_at']).isoformat()
+        analysis['replayed'] = {'key': entry['key'], 'stale': entry.get('stale', False)}
+    
+    @staticmethod
+    def _budget_info(plan: Optional[Dict]) -> Optional[Dict]:
+        """Decyzja budżetu do wyniku analizy (szacunek vs faktyczne usage)"""
+        if not plan:
+            return None
+        return {key: plan[key] for key in ('priority', 'detail', 'max_tokens', 'reason', 'utilization', 'estimate')}
     
     def _extract_weather_from_text(self, text: str, image_path: str) -> Dict:
         """Wyciąga informacje o pogodę z tekstu jeśli AI nie zwróciło JSON"""
@@ -226,7 +431,7 @@ class OpenAIVisionAnalyzer:
                 else:
                     confidence = conf_val
                 confidence = max(0.0, min(1.0, confidence))
-                print(f"🔍 Extracted confidence: {confidence:.2f} from text")
+                logger.debug("Extracted confidence from text", extra={'confidence': confidence})
                 break
         
         # Znajdź pogodę
@@ -245,7 +450,9 @@ class OpenAIVisionAnalyzer:
             else:
                 confidence = 0.6  # Jedno dopasowanie
         
-        print(f"🔍 Text extraction: {detected_weather} (confidence: {confidence:.2f})")
+        logger.info("Text extraction result", extra={
+            'weather_condition': detected_weather, 'confidence': confidence
+        })
         
         return {
             "weather_condition": detected_weather,
@@ -288,7 +495,9 @@ class OpenAIVisionAnalyzer:
             weather = 'cloudy'  # Domyślnie
             conf = random.uniform(0.5, 0.75)  # Średnie confidence
         
-        print(f"🎭 Demo Mode: {weather} (confidence: {conf:.2f}) - based on filename")
+        logger.info("Demo Mode result (based on filename)", extra={
+            'sampled': True, 'image_path': image_path, 'weather_condition': weather, 'confidence': round(conf, 3)
+        })
         
         return {
             "weather_condition": weather,
@@ -307,6 +516,37 @@ class OpenAIVisionAnalyzer:
             "model": "demo"
         }
     
+    def _get_quality_skipped_response(self, image_path: str, quality: Dict) -> Dict:
+        """Zdjęcie odrzucone przez bramkę jakości - bez zapytania do API"""
+        metrics.inc('analyses_total', source='quality_skipped')
+        response = self._get_error_response(f"Pominięto - słaba jakość ({', '.join(quality['reasons'])})")
+        response.update({
+            'source': 'quality_skipped',
+            'image_path': image_path,
+            'quality': quality
+        })
+        return response
+    
+    def _get_budget_skipped_response(self, image_path: str, plan: Dict) -> Dict:
+        """Zdjęcie pominięte przez budżet - bez zapytania do API"""
+        metrics.inc('analyses_total', source='budget_skipped')
+        response = self._get_error_response(f"Pominięto - budżet OpenAI ({plan['reason']})")
+        response.update({
+            'source': 'budget_skipped',
+            'image_path': image_path,
+            'budget': self._budget_info(plan)
+        })
+        if 'retry_after' in plan:
+            response['retry_after'] = plan['retry_after']
+        return response
+    
+    def _get_sampler_deferred_response(self, image_path: str) -> Dict:
+        """Zdjęcie odroczone przez AdaptiveSampler (pełna kolejka) - bez zapytania, do ponowienia"""
+        metrics.inc('analyses_total', source='sampler_deferred')
+        response = self._get_error_response("Odroczono - kolejka analiz pełna")
+        response.update({'source': 'sampler_deferred', 'image_path': image_path})
+        return response
+    
     def _get_error_response(self, error_msg: str) -> Dict:
         """Zwraca standardową odpowiedź błędu"""
         return {
@@ -325,25 +565,62 @@ class OpenAIVisionAnalyzer:
             "error": error_msg
         }
     
-    def batch_analyze_images(self, image_paths: List[str], context: str = "") -> List[Dict]:
-        """Analizuje listę zdjęć"""
+    def batch_analyze_images(self, image_paths: List[str], context: str = "",
+                             location: Optional[Dict] = None, priority: str = 'normal',
+                             sampler: Optional[AdaptiveSampler] = None) -> List[Dict]:
+        """
+        Analizuje listę zdjęć.
+        Z samplerem przy przeciążeniu analizowany jest tylko wybrany podzbiór,
+        a każdy wynik dostaje sampling_weight (ile zdjęć reprezentuje).
+        Zdjęcia odroczone przy pełnej kolejce (także z wcześniejszych wywołań) nie znikają -
+        są w wyniku jako source='sampler_deferred', do ponowienia przez wywołującego.
+        """
+        
+        if not sampler:
+            return self._analyze_items([{'image_path': path} for path in image_paths], context, location, priority)
+        
+        round_info = sampler.sample([candidate(path, dhash=file_dhash(path)) for path in image_paths])
+        results = self._analyze_items(round_info['selected'], context, location, priority, sampler)
         
+        deferred = sampler.take_deferred()
+        if deferred:
+            logger.warning("Zdjęcia odroczone przez sampler", extra={'deferred': len(deferred)})
+        return results + [self._get_sampler_deferred_response(item['image_path']) for item in deferred]
+    
+    def _analyze_items(self, items: List[Dict], context: str, location: Optional[Dict], priority: str,
+                       sampler: Optional[AdaptiveSampler] = None) -> List[Dict]:
+        """Analiza kolejnych zdjęć partii; z samplerem - waga, opóźnienie i dHash do historii nowości"""
         results = []
-        for i, image_path in enumerate(image_paths):
-            print(f"🔍 Analizuję zdjęcie {i+1}/{len(image_paths)}: {Path(image_path).name}")
+        for i, item in enumerate(items):
+            image_path = item['image_path']
+            logger.info("Analizuję zdjęcie", extra={
+                'sampled': True, 'index': i + 1, 'total': len(items), 'image': Path(image_path).name
+            })
             
-            analysis = self.analyze_image(image_path, context)
+            start = time.perf_counter()
+            analysis = self.analyze_image(image_path, context, location, priority)
+            if sampler:
+                sampler.observe(latency_s=time.perf_counter() - start, queue_depth=len(items) - i - 1)
+                analysis['sampling_weight'] = item.get('sampling_weight', 1.0)
+                if 'error' not in analysis:
+                    # Przeanalizowane zdjęcie obniża nowość kolejnych, podobnych
+                    sampler.remember(item.get('dhash'))
             results.append(analysis)
             
             # Dodaj małą pauzę żeby nie przeciążyć API
             if self.api_key != 'demo_key':
-                import time
                 time.sleep(1)
         
         return results
     
     def get_weather_summary_from_images(self, analyses: List[Dict]) -> Dict:
-        """Tworzy podsumowanie pogody z analizowanych zdjęć"""
+        """
+        Tworzy podsumowanie pogody z analizowanych zdjęć.
+        Wyniki z sampling_weight (AdaptiveSampler) liczą się z wagą - udziały
+        i średnia pewność dotyczą wszystkich zdjęć, nie tylko przeanalizowanych.
+        Dominująca pogoda to maksimum posteriora (skalibrowana pewność, spadek wagi
+        z wiekiem analizy) - głos 0.3 nie waży tyle co 0.95.
+        """
         
         if not analyses:
             return {"error": "Brak analiz do podsumowania"}
@@ -351,36 +628,49 @@ class OpenAIVisionAnalyzer:
         # Zlicz warunki pogodowe
         weather_counts = {}
         total_confidence = 0
+        total_weight = 0.0
         valid_analyses = []
         
         for analysis in analyses:
-            if analysis.get('weather_condition') and analysis.get('weather_condition') != 'unknown':
-                weather = analysis['weather_condition']
+            weather = analysis.get('weather_condition')
+            if weather and weather != 'unknown':
                 confidence = analysis.get('confidence', 0)
+                weight = analysis.get('sampling_weight', 1.0)
                 
                 if weather not in weather_counts:
-                    weather_counts[weather] = {'count': 0, 'total_confidence': 0, 'images': []}
+                    weather_counts[weather] = {'count': 0, 'estimated_count': 0.0, 'total_confidence': 0, 'images': []}
                 
                 weather_counts[weather]['count'] += 1
+                weather_counts[weather]['estimated_count'] += weight
                 weather_counts[weather]['total_confidence'] += confidence
                 weather_counts[weather]['images'].append(analysis.get('image_path', ''))
                 
-                total_confidence += confidence
+                total_confidence += confidence * weight
+                total_weight += weight
                 valid_analyses.append(analysis)
         
         if not weather_counts:
             return {"error": "Nie można określić warunków pogodowych"}
         
-        # Znajdź dominującą pogodę
-        dominant_weather = max(weather_counts.items(), key=lambda x: x[1]['count'])[0]
-        avg_confidence = total_confidence / len(valid_analyses)
+        # Znajdź dominującą pogodę: posterior z kolumn NumPy (warunki spoza CONDITIONS - wg liczby)
+        posterior = aggregate(AnalysisColumns.from_analyses(valid_analyses), self.calibration)
+        if 'error' not in posterior and posterior['dominant_weather'] in weather_counts:
+            dominant_weather = posterior['dominant_weather']
+        else:
+            dominant_weather = max(weather_counts.items(), key=lambda x: x[1]['estimated_count'])[0]
+        avg_confidence = total_confidence / total_weight
+        for info in weather_counts.values():
+            info['estimated_count'] = round(info['estimated_count'], 1)
         
         return {
             "dominant_weather": dominant_weather,
             "confidence": round(avg_confidence, 3),
             "weather_distribution": weather_counts,
             "total_images_analyzed": len(analyses),
+            "estimated_total_images": round(sum(a.get('sampling_weight', 1.0) for a in analyses), 1),
             "valid_analyses": len(valid_analyses),
+            "posterior": posterior.get('posterior', {}),
+            "posterior_confidence": posterior.get('posterior_confidence'),
             "timestamp": datetime.now().isoformat(),
             "summary": f"Na podstawie {len(valid_analyses)} zdjęć dominują warunki: {dominant_weather}"
         }
@@ -389,6 +679,9 @@ class OpenAIVisionAnalyzer:
 def test_openai_vision():
     """Test OpenAI Vision analyzer"""
     
+    from monitoring.log_config import setup_logging
+    
+    setup_logging(fmt="text")
     analyzer = OpenAIVisionAnalyzer()
     
     print("🔍 Testing OpenAI Vision Analyzer...")
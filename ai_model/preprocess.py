@@ -0,0 +1,279 @@
+"""
+Image Preprocessing Stage for WeatherEyes
+CPU-owa obróbka zdjęć (dekodowanie, hash, zmniejszanie) w ProcessPoolExecutor.
+Bajty zdjęć trafiają do procesów przez shared memory zamiast pickle,
+a gotowe pliki zasilają sieciowy etap analizy.
+"""
+
+import hashlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python ai_model/preprocess.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.metrics import metrics
+from monitoring.log_config import get_logger
+
+logger = get_logger(__name__)
+
+# OpenAI przy detail=high i tak skaluje do 2048 px (dłuższy bok) - większe zdjęcia to zbędny upload
+PREPROCESS_MAX_SIDE = int(os.getenv('PREPROCESS_MAX_SIDE', '2048'))
+PREPROCESS_QUALITY = int(os.getenv('PREPROCESS_QUALITY', '85'))
+PREPROCESS_DIR = os.getenv('PREPROCESS_DIR', 'data/preprocessed')
+
+
+def available_cores() -> int:
+    """Rdzenie dostępne dla procesu (z uwzględnieniem affinity/cgroup)"""
+    try:
+        return len(os.sched_getaffinity(0)) or 1
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def difference_hash(image, size: int = 8) -> str:
+    """dHash - percepcyjny hash (64 bity) do wykrywania prawie identycznych zdjęć"""
+    pixels = list(image.convert('L').resize((size + 1, size)).getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            bits = (bits << 1) | (left > pixels[row * (size + 1) + col + 1])
+    return f"{bits:0{size * size // 4}x}"
+
+
+def file_dhash(path: str, size: int = 8) -> Optional[str]:
+    """dHash pliku zdjęcia (JPEG dekodowany w zmniejszonej skali); None, gdy pliku nie da się otworzyć"""
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(path) as image:
+            image.draft('L', (size * 8, size * 8))
+            return difference_hash(ImageOps.exif_transpose(image), size)
+    except (OSError, ValueError):
+        return None
+
+
+def _preprocess_shared(shm_name: str, size: int, name: str, source_path: Optional[str],
+                       max_side: int, quality: int, output_dir: str) -> Dict:
+    """
+    Worker (osobny proces): czyta bajty zdjęcia z shared memory, liczy hashe,
+    zmniejsza i zapisuje JPEG. Zwraca tylko małe metadane.
+    """
+    from PIL import Image, ImageOps
+
+    start = time.process_time()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        view = shm.buf[:size]
+        try:
+            content_hash = hashlib.sha256(view).hexdigest()
+            buffer = io.BytesIO(view)
+        finally:
+            view.release()
+    finally:
+        shm.close()
+
+    with Image.open(buffer) as image:
+        source_format = image.format
+        width, height = image.size
+        image = ImageOps.exif_transpose(image)
+        dhash = difference_hash(image)
+
+        resized = max(image.size) > max_side
+        if not resized and source_format == 'JPEG' and source_path:
+            # Już mieści się w limicie - wysyłamy oryginał bez ponownej kompresji
+            path, bytes_out, out_size = source_path, size, image.size
+        else:
+            if resized:
+                image.thumbnail((max_side, max_side), Image.LANCZOS)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            Path(output_dir).mkdir(parents=True, exist_ok=True)
+            path = str(Path(output_dir) / f"{content_hash[:20]}_{max_side}.jpg")
+            image.save(path, 'JPEG', quality=quality, optimize=True)
+            bytes_out, out_size = os.path.getsize(path), image.size
+
+    return {
+        'name': name,
+        'source_path': source_path,
+        'path': path,
+        'content_hash': content_hash,
+        'dhash': dhash,
+        'format': source_format,
+        'width': width,
+        'height': height,
+        'output_width': out_size[0],
+        'output_height': out_size[1],
+        'resized': resized,
+        'bytes_in': size,
+        'bytes_out': bytes_out,
+        'cpu_seconds': round(time.process_time() - start, 4)
+    }
+
+
+class ImagePreprocessor:
+    """
+    Pula procesów do obróbki zdjęć. Każde zdjęcie jest kopiowane raz do bloku
+    SharedMemory (readinto z pliku albo z bajtów pobranych z sieci); do procesu
+    trafia tylko nazwa bloku. Blok jest zwalniany po zakończeniu zadania.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_side: int = PREPROCESS_MAX_SIDE,
+                 quality: int = PREPROCESS_QUALITY, output_dir: str = PREPROCESS_DIR):
+        self.workers = workers or available_cores()
+        self.max_side = max_side
+        self.quality = quality
+        self.output_dir = output_dir
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _submit(self, shm: shared_memory.SharedMemory, size: int, name: str,
+                source_path: Optional[str]) -> Future:
+        try:
+            future = self._pool.submit(_preprocess_shared, shm.name, size, name, source_path,
+                                       self.max_side, self.quality, self.output_dir)
+        except Exception:
+            shm.close()
+            shm.unlink()
+            raise
+
+        def release(_):
+            shm.close()
+            shm.unlink()
+
+        future.add_done_callback(release)
+        return future
+
+    def submit_path(self, image_path: str) -> Future:
+        """Kopiuje plik prosto do shared memory (bez pośredniego bytes) i zleca obróbkę"""
+        size = os.path.getsize(image_path)
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            with open(image_path, 'rb') as f:
+                f.readinto(shm.buf[:size])
+        except Exception:
+            shm.close()
+            shm.unlink()
+            raise
+        return self._submit(shm, size, Path(image_path).name, image_path)
+
+    def submit_bytes(self, data: Union[bytes, bytearray, memoryview], name: str) -> Future:
+        """Zleca obróbkę zdjęcia, które jest już w pamięci (np. pobranego z Telegrama)"""
+        size = len(data)
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shm.buf[:size] = data
+        return self._submit(shm, size, name, None)
+
+    def process(self, image_paths: Iterable[str], max_in_flight: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Obrabia zdjęcia i zwraca wyniki w kolejności ukończenia.
+        W locie jest najwyżej max_in_flight zdjęć (domyślnie 2 × workers),
+        więc zużycie shared memory nie rośnie z długością listy.
+        """
+        max_in_flight = max_in_flight or self.workers * 2
+        pending: Dict[Future, str] = {}
+        paths = iter(image_paths)
+
+        def fill():
+            for image_path in paths:
+                try:
+                    pending[self.submit_path(image_path)] = image_path
+                except OSError as e:
+                    yield {'name': Path(image_path).name, 'source_path': image_path, 'error': str(e)}
+                    continue
+                if len(pending) >= max_in_flight:
+                    return
+
+        yield from fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            future = done.pop()
+            image_path = pending.pop(future)
+            try:
+                result = future.result()
+                metrics.observe('stage_seconds', result['cpu_seconds'], stage='preprocess')
+                metrics.inc('preprocess_bytes_saved_total', max(0, result['bytes_in'] - result['bytes_out']))
+            except Exception as e:
+                logger.warning("Preprocessing failed", extra={'image_path': image_path, 'error': str(e)})
+                result = {'name': Path(image_path).name, 'source_path': image_path, 'error': str(e)}
+            yield result
+            yield from fill()
+
+
+def analyze_with_preprocessing(analyzer, image_paths: List[str], context: str = "",
+                               preprocessor: Optional[ImagePreprocessor] = None,
+                               network_workers: int = 8) -> Iterator[Dict]:
+    """
+    Dwuetapowy pipeline: procesy obrabiają zdjęcia, a wątki wysyłają gotowe pliki do API.
+    Analiza zdjęcia startuje, gdy tylko skończy się jego obróbka, a w locie jest
+    najwyżej 2 × network_workers zapytań.
+    Zdjęcia, których nie udało się obrobić, idą do analizy w oryginale.
+    """
+    own_preprocessor = preprocessor is None
+    preprocessor = preprocessor or ImagePreprocessor()
+
+    def analyze(prepared: Dict) -> Dict:
+        result = analyzer.analyze_image(prepared.get('path') or prepared['source_path'], context)
+        result['image_path'] = prepared['source_path'] or result.get('image_path')
+        result['preprocess'] = {k: v for k, v in prepared.items() if k not in ('name', 'source_path')}
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=network_workers) as network:
+            in_flight = set()
+            for prepared in preprocessor.process(image_paths):
+                in_flight.add(network.submit(analyze, prepared))
+                # Ograniczamy liczbę zapytań w locie i oddajemy wyniki na bieżąco
+                done, in_flight = wait(in_flight, timeout=0 if len(in_flight) < 2 * network_workers else None,
+                                       return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+    finally:
+        if own_preprocessor:
+            preprocessor.close()
+
+# Test function
+def test_preprocess():
+    """Test preprocessing stage"""
+
+    import tempfile
+    from PIL import Image
+
+    print(f"🧮 Testing image preprocessing ({available_cores()} rdzeni)...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(8):
+            path = Path(tmp) / f"test_{i}.png"
+            Image.new('RGB', (4000, 3000), (30 * i, 120, 200)).save(path)
+            paths.append(str(path))
+
+        start = time.perf_counter()
+        with ImagePreprocessor(output_dir=tmp) as preprocessor:
+            for result in preprocessor.process(paths):
+                print(f"✅ {result['name']}: {result['width']}x{result['height']} → "
+                      f"{result['output_width']}x{result['output_height']}, dhash {result['dhash']}")
+        print(f"⏱️ {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    test_preprocess()
@@ -0,0 +1,103 @@
+"""
+Vision Prompts for WeatherEyes
+Instrukcje analizy jako stały, bajtowo identyczny prefiks (wiadomość system),
+a zmienny kontekst i zdjęcie na końcu - układ, który cache promptów po stronie
+dostawcy może ponownie wykorzystać. Wariant 'compact' to ta sama umowa JSON w mniej tokenach.
+"""
+
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python ai_model/prompts.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+PROMPT_VARIANT = os.getenv('PROMPT_VARIANT', 'full')
+
+# Bez wcięć i końcowych spacji - w poprzednim układzie wcięcia kodu trafiały do promptu jako tokeny
+WEATHER_PROMPT_FULL = """Przeanalizuj to zdjęcie i określ warunki pogodowe.
+
+BARDZO WAŻNE: Zwróć odpowiedź w formacie JSON z następującymi polami:
+{
+    "weather_condition": "sunny|cloudy|rainy|snow|stormy|foggy|clear",
+    "confidence": [LICZBA OD 0.0 DO 1.0 - jak bardzo jesteś pewny swojej oceny],
+    "description": "Krótki opis warunków pogodowych w języku polskim",
+    "details": {
+        "sky_condition": "opis nieba",
+        "visibility": "dobra|średnia|słaba",
+        "precipitation": "brak|deszcz|śnieg|grad",
+        "lighting": "jasno|pochmurno|ciemno"
+    },
+    "reasoning": "Dlaczego określiłeś takie warunki pogodowe i dlaczego taki confidence"
+}
+
+CONFIDENCE GUIDELINES:
+- 0.9-1.0: Bardzo wyraźne warunki pogodowe, dobre oświetlenie, czyste zdjęcie
+- 0.7-0.9: Jasne warunki pogodowe, dobre zdjęcie
+- 0.5-0.7: Średnio czytelne warunki, możliwe alternatywy
+- 0.3-0.5: Trudne do określenia, słabe oświetlenie/jakość
+- 0.0-0.3: Bardzo trudne lub niemożliwe do określenia
+
+Skoncentruj się na:
+- Stanie nieba (czyste, pochmurne, zachmurzone)
+- Opadach (deszcz, śnieg, ich intensywność)
+- Widoczności i oświetleniu
+- Ogólnych warunkach atmosferycznych
+
+MUSI ZWRÓCIĆ: poprawny JSON z confidence jako liczba (nie tekst)!"""
+
+WEATHER_PROMPT_COMPACT = """Oceń pogodę na zdjęciu. Zwróć tylko JSON:
+{"weather_condition":"sunny|cloudy|rainy|snow|stormy|foggy|clear","confidence":0.0-1.0,"description":"krótko po polsku","details":{"sky_condition":"opis nieba","visibility":"dobra|średnia|słaba","precipitation":"brak|deszcz|śnieg|grad","lighting":"jasno|pochmurno|ciemno"},"reasoning":"jedno zdanie"}
+confidence (liczba): 0.9+ wyraźne warunki i dobre zdjęcie; 0.7 czytelne; 0.5 możliwe alternatywy; 0.3 słabe światło/jakość; <0.3 nie da się określić."""
+
+SYSTEM_PROMPTS = {'full': WEATHER_PROMPT_FULL, 'compact': WEATHER_PROMPT_COMPACT}
+
+
+def system_prompt(variant: str = PROMPT_VARIANT) -> str:
+    if variant not in SYSTEM_PROMPTS:
+        raise ValueError(f"Unknown prompt variant: {variant}")
+    return SYSTEM_PROMPTS[variant]
+
+
+def context_text(additional_context: str = "") -> str:
+    return f"Dodatkowy kontekst: {additional_context}" if additional_context else ""
+
+
+def build_messages(image_url: str, detail: str, additional_context: str = "",
+                   variant: str = PROMPT_VARIANT) -> List[Dict]:
+    """
+    [system: stałe instrukcje] + [user: kontekst tego zdjęcia, zdjęcie].
+    Wszystko, co zmienia się między zapytaniami, jest za wspólnym prefiksem.
+    """
+    content = []
+    if additional_context:
+        content.append({"type": "text", "text": context_text(additional_context)})
+    content.append({"type": "image_url", "image_url": {"url": image_url, "detail": detail}})
+    return [
+        {"role": "system", "content": system_prompt(variant)},
+        {"role": "user", "content": content}
+    ]
+
+
+def prompt_text(additional_context: str = "", variant: str = PROMPT_VARIANT) -> str:
+    """Cały tekst promptu (do szacowania tokenów przed wysłaniem)"""
+    return system_prompt(variant) + ("\n" + context_text(additional_context) if additional_context else "")
+
+# Test function
+def test_prompts():
+    """Test prompt layout"""
+
+    from ai_model.budget import text_tokens
+
+    print("📝 Testing prompt layout...")
+
+    for variant in SYSTEM_PROMPTS:
+        first = build_messages("data:image/jpeg;base64,AAA", "high", "Zdjęcie 1", variant)
+        second = build_messages("data:image/jpeg;base64,BBB", "low", "Zdjęcie 2", variant)
+        print(f"✅ {variant}: ~{text_tokens(system_prompt(variant))} tokenów instrukcji, "
+              f"wspólny prefiks: {first[0] == second[0]}")
+
+if __name__ == "__main__":
+    test_prompts()
@@ -0,0 +1,169 @@
+"""
+Image Quality Gate for WeatherEyes
+Szybki lokalny filtr przed OpenAI: ostrość (wariancja Laplasjanu), jasność
+i udział nieba - zdjęcia, które nie odpowiedzą na pytanie o pogodę, nie kosztują
+"""
+
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python ai_model/quality.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.metrics import metrics
+from monitoring.log_config import get_logger
+
+logger = get_logger(__name__)
+
+QUALITY_GATE = os.getenv('QUALITY_GATE', 'on').lower() not in ('off', '0', 'false')
+QUALITY_MIN_SHARPNESS = float(os.getenv('QUALITY_MIN_SHARPNESS', '25'))
+QUALITY_MIN_LUMINANCE = float(os.getenv('QUALITY_MIN_LUMINANCE', '0.12'))
+QUALITY_MIN_SKY = float(os.getenv('QUALITY_MIN_SKY', '0.05'))
+QUALITY_NO_SKY_ACTION = os.getenv('QUALITY_NO_SKY_ACTION', 'downgrade')
+
+# Ocena na pomniejszonej kopii - kilka ms niezależnie od rozdzielczości zdjęcia
+_ANALYSIS_SIDE = 512
+# Niebo szukamy w górnej części kadru, w blokach 8×8 pikseli
+_SKY_REGION = 0.6
+_BLOCK = 8
+
+
+def assess_quality(image_path: str) -> Dict:
+    """
+    Miary jakości zdjęcia:
+    sharpness - wariancja Laplasjanu (poza niebem, które jest gładkie z natury; None = prawie samo niebo),
+    luminance - średnia jasność 0-1,
+    sky_fraction - udział bloków 8×8 "jak niebo" (gładkie, niebieskie albo jasnoszare) w górnych 60% kadru.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(image_path) as image:
+        image.draft('RGB', (_ANALYSIS_SIDE, _ANALYSIS_SIDE))  # JPEG: dekodowanie od razu w mniejszej skali
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image.thumbnail((_ANALYSIS_SIDE, _ANALYSIS_SIDE))
+        rgb = np.asarray(image, dtype=np.float32)
+
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    gray = 0.299 * r + 0.587 * g + 0.114 * b
+    laplacian = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:] - 4 * gray[1:-1, 1:-1])
+
+    # Niebo oceniane w blokach 8×8: gładki blok (mały średni gradient) w kolorze nieba
+    height, width = (gray.shape[0] - 1) // _BLOCK * _BLOCK, (gray.shape[1] - 1) // _BLOCK * _BLOCK
+    gradient = (np.abs(np.diff(gray, axis=0))[:height, :width] + np.abs(np.diff(gray, axis=1))[:height, :width])
+
+    def blocks(channel: np.ndarray) -> np.ndarray:
+        return channel[:height, :width].reshape(height // _BLOCK, _BLOCK, width // _BLOCK, _BLOCK).mean(axis=(1, 3))
+
+    br, bg, bb, smooth = blocks(r), blocks(g), blocks(b), blocks(gradient) < 12
+    brightest = np.maximum(np.maximum(br, bg), bb)
+    spread = brightest - np.minimum(np.minimum(br, bg), bb)
+    blue_sky = (bb > br + 10) & (bb >= bg) & (brightest > 80)
+    grey_sky = (spread < 25) & (brightest > 130)
+    sky = smooth & (blue_sky | grey_sky)
+
+    top = max(1, int(sky.shape[0] * _SKY_REGION))
+    # Maska nieba w pikselach, wyrównana do Laplasjanu (bez brzegów)
+    sky_pixels = np.zeros(laplacian.shape, dtype=bool)
+    sky_pixels[:height - 1, :width - 1] = np.repeat(np.repeat(sky, _BLOCK, 0), _BLOCK, 1)[1:, 1:]
+    sharpness = float(laplacian[~sky_pixels].var()) if (~sky_pixels).mean() > 0.1 else None
+
+    return {
+        'sharpness': round(sharpness, 1) if sharpness is not None else None,
+        'luminance': round(float(gray.mean()) / 255, 3),
+        'sky_fraction': round(float(sky[:top].mean()), 3)
+    }
+
+
+class QualityGate:
+    """
+    Decyzja przed analizą: 'analyze', 'downgrade' (priorytet low i detail=low)
+    albo 'reject' (bez zapytania do API). Za ciemne i nieostre zdjęcia są odrzucane,
+    brak nieba domyślnie obniża tryb (QUALITY_NO_SKY_ACTION=reject - odrzuca).
+    Zdjęcie, którego nie da się ocenić (np. brak pliku), przechodzi bez zmian.
+    """
+
+    def __init__(self, min_sharpness: float = QUALITY_MIN_SHARPNESS, min_luminance: float = QUALITY_MIN_LUMINANCE,
+                 min_sky_fraction: float = QUALITY_MIN_SKY, no_sky_action: str = QUALITY_NO_SKY_ACTION):
+        if no_sky_action not in ('downgrade', 'reject'):
+            raise ValueError(f"Unknown no_sky_action: {no_sky_action}")
+        self.min_sharpness = min_sharpness
+        self.min_luminance = min_luminance
+        self.min_sky_fraction = min_sky_fraction
+        self.no_sky_action = no_sky_action
+
+    @classmethod
+    def from_env(cls) -> Optional['QualityGate']:
+        """Bramka z QUALITY_*; None przy QUALITY_GATE=off"""
+        return cls() if QUALITY_GATE else None
+
+    def check(self, image_path: str) -> Dict:
+        """{'action', 'reasons', 'sharpness', 'luminance', 'sky_fraction'}"""
+        try:
+            with metrics.timer('quality'):
+                measures = assess_quality(image_path)
+        except (ImportError, OSError, ValueError):
+            metrics.inc('quality_gate_total', decision='unchecked')
+            return {'action': 'analyze', 'reasons': [], 'checked': False}
+
+        reasons = []
+        if measures['luminance'] < self.min_luminance:
+            reasons.append('too_dark')
+        if measures['sharpness'] is not None and measures['sharpness'] < self.min_sharpness:
+            reasons.append('blurry')
+        if measures['sky_fraction'] < self.min_sky_fraction:
+            reasons.append('no_sky')
+
+        if 'too_dark' in reasons or 'blurry' in reasons:
+            action = 'reject'
+        elif reasons:
+            action = self.no_sky_action
+        else:
+            action = 'analyze'
+
+        metrics.inc('quality_gate_total', decision=action)
+        for reason in reasons:
+            metrics.inc('quality_gate_reasons_total', reason=reason)
+        if reasons:
+            logger.info("Quality gate", extra={'sampled': True, 'image_path': image_path, 'action': action,
+                                               'reasons': reasons, **measures})
+        return dict(measures, action=action, reasons=reasons, checked=True)
+
+# Test function
+def test_quality():
+    """Test image quality gate"""
+
+    import tempfile
+    import time
+    from PIL import Image, ImageFilter
+
+    print("🔎 Testing image quality gate...")
+
+    rng = np.random.default_rng(5)
+    ground = rng.integers(0, 255, (600, 1600, 3), dtype=np.uint8)
+    sky = np.broadcast_to(np.array([110, 160, 235], dtype=np.uint8), (600, 1600, 3))
+    outdoor = Image.fromarray(np.concatenate([sky, ground]))
+    samples = {
+        'outdoor': outdoor,
+        'indoor': Image.fromarray(np.clip(ground * 0.6 + 40, 0, 255).astype(np.uint8)),
+        'night': Image.fromarray((ground * 0.08).astype(np.uint8)),
+        'blurry': outdoor.filter(ImageFilter.GaussianBlur(12))
+    }
+
+    gate = QualityGate()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, image in samples.items():
+            path = str(Path(tmp) / f"{name}.jpg")
+            image.save(path, quality=90)
+            start = time.perf_counter()
+            result = gate.check(path)
+            print(f"✅ {name}: {result['action']} {result['reasons']} "
+                  f"(ostrość {result['sharpness']}, jasność {result['luminance']}, niebo {result['sky_fraction']}) "
+                  f"w {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    test_quality()
@@ -0,0 +1,304 @@
+"""
+Compact Analysis Records for WeatherEyes
+Wynik analizy jako obiekt ze __slots__: internowane kategorie, float/epoch zamiast
+stringów, długie teksty (raw_response, reasoning) poza stertą albo pomijane
+"""
+
+import os
+import sys
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# Co robić z długimi tekstami: 'compress' (zlib w pamięci), 'spill' (plik na dysku, tylko dopisywany -
+# do krótkich procesów), 'drop'
+RAW_TEXT_POLICY = os.getenv('ANALYSIS_RAW_POLICY', 'compress')
+RAW_TEXT_PATH = os.getenv('ANALYSIS_RAW_PATH', 'data/raw_responses.bin')
+
+# Pola trzymane jako atrybuty; wszystko inne trafia do `extra`
+_KNOWN_KEYS = {'weather_condition', 'confidence', 'description', 'details', 'reasoning', 'timestamp',
+               'source', 'image_path', 'model', 'raw_response', 'usage', 'cost_usd', 'correlation_id',
+               'sampling_weight'}
+_DETAIL_KEYS = ('sky_condition', 'visibility', 'precipitation', 'lighting')
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+# Wspólne krotki szczegółów - większość analiz ma kilka tych samych kombinacji
+_DETAILS_CACHE: Dict[tuple, tuple] = {}
+
+
+def _intern_details(details: tuple) -> tuple:
+    return _DETAILS_CACHE.setdefault(details, details) if len(_DETAILS_CACHE) < 10000 else details
+
+
+def _pack_correlation_id(value: Optional[str]):
+    """16-znakowy hex (monitoring.log_config) jako int - o połowę mniej pamięci niż str"""
+    if isinstance(value, str) and len(value) == 16:
+        try:
+            return int(value, 16)
+        except ValueError:
+            pass
+    return value
+
+
+class RawTextStore:
+    """
+    Append-only plik na długie teksty. W rekordzie zostaje jedna liczba:
+    offset << 24 | długość, odczyt przez os.pread bez trzymania pliku w pamięci.
+    """
+
+    MAX_LENGTH = (1 << 24) - 1
+
+    def __init__(self, path: str = RAW_TEXT_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'ab+')
+
+    def put(self, text: str) -> int:
+        data = text.encode('utf-8')[:self.MAX_LENGTH]
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            self._file.write(data)
+            self._file.flush()
+        return offset << 24 | len(data)
+
+    def get(self, ref: int) -> str:
+        offset, length = ref >> 24, ref & self.MAX_LENGTH
+        return os.pread(self._file.fileno(), length, offset).decode('utf-8', errors='replace')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+_default_store: Optional[RawTextStore] = None
+_default_store_lock = threading.Lock()
+
+
+def default_raw_store() -> RawTextStore:
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = RawTextStore()
+        return _default_store
+
+
+class AnalysisRecord:
+    """
+    Kompaktowa analiza (~kilkaset bajtów zamiast kilku KB dla słownika).
+    Kategorie (warunek, źródło, model, szczegóły) są internowane - każdy rekord
+    trzyma wskaźnik na wspólny string. Konwersja do/z obecnego schematu dict.
+    """
+
+    __slots__ = ('condition', 'confidence', 'timestamp', 'source', 'model', 'image_path', 'description',
+                 'details', 'reasoning', 'raw_response', 'prompt_tokens', 'completion_tokens', 'cost_usd',
+                 'correlation_id', 'sampling_weight', 'extra')
+
+    def __init__(self, condition: str, confidence: float, timestamp: float, source: str,
+                 image_path: Optional[str] = None, description: Optional[str] = None, model: Optional[str] = None,
+                 details: Optional[tuple] = None, reasoning=None, raw_response=None,
+                 prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None,
+                 cost_usd: Optional[float] = None, correlation_id: Optional[str] = None,
+                 sampling_weight: float = 1.0, extra: Optional[Dict] = None):
+        self.condition = _intern(condition)
+        self.confidence = float(confidence)
+        self.timestamp = float(timestamp)
+        self.source = _intern(source)
+        self.model = _intern(model)
+        self.image_path = image_path
+        # Opis jako UTF-8 - polskie znaki w str wymuszają 2 bajty na każdy znak
+        self.description = description.encode('utf-8') if isinstance(description, str) else description
+        self.details = details
+        # Długie teksty: str, bytes (zlib), int (ref do RawTextStore) albo None
+        self.reasoning = reasoning
+        self.raw_response = raw_response
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cost_usd = cost_usd
+        self.correlation_id = correlation_id
+        self.sampling_weight = sampling_weight
+        self.extra = extra or None
+
+    @staticmethod
+    def _pack_text(text: Optional[str], policy: str, store: Optional[RawTextStore]):
+        if not text or policy == 'drop':
+            return None
+        if policy == 'compress':
+            return zlib.compress(text.encode('utf-8'))
+        if policy == 'spill':
+            return (store or default_raw_store()).put(text)
+        return text
+
+    @staticmethod
+    def _unpack_text(value, store: Optional[RawTextStore]) -> Optional[str]:
+        if isinstance(value, bytes):
+            return zlib.decompress(value).decode('utf-8')
+        if isinstance(value, int):
+            return (store or default_raw_store()).get(value)
+        return value
+
+    @classmethod
+    def from_dict(cls, analysis: Dict, policy: str = RAW_TEXT_POLICY,
+                  store: Optional[RawTextStore] = None) -> 'AnalysisRecord':
+        """Rekord z wyniku OpenAIVisionAnalyzer (policy dotyczy raw_response i reasoning)"""
+        timestamp = analysis.get('timestamp')
+        try:
+            epoch = datetime.fromisoformat(timestamp).timestamp() if timestamp else 0.0
+        except (TypeError, ValueError):
+            epoch = float(timestamp) if isinstance(timestamp, (int, float)) else 0.0
+
+        details = analysis.get('details')
+        if isinstance(details, dict) and set(details) <= set(_DETAIL_KEYS):
+            details = _intern_details(tuple(_intern(details.get(key)) for key in _DETAIL_KEYS))
+        elif details is not None:
+            details = dict(details)
+
+        usage = analysis.get('usage') or {}
+        extra = {key: value for key, value in analysis.items() if key not in _KNOWN_KEYS}
+        if analysis.get('usage') is not None and set(usage) - {'prompt_tokens', 'completion_tokens', 'total_tokens'}:
+            extra['usage'] = usage
+
+        return cls(
+            condition=analysis.get('weather_condition', 'unknown'),
+            confidence=analysis.get('confidence', 0.0) or 0.0,
+            timestamp=epoch,
+            source=analysis.get('source', 'unknown'),
+            image_path=analysis.get('image_path'),
+            description=analysis.get('description'),
+            model=analysis.get('model'),
+            details=details,
+            reasoning=cls._pack_text(analysis.get('reasoning'), policy, store),
+            raw_response=cls._pack_text(analysis.get('raw_response'), policy, store),
+            prompt_tokens=usage.get('prompt_tokens'),
+            completion_tokens=usage.get('completion_tokens'),
+            cost_usd=analysis.get('cost_usd'),
+            correlation_id=_pack_correlation_id(analysis.get('correlation_id')),
+            sampling_weight=analysis.get('sampling_weight', 1.0),
+            extra=extra
+        )
+
+    def to_dict(self, store: Optional[RawTextStore] = None) -> Dict:
+        """Z powrotem do schematu dict (teksty pominięte przez 'drop' nie wracają)"""
+        result = {'weather_condition': self.condition, 'confidence': self.confidence}
+        if self.description is not None:
+            result['description'] = self.description_str
+        if isinstance(self.details, tuple):
+            result['details'] = dict(zip(_DETAIL_KEYS, self.details))
+        elif self.details is not None:
+            result['details'] = dict(self.details)
+        reasoning = self._unpack_text(self.reasoning, store)
+        if reasoning is not None:
+            result['reasoning'] = reasoning
+        result['timestamp'] = datetime.fromtimestamp(self.timestamp).isoformat() if self.timestamp else None
+        result['source'] = self.source
+        if self.image_path is not None:
+            result['image_path'] = self.image_path
+        if self.model is not None:
+            result['model'] = self.model
+        raw_response = self._unpack_text(self.raw_response, store)
+        if raw_response is not None:
+            result['raw_response'] = raw_response
+        if self.prompt_tokens is not None or self.completion_tokens is not None:
+            prompt, completion = self.prompt_tokens or 0, self.completion_tokens or 0
+            result['usage'] = {'prompt_tokens': prompt, 'completion_tokens': completion,
+                               'total_tokens': prompt + completion}
+        if self.cost_usd is not None:
+            result['cost_usd'] = self.cost_usd
+        if self.correlation_id is not None:
+            result['correlation_id'] = self.correlation_id_str
+        if self.sampling_weight != 1.0:
+            result['sampling_weight'] = self.sampling_weight
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+    @property
+    def description_str(self) -> Optional[str]:
+        return self.description.decode('utf-8') if isinstance(self.description, bytes) else self.description
+
+    @property
+    def correlation_id_str(self) -> Optional[str]:
+        if isinstance(self.correlation_id, int):
+            return f"{self.correlation_id:016x}"
+        return self.correlation_id
+
+    def get(self, key: str, default=None):
+        """Odczyt jak ze słownika dla najczęstszych pól (agregacja, podsumowania)"""
+        if key == 'weather_condition':
+            return self.condition
+        if key == 'correlation_id':
+            return self.correlation_id_str
+        if key == 'description':
+            return self.description_str
+        if key == 'timestamp':
+            return self.timestamp or default
+        if key in ('confidence', 'source', 'image_path', 'model',
+                   'sampling_weight', 'cost_usd'):
+            value = getattr(self, key)
+            return default if value is None else value
+        return (self.extra or {}).get(key, default)
+
+    def __repr__(self) -> str:
+        return (f"AnalysisRecord({self.condition!r}, {self.confidence:.3f}, "
+                f"{self.image_path!r}, source={self.source!r})")
+
+
+def compact_analyses(analyses: Iterable[Dict], policy: str = RAW_TEXT_POLICY,
+                     store: Optional[RawTextStore] = None) -> List[AnalysisRecord]:
+    return [AnalysisRecord.from_dict(analysis, policy, store) for analysis in analyses]
+
+# Test function
+def test_records():
+    """Test compact records"""
+
+    import tracemalloc
+
+    print("🗜️ Testing compact analysis records...")
+
+    sample = {
+        "weather_condition": "rainy",
+        "confidence": 0.87,
+        "description": "Mokra nawierzchnia, ciemne chmury i parasole w tłumie.",
+        "details": {"sky_condition": "zachmurzone", "visibility": "średnia",
+                    "precipitation": "deszcz", "lighting": "pochmurno"},
+        "reasoning": "Widoczne krople deszczu na obiektywie i parasole. " * 4,
+        "timestamp": datetime.now().isoformat(),
+        "source": "openai_vision",
+        "image_path": "data/event_images/story_0042.jpg",
+        "model": "gpt-4o",
+        "raw_response": '```json\n{"weather_condition": "rainy", ...}\n```' * 20,
+        "usage": {"prompt_tokens": 1210, "completion_tokens": 180, "total_tokens": 1390},
+        "cost_usd": 0.004825,
+        "correlation_id": "3f2a9c1e5b7d4e60"
+    }
+    count = 5000
+
+    def measure(build):
+        tracemalloc.start()
+        items = build()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return items, size / count
+
+    def as_dicts():
+        import json
+        return [json.loads(json.dumps(dict(sample, image_path=f"img_{i}.jpg"))) for i in range(count)]
+
+    dicts, dict_bytes = measure(as_dicts)
+    # Rekordy z nowych słowników, które potem są zwalniane - liczy się tylko to, co zostaje
+    records, record_bytes = measure(lambda: compact_analyses(as_dicts(), policy='drop'))
+
+    print(f"📦 dict: {dict_bytes:.0f} B/analiza, AnalysisRecord: {record_bytes:.0f} B/analiza "
+          f"(×{dict_bytes / record_bytes:.1f})")
+    assert AnalysisRecord.from_dict(sample, policy='compress').to_dict() == sample
+    print("✅ Konwersja dict → rekord → dict bez strat (policy=compress)")
+
+if __name__ == "__main__":
+    test_records()
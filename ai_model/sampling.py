@@ -0,0 +1,237 @@
+"""
+Adaptive Sampling for WeatherEyes
+Odrzucanie nadmiaru zdjęć przy przeciążeniu: priorytet wg świeżości, nowości
+i różnorodności źródeł, z wagami próbkowania dla nieobciążonych podsumowań
+"""
+
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python ai_model/sampling.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.metrics import metrics
+from monitoring.log_config import get_logger
+
+logger = get_logger(__name__)
+
+SAMPLER_MAX_QUEUE = int(os.getenv('SAMPLER_MAX_QUEUE', '200'))
+SAMPLER_TARGET_LATENCY_S = float(os.getenv('SAMPLER_TARGET_LATENCY_S', '5.0'))
+
+# Dolna granica składowych ważności - każde zdjęcie ma niezerową szansę (wymóg wag 1/p)
+MIN_SCORE = 0.05
+
+
+def _epoch(value) -> float:
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+def hamming(a: str, b: str) -> int:
+    """Odległość Hamminga dwóch hashy hex (np. dHash z ai_model.preprocess)"""
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+def candidate(image_path: str, source: Optional[str] = None, timestamp=None,
+              dhash: Optional[str] = None, **extra) -> Dict:
+    """Zdjęcie czekające na analizę; czas domyślnie z mtime pliku, źródło z katalogu"""
+    if timestamp is None:
+        try:
+            timestamp = os.path.getmtime(image_path)
+        except OSError:
+            timestamp = time.time()
+    return dict(extra, image_path=image_path, source=source or Path(image_path).parent.name,
+                timestamp=_epoch(timestamp), dhash=dhash)
+
+
+class AdaptiveSampler:
+    """
+    Przy normalnym obciążeniu przepuszcza wszystko (waga 1). Gdy kolejka albo
+    opóźnienie analiz przekroczą próg, wybiera podzbiór metodą priority sampling:
+    ważność w = świeżość × nowość × różnorodność źródła, priorytet w/u (u ~ U(0,1]),
+    zostaje `capacity` zdjęć o najwyższym priorytecie. Każde ma sampling_weight
+    = max(1, τ/w), gdzie τ to priorytet pierwszego odrzuconego - suma wag jest
+    nieobciążonym estymatorem liczby zdjęć (także per warunek pogodowy).
+
+    Pełna kolejka analiz nie odrzuca zdjęć od razu - trafiają do bufora odroczonych
+    i wracają w następnej rundzie (starsze niż max_defer_s wygasają).
+    """
+
+    def __init__(self, max_queue: int = SAMPLER_MAX_QUEUE, target_latency_s: float = SAMPLER_TARGET_LATENCY_S,
+                 recency_half_life_s: float = 900.0, novelty_bits: int = 12, history_size: int = 1000,
+                 max_deferred: int = 1000, max_defer_s: float = 1800.0, min_keep: int = 1,
+                 seed: Optional[int] = None):
+        self.max_queue = max_queue
+        self.target_latency_s = target_latency_s
+        self.recency_half_life_s = recency_half_life_s
+        self.novelty_bits = novelty_bits
+        self.max_deferred = max_deferred
+        self.max_defer_s = max_defer_s
+        self.min_keep = min_keep
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._history: deque = deque(maxlen=history_size)  # dHashe przeanalizowanych zdjęć
+        self._deferred: deque = deque()
+        self._latency: Optional[float] = None
+        self.queue_depth = 0
+
+    def observe(self, latency_s: Optional[float] = None, queue_depth: Optional[int] = None):
+        """Aktualny stan etapu analizy: czas jednej analizy (EWMA) i głębokość kolejki"""
+        with self._lock:
+            if latency_s is not None:
+                self._latency = latency_s if self._latency is None else 0.8 * self._latency + 0.2 * latency_s
+            if queue_depth is not None:
+                self.queue_depth = queue_depth
+        if latency_s is not None:
+            metrics.set_gauge('sampler_latency_seconds', self._latency)
+
+    def remember(self, dhash: Optional[str]):
+        """Dodaje zdjęcie do historii przeanalizowanych (punkt odniesienia nowości)"""
+        if dhash:
+            with self._lock:
+                self._history.append(dhash)
+
+    def take_deferred(self) -> List[Dict]:
+        """Zabiera zdjęcia z bufora odroczonych (wywołujący sam decyduje o ponowieniu)"""
+        with self._lock:
+            items = list(self._deferred)
+            self._deferred.clear()
+        return items
+
+    def overloaded(self) -> bool:
+        return (self.queue_depth >= self.max_queue or
+                (self._latency is not None and self._latency > self.target_latency_s))
+
+    def capacity(self, pending: int) -> int:
+        """Ile zdjęć z tej rundy zmieści się w limitach kolejki i opóźnienia"""
+        if not self.overloaded():
+            return pending
+        free = max(0, self.max_queue - self.queue_depth)
+        if self._latency and self._latency > self.target_latency_s:
+            free = min(free, max(self.min_keep, int(pending * self.target_latency_s / self._latency)))
+        return min(pending, free)
+
+    def _novelty(self, dhash: Optional[str]) -> float:
+        if not dhash or not self._history:
+            return 1.0
+        nearest = min(hamming(dhash, seen) for seen in self._history)
+        return max(MIN_SCORE, min(1.0, nearest / self.novelty_bits))
+
+    def importance(self, item: Dict, source_counts: Dict[str, int], now: float) -> float:
+        """w = świeżość × nowość × różnorodność (każda składowa w [MIN_SCORE, 1])"""
+        age = max(0.0, now - item['timestamp'])
+        recency = max(MIN_SCORE, 0.5 ** (age / self.recency_half_life_s))
+        novelty = self._novelty(item.get('dhash'))
+        diversity = 1.0 / math.sqrt(source_counts.get(item.get('source'), 1))
+        return recency * novelty * diversity
+
+    def sample(self, candidates: List[Dict]) -> Dict:
+        """
+        Runda próbkowania: nowe zdjęcia + odroczone z poprzednich rund.
+        Zwraca {'selected', 'deferred', 'dropped', 'expired', 'capacity', 'overloaded'};
+        wybrane zdjęcia mają 'sampling_weight' i 'sampling_importance'.
+        """
+        now = time.time()
+        with self._lock:
+            previous = list(self._deferred)
+            self._deferred.clear()
+
+        # Odroczone zbyt dawno przestają być aktualne
+        still_fresh = [item for item in previous if now - item['timestamp'] <= self.max_defer_s]
+        expired = len(previous) - len(still_fresh)
+        pending = still_fresh + list(candidates)
+
+        overloaded = self.overloaded()
+        capacity = self.capacity(len(pending))
+
+        if capacity >= len(pending):
+            selected, dropped, deferred = pending, [], []
+            for item in selected:
+                item['sampling_weight'] = 1.0
+        elif self.queue_depth >= self.max_queue:
+            # Kolejka pełna - nic nie odrzucamy na ślepo, czekamy na wolne miejsce
+            selected, dropped = [], []
+            deferred = sorted(pending, key=lambda i: i['timestamp'], reverse=True)[:self.max_deferred]
+            expired += len(pending) - len(deferred)
+        else:
+            selected, dropped = self._priority_sample(pending, capacity, now)
+            deferred = []
+
+        with self._lock:
+            self._deferred.extend(deferred)
+
+        for name, count in (('selected', len(selected)), ('deferred', len(deferred)),
+                            ('dropped', len(dropped)), ('expired', expired)):
+            if count:
+                metrics.inc('sampler_images_total', count, decision=name)
+        if dropped or deferred:
+            logger.info("Load shedding", extra={
+                'pending': len(pending), 'capacity': capacity, 'selected': len(selected),
+                'deferred': len(deferred), 'dropped': len(dropped), 'queue_depth': self.queue_depth,
+                'latency_s': round(self._latency or 0.0, 3)
+            })
+
+        return {'selected': selected, 'deferred': len(deferred), 'dropped': len(dropped),
+                'expired': expired, 'capacity': capacity, 'overloaded': overloaded}
+
+    def _priority_sample(self, pending: List[Dict], capacity: int, now: float):
+        source_counts: Dict[str, int] = {}
+        for item in pending:
+            source_counts[item.get('source')] = source_counts.get(item.get('source'), 0) + 1
+
+        ranked = []
+        for item in pending:
+            weight = self.importance(item, source_counts, now)
+            priority = weight / (1.0 - self._random.random())  # u ∈ (0, 1]
+            ranked.append((priority, weight, item))
+        ranked.sort(key=lambda entry: entry[0], reverse=True)
+
+        kept, rest = ranked[:capacity], ranked[capacity:]
+        threshold = rest[0][0] if rest else 0.0
+        selected = []
+        for _, weight, item in kept:
+            item['sampling_importance'] = round(weight, 6)
+            item['sampling_weight'] = max(1.0, threshold / weight)
+            selected.append(item)
+        return selected, [item for _, _, item in rest]
+
+# Test function
+def test_sampling():
+    """Test adaptive sampler"""
+
+    print("🎯 Testing adaptive sampler...")
+
+    sampler = AdaptiveSampler(max_queue=50, target_latency_s=1.0, seed=42)
+    sampler.observe(latency_s=4.0)
+    now = time.time()
+    rng = random.Random(1)
+    candidates = [candidate(f"data/event_images/{'tiktok' if i % 5 else 'instagram'}/img_{i}.jpg",
+                            timestamp=now - rng.uniform(0, 3600), dhash=f"{rng.getrandbits(64):016x}",
+                            weather='rainy' if i % 3 else 'sunny')
+                  for i in range(400)]
+
+    result = sampler.sample(candidates)
+    estimated = {}
+    for item in result['selected']:
+        estimated[item['weather']] = estimated.get(item['weather'], 0) + item['sampling_weight']
+    actual = {w: sum(1 for c in candidates if c['weather'] == w) for w in ('rainy', 'sunny')}
+
+    print(f"✅ Wybrano {len(result['selected'])}/{len(candidates)} (capacity {result['capacity']})")
+    print(f"📊 Estymacja: { {k: round(v) for k, v in estimated.items()} }, faktycznie: {actual}")
+
+if __name__ == "__main__":
+    test_sampling()
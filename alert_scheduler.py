@@ -0,0 +1,83 @@
+"""
+WeatherEyes - Alert Scheduler CLI
+Harmonogramy codziennych podsumowań i alertów przed wydarzeniami (bot/scheduler.py)
+
+Użycie:
+    python alert_scheduler.py add-daily --location "SHAMAN Event" --at 20:00
+    python alert_scheduler.py add-event --name "Koncert" --time 2026-07-12T19:00 --location "SHAMAN Event"
+    python alert_scheduler.py add-digest --every 300
+    python alert_scheduler.py list
+    python alert_scheduler.py run
+"""
+
+import argparse
+import json
+import signal
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add project path
+sys.path.append(str(Path(__file__).parent))
+
+from bot.email_channel import EMAIL_DIGEST_INTERVAL_S
+from bot.scheduler import (CATCH_UP_POLICIES, DAILY_SUMMARY_AT, EVENT_ALERT_LEADS, SCHEDULER_CATCH_UP,
+                           AlertScheduler, alert_handlers)
+from monitoring.log_config import setup_logging
+from storage.results_store import ResultsStore
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="WeatherEyes alert scheduler")
+    parser.add_argument('--db', default="data/weathereyes_results.db")
+    commands = parser.add_subparsers(dest='command', required=True)
+    daily = commands.add_parser('add-daily', help="Codzienne podsumowanie")
+    daily.add_argument('--location', required=True)
+    daily.add_argument('--at', default=DAILY_SUMMARY_AT)
+    daily.add_argument('--catch-up', choices=CATCH_UP_POLICIES, default=SCHEDULER_CATCH_UP)
+    event = commands.add_parser('add-event', help="Alerty przed wydarzeniem")
+    event.add_argument('--name', required=True)
+    event.add_argument('--time', required=True, help="ISO, np. 2026-07-12T19:00")
+    event.add_argument('--location', required=True)
+    event.add_argument('--leads', type=int, nargs='+', default=EVENT_ALERT_LEADS, help="Minuty przed")
+    digest = commands.add_parser('add-digest', help="Wysyłka digestów email")
+    digest.add_argument('--every', type=float, default=min(EMAIL_DIGEST_INTERVAL_S, 300), help="Sekundy")
+    remove = commands.add_parser('remove')
+    remove.add_argument('id')
+    commands.add_parser('list')
+    commands.add_parser('run', help="Uruchamia scheduler (SIGTERM/Ctrl+C kończy)")
+    args = parser.parse_args(argv)
+
+    setup_logging(fmt="text")
+    store = ResultsStore(args.db)
+    handlers = {'daily_summary': None, 'event_alert': None, 'email_digest': None}
+    if args.command == 'run':
+        from bot.real_alerts import RealAlertSystem
+        handlers = alert_handlers(RealAlertSystem(), store)
+    scheduler = AlertScheduler(store, handlers)
+
+    if args.command == 'add-daily':
+        print(json.dumps(scheduler.add_daily_summary(args.location, args.at, catch_up=args.catch_up),
+                         ensure_ascii=False, default=str))
+    elif args.command == 'add-event':
+        for job in scheduler.add_event(args.name, args.time, args.location, args.leads):
+            print(json.dumps(job, ensure_ascii=False, default=str))
+    elif args.command == 'add-digest':
+        print(json.dumps(scheduler.add_email_digest(args.every), ensure_ascii=False, default=str))
+    elif args.command == 'remove':
+        print("✅ Usunięto" if scheduler.remove(args.id) else "⚠️ Brak harmonogramu")
+    elif args.command == 'list':
+        for job in scheduler.schedules():
+            when = datetime.fromtimestamp(job['next_run']).isoformat() if job['next_run'] else '-'
+            print(f"{when}  {job['id']}  ({job['repeat'] or 'once'}, catch-up {job['catch_up']})")
+    else:
+        signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            scheduler.stop()
+    store.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+WeatherEyes - Batch Analysis CLI
+Analiza katalogu albo manifestu zdjęć bez dashboardu: checkpoint po każdym
+zdjęciu, wznawianie po przerwaniu i podział pracy między maszyny (--shard i/N)
+
+Użycie:
+    python batch_analyze.py data/event_images --concurrency 8
+    python batch_analyze.py manifest.jsonl --shard 0/4 --context "SHAMAN 2024"
+    python batch_analyze.py data/event_images --status
+    python batch_analyze.py /shared/event_images --queue sqlite:////shared/jobs.db   # na każdej maszynie
+"""
+
+import argparse
+import itertools
+import json
+import signal
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+# Add project path
+sys.path.append(str(Path(__file__).parent))
+
+from ai_model.keyframes import VIDEO_SUFFIXES, analyze_media
+from ai_model.openai_vision import OpenAIVisionAnalyzer
+from monitoring.log_config import get_logger, setup_logging
+from storage.checkpoint import BatchCheckpoint, parse_shard, shard_of
+from storage.jobs import WorkerSession, open_backend
+from storage.results_store import ResultsStore
+
+logger = get_logger("batch_analyze")
+
+MEDIA_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp'} | VIDEO_SUFFIXES
+
+
+def discover_items(source: Path) -> List[Dict]:
+    """
+    Elementy do analizy, posortowane po kluczu (deterministyczna kolejność).
+    Katalog: zdjęcia i klipy wideo rekurencyjnie, klucz = ścieżka względna (ta sama na każdej maszynie).
+    Manifest .txt: jedna ścieżka na linię. Manifest .jsonl: {"image_path", "context",
+    "priority", "location"} na linię. Kluczem w manifeście jest image_path.
+    """
+    items = []
+    if source.is_dir():
+        for path in source.rglob('*'):
+            if path.suffix.lower() in MEDIA_SUFFIXES and path.is_file():
+                items.append({'key': path.relative_to(source).as_posix(), 'image_path': str(path)})
+    else:
+        with open(source, encoding='utf-8') as manifest:
+            for line in manifest:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                entry = json.loads(line) if source.suffix == '.jsonl' else {'image_path': line}
+                entry['key'] = entry['image_path']
+                items.append(entry)
+    return sorted(items, key=lambda item: item['key'])
+
+
+def default_job(source: Path, shard: str) -> str:
+    return f"{source.resolve().as_posix()}#{shard}"
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_batch(items: Iterable[Dict], checkpoint: BatchCheckpoint, analyzer: OpenAIVisionAnalyzer,
+              context: str = "", priority: str = 'normal', concurrency: int = 4) -> Dict:
+    """
+    Analizuje elementy współbieżnie, w locie najwyżej `concurrency` zdjęć.
+    items to lista albo iterator (WorkerSession.claims() - zadania brane z kolejki na bieżąco),
+    checkpoint - BatchCheckpoint albo WorkerSession.
+    Każdy wynik trafia do bazy razem z checkpointem, zanim zostanie zlecone kolejne zdjęcie,
+    więc przerwanie (Ctrl+C / SIGTERM) traci co najwyżej zdjęcia, które były w locie.
+    """
+    counts = {'done': 0, 'skipped': 0, 'failed': 0, 'deferred': 0}
+    total = len(items) if isinstance(items, list) else None
+    remaining = iter(items)
+    in_flight = {}
+    start = time.perf_counter()
+
+    def submit_next(pool) -> bool:
+        item = next(remaining, None)
+        if item is None:
+            return False
+        future = pool.submit(analyze_media, analyzer, item['image_path'],
+                             item.get('context', context), item.get('location'),
+                             item.get('priority', priority))
+        in_flight[future] = item
+        return True
+
+    def record(future):
+        item = in_flight.pop(future)
+        try:
+            result = future.result()
+        except Exception as e:
+            checkpoint.fail(item['key'], str(e))
+            counts['failed'] += 1
+            return
+        result.setdefault('image_path', item['image_path'])
+
+        if result.get('source') == 'budget_skipped':
+            checkpoint.defer(item['key'], result.get('error', 'budget'))
+            counts['deferred'] += 1
+        elif result.get('source') == 'error':
+            checkpoint.fail(item['key'], result.get('error', 'unknown'))
+            counts['failed'] += 1
+        else:
+            # Odrzucone przez bramkę jakości też są "zrobione" - ponowna próba nic nie zmieni
+            checkpoint.complete(item['key'], result)
+            counts['skipped' if result.get('source') == 'quality_skipped' else 'done'] += 1
+
+        finished = sum(counts.values())
+        logger.info("Checkpoint", extra={
+            'sampled': True, 'index': finished, 'total': total, 'item': item['key'],
+            'status': result.get('source'), 'rate_per_s': round(finished / (time.perf_counter() - start), 2)
+        })
+
+    interrupted = False
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        try:
+            while len(in_flight) < concurrency and submit_next(pool):
+                pass
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record(future)
+                    submit_next(pool)
+        except KeyboardInterrupt:
+            # Zapytania w locie są już opłacone - dokończ je i zapisz, nie zlecaj nowych
+            interrupted = True
+            logger.warning("Przerwano - zapisuję zdjęcia w locie", extra={'in_flight': len(in_flight)})
+            for future in list(in_flight):
+                if future.cancel():
+                    in_flight.pop(future)
+                else:
+                    record(future)
+
+    return dict(counts, interrupted=interrupted, elapsed_s=round(time.perf_counter() - start, 2))
+
+
+def run_queue(args, items: List[Dict], store: ResultsStore, queue: str) -> int:
+    """
+    Tryb wielu maszyn: elementy trafiają do wspólnej kolejki (bez duplikatów),
+    a ten proces bierze z niej zadania z dzierżawą, dopóki coś zostało
+    """
+    backend = open_backend(args.queue)
+    if args.status:
+        # Sam podgląd - bez dodawania zadań do kolejki
+        print(f"🧾 Kolejka {queue}: {backend.stats(queue)}")
+        store.close()
+        return 0
+    added = backend.enqueue(queue, items)
+    print(f"🧾 Kolejka {queue}: dodano {added}, stan: {backend.stats(queue)}")
+
+    def localized(claims):
+        # Klucz to ścieżka względna - na tej maszynie katalog może być zamontowany gdzie indziej
+        for item in claims:
+            yield dict(item, image_path=str(args.input / item['key'])) if args.input.is_dir() else item
+
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    analyzer = OpenAIVisionAnalyzer()
+    summary = {'done': 0, 'skipped': 0, 'failed': 0, 'deferred': 0, 'interrupted': False, 'elapsed_s': 0.0,
+               'budget_exhausted': False}
+    remaining = args.limit
+    with WorkerSession(backend, queue, store, max_attempts=args.max_attempts) as session:
+        # Runda = wszystko, co da się teraz wziąć; potem czekanie, aż dzierżawy innych się skończą albo wygasną
+        while not summary['interrupted'] and remaining != 0:
+            claims = itertools.islice(localized(session.claims()), remaining)
+            round_summary = run_batch(claims, session, analyzer, args.context, args.priority,
+                                      max(1, args.concurrency))
+            summary['interrupted'] = round_summary.pop('interrupted')
+            for name, value in round_summary.items():
+                summary[name] += value
+            if remaining is not None:
+                remaining -= sum(round_summary[name] for name in ('done', 'skipped', 'failed', 'deferred'))
+            if round_summary['deferred'] and not (round_summary['done'] or round_summary['skipped']):
+                # Runda bez żadnej analizy, tylko odłożenia (i błędy) - budżet wyczerpany,
+                # dalsze odpytywanie tylko odkładałoby zdjęcia w kółko do zmiany dnia
+                summary['budget_exhausted'] = True
+                break
+            if session.drained():
+                break
+            try:
+                time.sleep(session.poll_s)
+            except KeyboardInterrupt:
+                summary['interrupted'] = True
+    summary['elapsed_s'] = round(summary['elapsed_s'], 2)
+
+    store.append_run({
+        'type': 'batch',
+        'job': queue,
+        'worker': session.worker_id,
+        'timestamp': datetime.now().isoformat(),
+        'queue': session.stats(),
+        **summary
+    })
+    print(f"✅ Worker {session.worker_id}: zrobione {summary['done']}, słaba jakość: {summary['skipped']}, "
+          f"nieudane: {summary['failed']}, odłożone: {summary['deferred']} w {summary['elapsed_s']}s "
+          f"- kolejka: {session.stats()}")
+    if summary['budget_exhausted']:
+        print(f"💰 Budżet wyczerpany - {summary['deferred']} zdjęć odłożonych w kolejce "
+              f"(wrócą po JOB_DEFER_DELAY_S, uruchom workera ponownie)")
+    store.close()
+    return 130 if summary['interrupted'] else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="WeatherEyes batch analysis with checkpointing")
+    parser.add_argument('input', type=Path, help="Katalog ze zdjęciami albo manifest (.txt / .jsonl)")
+    parser.add_argument('--concurrency', type=int, default=4, help="Zdjęcia analizowane równolegle")
+    parser.add_argument('--shard', type=str, default=None, help="Część pracy tej maszyny: i/N")
+    parser.add_argument('--context', type=str, default="", help="Dodatkowy kontekst dla modelu")
+    parser.add_argument('--priority', choices=('low', 'normal', 'high'), default='normal')
+    parser.add_argument('--db', type=str, default="data/weathereyes_results.db",
+                        help="Baza wyników (w niej też checkpoint)")
+    parser.add_argument('--job', type=str, default=None,
+                        help="Nazwa zadania w checkpoincie (domyślnie: ścieżka wejścia + shard)")
+    parser.add_argument('--max-attempts', type=int, default=3,
+                        help="Po tylu nieudanych próbach zdjęcie jest pomijane przy wznowieniu")
+    parser.add_argument('--limit', type=int, default=None, help="Najwyżej tyle zdjęć w tym przebiegu")
+    parser.add_argument('--retry-failed', action='store_true', help="Zeruje licznik prób nieudanych zdjęć")
+    parser.add_argument('--status', action='store_true', help="Tylko pokaż postęp zadania")
+    parser.add_argument('--queue', type=str, default=None,
+                        help="Wspólna kolejka zadań wielu maszyn, np. sqlite:////shared/jobs.db (zamiast --shard)")
+    args = parser.parse_args(argv)
+
+    setup_logging(fmt="text")
+
+    try:
+        shard_index, shard_count = parse_shard(args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+    shard = f"{shard_index}/{shard_count}"
+    if not args.input.exists():
+        parser.error(f"Brak wejścia: {args.input}")
+
+    items = [item for item in discover_items(args.input) if shard_of(item['key'], shard_count) == shard_index]
+    store = ResultsStore(args.db)
+    if args.queue:
+        return run_queue(args, items, store, args.job or args.input.name)
+    checkpoint = BatchCheckpoint(store, args.job or default_job(args.input, shard))
+
+    if args.retry_failed:
+        checkpoint.reset('failed')
+    pending_keys = set(checkpoint.pending((item['key'] for item in items), args.max_attempts))
+    pending = [item for item in items if item['key'] in pending_keys][:args.limit]
+
+    print(f"📦 Shard {shard}: {len(items)} zdjęć, do zrobienia {len(pending_keys)}, "
+          f"stan: {checkpoint.stats()}")
+    if args.status or not pending:
+        store.close()
+        return 0
+
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    summary = run_batch(pending, checkpoint, OpenAIVisionAnalyzer(), args.context,
+                        args.priority, max(1, args.concurrency))
+
+    store.append_run({
+        'type': 'batch',
+        'job': checkpoint.job,
+        'shard': shard,
+        'items': len(items),
+        'timestamp': datetime.now().isoformat(),
+        'checkpoint': checkpoint.stats(),
+        **summary
+    })
+    print(f"✅ Zrobione: {summary['done']}, słaba jakość: {summary['skipped']}, nieudane: {summary['failed']}, odłożone: {summary['deferred']} "
+          f"w {summary['elapsed_s']}s - stan: {checkpoint.stats()}")
+    store.close()
+    return 130 if summary['interrupted'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
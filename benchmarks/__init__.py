@@ -0,0 +1 @@
+# WeatherEyes Benchmarks Module 
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+Aggregation Benchmark
+Podsumowanie N analiz: pętla po słownikach (dotychczasowa) vs kolumny NumPy + posterior
+
+Użycie:
+    python -m benchmarks.bench_aggregation --analyses 100000 --output aggregation.json
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+# Add project path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_model.aggregation import CONDITIONS, AnalysisColumns, CalibrationCurves, aggregate
+from monitoring.build_info import git_commit
+
+
+def make_analyses(count: int, seed: int = 7) -> List[Dict]:
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(hours=2)
+    return [{
+        'weather_condition': rng.choices(CONDITIONS, weights=(15, 30, 40, 2, 5, 5, 3))[0],
+        'confidence': rng.uniform(0.3, 0.95),
+        'timestamp': (start + timedelta(seconds=rng.uniform(0, 7200))).isoformat(),
+        'source': rng.choice(('openai_vision', 'openai_vision_text')),
+        'image_path': f"img_{i}.jpg"
+    } for i in range(count)]
+
+
+def legacy_summary(analyses: List[Dict]) -> Dict:
+    """Dotychczasowe podsumowanie: pętla po słownikach, dominanta wg liczby"""
+    weather_counts = {}
+    total_confidence = 0
+    valid = 0
+    for analysis in analyses:
+        if analysis.get('weather_condition') and analysis.get('weather_condition') != 'unknown':
+            weather = analysis['weather_condition']
+            info = weather_counts.setdefault(weather, {'count': 0, 'total_confidence': 0, 'images': []})
+            info['count'] += 1
+            info['total_confidence'] += analysis.get('confidence', 0)
+            info['images'].append(analysis.get('image_path', ''))
+            total_confidence += analysis.get('confidence', 0)
+            valid += 1
+    dominant = max(weather_counts.items(), key=lambda x: x[1]['count'])[0]
+    return {'dominant_weather': dominant, 'confidence': total_confidence / valid}
+
+
+def best_ms(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(min(timings), 3)
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Vectorized aggregation benchmark")
+    parser.add_argument('--analyses', type=int, default=100_000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', type=str, default=None)
+    args = parser.parse_args(argv)
+
+    analyses = make_analyses(args.analyses)
+    columns = AnalysisColumns.from_analyses(analyses)
+    calibration = CalibrationCurves({'openai_vision_text': {'x': [0.0, 0.5, 1.0], 'y': [0.2, 0.4, 0.7]}})
+
+    results = {
+        'legacy_loop_ms': best_ms(lambda: legacy_summary(analyses), args.repeats),
+        'columns_build_ms': best_ms(lambda: AnalysisColumns.from_analyses(analyses), args.repeats),
+        'aggregate_linear_ms': best_ms(lambda: aggregate(columns, calibration), args.repeats),
+        'aggregate_log_ms': best_ms(lambda: aggregate(columns, calibration, method='log'), args.repeats)
+    }
+    for name, value in results.items():
+        print(f"✅ {name}: {value} ms")
+
+    report = {'commit': git_commit(), 'benchmark': 'aggregation', 'analyses': args.analyses,
+              'results': results, 'summary': aggregate(columns, calibration)}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"📁 Raport zapisany: {args.output}")
+    return report
+
+if __name__ == "__main__":
+    main()
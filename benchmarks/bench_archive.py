@@ -0,0 +1,99 @@
+"""
+Archive Benchmark
+Pytanie historyczne ("jak często padało na miejscu o 18:00 w sezonie"):
+baza wyników (JSON w SQLite + filtr w Pythonie) vs archiwum kolumnowe (memmap)
+
+Użycie:
+    python -m benchmarks.bench_archive --analyses 300000 --output archive.json
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict
+
+# Add project path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_model.aggregation import CONDITIONS
+from monitoring.build_info import git_commit
+from storage.archive import ColumnarArchive
+from storage.results_store import ResultsStore
+
+SEASON_DAYS = 120
+PLACES = ('SHAMAN Event', 'Stadion', 'Rynek')
+
+
+def fill_store(store: ResultsStore, count: int, season_start: datetime, seed: int = 7):
+    rng = random.Random(seed)
+    with store.transaction() as conn:
+        for i in range(count):
+            store.insert_analysis(conn, {
+                'weather_condition': rng.choices(CONDITIONS, weights=(25, 30, 25, 0, 5, 5, 10))[0],
+                'confidence': rng.uniform(0.3, 0.95),
+                'timestamp': (season_start + timedelta(seconds=rng.uniform(0, SEASON_DAYS * 86400))).isoformat(),
+                'source': 'openai_vision',
+                'image_path': f"img_{i}.jpg",
+                'location': {'name': rng.choice(PLACES), 'source': 'context'}
+            })
+
+
+def store_frequency(store: ResultsStore, since: datetime, until: datetime, place: str, hour: int) -> Dict:
+    """Jedyna droga bez archiwum: wszystkie analizy sezonu z JSON i filtr w Pythonie"""
+    counts = {}
+    for analysis in store.query_analyses(since=since, until=until):
+        if (analysis.get('location') or {}).get('name') != place:
+            continue
+        if datetime.fromisoformat(analysis['timestamp']).hour != hour:
+            continue
+        counts[analysis['weather_condition']] = counts.get(analysis['weather_condition'], 0) + 1
+    return counts
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Columnar archive benchmark")
+    parser.add_argument('--analyses', type=int, default=300_000)
+    parser.add_argument('--output', type=str, default=None)
+    args = parser.parse_args(argv)
+
+    season_start = datetime(2026, 5, 1)
+    season_end = season_start + timedelta(days=SEASON_DAYS)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultsStore(str(Path(tmp) / "results.db"))
+        fill_store(store, args.analyses, season_start)
+
+        start = time.perf_counter()
+        expected = store_frequency(store, season_start, season_end, 'SHAMAN Event', 18)
+        results['store_query_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+        start = time.perf_counter()
+        ColumnarArchive(str(Path(tmp) / "archive")).import_results_store(store)
+        results['archive_import_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+        # Zimny start: nowy obiekt archiwum, czas liczony z otwarciem
+        start = time.perf_counter()
+        archive = ColumnarArchive(str(Path(tmp) / "archive"))
+        frequency = archive.frequency(season_start, season_end, location='SHAMAN Event', hours=[18])
+        results['archive_query_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        results['same_answer'] = frequency['counts'] == expected
+        results['archive_bytes'] = archive.stats()['size_bytes']
+        results['store_bytes'] = store.db_path.stat().st_size
+        store.close()
+
+    for name, value in results.items():
+        print(f"✅ {name}: {value}")
+
+    report = {'commit': git_commit(), 'benchmark': 'archive', 'analyses': args.analyses, 'results': results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"📁 Raport zapisany: {args.output}")
+    return report
+
+if __name__ == "__main__":
+    main()
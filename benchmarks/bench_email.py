@@ -0,0 +1,87 @@
+"""
+Email Channel Benchmark
+Wysyłka N alertów email: nowe połączenie SMTP (connect + TLS + AUTH) na każdą
+wiadomość vs pula trwałych sesji (bot/email_channel.py) - na stubie SMTP
+z kosztem nawiązania sesji handshake_ms
+
+Użycie:
+    python -m benchmarks.bench_email --messages 200 --handshake-ms 150 --output email.json
+"""
+
+import argparse
+import json
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+# Add project path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.mock_servers import MockSMTPServer
+from bot.email_channel import SMTP_FROM, SMTPPool, build_message, email_html
+from monitoring.build_info import git_commit
+
+
+def per_message(server: MockSMTPServer, messages: List, workers: int) -> Dict:
+    """Dawny wzorzec: sesja SMTP otwierana i zamykana dla każdej wiadomości"""
+    def send(message):
+        with smtplib.SMTP(server.host, server.port) as conn:
+            conn.login('bench', 'secret')
+            conn.send_message(message)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(send, messages))
+    return {'elapsed_s': round(time.perf_counter() - start, 3), 'connections': server.stats['connections']}
+
+
+def pooled(server: MockSMTPServer, messages: List, workers: int, pool_size: int) -> Dict:
+    pool = SMTPPool(server.host, server.port, user='bench', password='secret', security='none', size=pool_size)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(pool.send, messages))
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return {'elapsed_s': round(elapsed, 3), 'connections': server.stats['connections'],
+            'sent': sum(1 for r in results if r['success'])}
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="SMTP per-message connect vs pooled sessions")
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--handshake-ms', type=float, default=150.0, help="Koszt nowej sesji (TCP + TLS + AUTH)")
+    parser.add_argument('--latency-ms', type=float, default=5.0, help="Czas przyjęcia wiadomości")
+    parser.add_argument('--workers', type=int, default=8, help="Wątki wysyłki (jak FanOutDispatcher)")
+    parser.add_argument('--pool-size', type=int, default=2)
+    parser.add_argument('--output', type=str, default=None)
+    args = parser.parse_args(argv)
+
+    body = email_html("🌧️ <b>Zmiana Pogody Wykryta!</b>\n📍 Lokalizacja: SHAMAN Event\n• Pewność: 89%")
+    messages = [build_message(SMTP_FROM, f"fan{i}@example.com", "WeatherEyes: sunny → rainy", body)
+                for i in range(args.messages)]
+
+    results = {}
+    with MockSMTPServer(handshake_ms=args.handshake_ms, latency_ms=args.latency_ms) as server:
+        results['per_message'] = per_message(server, messages, args.workers)
+    with MockSMTPServer(handshake_ms=args.handshake_ms, latency_ms=args.latency_ms) as server:
+        results['pooled'] = pooled(server, messages, args.workers, args.pool_size)
+    results['speedup'] = round(results['per_message']['elapsed_s'] / max(results['pooled']['elapsed_s'], 1e-9), 2)
+
+    for name in ('per_message', 'pooled'):
+        result = results[name]
+        print(f"✅ {name:12s} {result['elapsed_s']} s, sesje SMTP: {result['connections']}, "
+              f"{args.messages / max(result['elapsed_s'], 1e-9):.0f} maili/s")
+    print(f"🚀 Przyspieszenie: {results['speedup']}x")
+
+    report = {'commit': git_commit(), 'benchmark': 'email', 'messages': args.messages,
+              'handshake_ms': args.handshake_ms, 'results': results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"📁 Raport zapisany: {args.output}")
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Image Encoding Benchmark
+Porównuje szczytowe zużycie pamięci i czas: dotychczasowe kodowanie
+(read → b64encode → decode → f-string → json.dumps) vs build_json_body (mmap + chunki)
+
+Użycie:
+    python -m benchmarks.bench_image_encoding --sizes-mb 1 5 20 --output encoding.json
+
+Uwaga: tracemalloc liczy alokacje Pythona; strony mmap należą do page cache
+systemu i mogą być zwolnione przez kernel, więc nie są wliczane.
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict
+
+# Add project path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_model.image_encoding import build_json_body, image_data_url_template
+from monitoring.build_info import git_commit
+
+
+def _payload(url: str) -> Dict:
+    return {
+        "model": "gpt-4o",
+        "messages": [{"role": "user", "content": [
+            {"type": "text", "text": "Przeanalizuj to zdjęcie"},
+            {"type": "image_url", "image_url": {"url": url, "detail": "high"}}
+        ]}],
+        "max_tokens": 500,
+        "temperature": 0.1
+    }
+
+
+def legacy_body(image_path: str) -> bytes:
+    """Ścieżka sprzed zmiany: cztery pełne kopie zdjęcia po drodze"""
+    with open(image_path, "rb") as image_file:
+        base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+    return json.dumps(_payload(f"data:image/jpeg;base64,{base64_image}")).encode('utf-8')
+
+
+def streaming_body(image_path: str) -> bytearray:
+    return build_json_body(_payload(image_data_url_template(image_path)), image_path)
+
+
+def measure(func: Callable, image_path: str, repeats: int) -> Dict:
+    timings = []
+    peak = 0
+    for _ in range(repeats):
+        tracemalloc.start()
+        start = time.perf_counter()
+        body = func(image_path)
+        timings.append((time.perf_counter() - start) * 1000)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        del body
+    return {
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'peak_memory_mb': round(peak / 1024 / 1024, 3)
+    }
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Streaming vs legacy image encoding benchmark")
+    parser.add_argument('--sizes-mb', type=float, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', type=str, default=None)
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.sizes_mb:
+            path = Path(tmp) / f"bench_{size_mb}mb.jpg"
+            path.write_bytes(os.urandom(int(size_mb * 1024 * 1024)))
+
+            assert bytes(streaming_body(str(path))) == legacy_body(str(path))
+
+            legacy = measure(legacy_body, str(path), args.repeats)
+            streaming = measure(streaming_body, str(path), args.repeats)
+            results.append({
+                'size_mb': size_mb,
+                'legacy': legacy,
+                'streaming': streaming,
+                'peak_memory_ratio': round(streaming['peak_memory_mb'] / max(legacy['peak_memory_mb'], 1e-9), 3)
+            })
+            print(f"📸 {size_mb} MB: legacy {legacy['peak_memory_mb']} MB / {legacy['mean_ms']} ms → "
+                  f"streaming {streaming['peak_memory_mb']} MB / {streaming['mean_ms']} ms")
+
+    report = {'commit': git_commit(), 'benchmark': 'image_encoding', 'results': results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding='utf-8')
+        print(f"📁 Raport zapisany: {args.output}")
+    return report
+
+if __name__ == "__main__":
+    main()
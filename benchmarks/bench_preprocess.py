@@ -0,0 +1,82 @@
+"""
+Preprocessing Scaling Benchmark
+Przepustowość obróbki zdjęć (zdjęcia/s) w zależności od liczby procesów
+
+Użycie:
+    python -m benchmarks.bench_preprocess --images 64 --workers 1 2 4 8 --output preprocess.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# Add project path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_model.preprocess import ImagePreprocessor, available_cores
+from monitoring.build_info import git_commit
+
+
+def make_photos(directory: Path, count: int, width: int, height: int) -> List[str]:
+    """Zdjęcia JPEG z szumem - dekodowanie i skalowanie kosztują jak w prawdziwych zdjęciach"""
+    from PIL import Image
+
+    paths = []
+    for i in range(count):
+        path = directory / f"photo_{i:04d}.jpg"
+        Image.frombytes('RGB', (width, height), os.urandom(width * height * 3)).save(path, quality=90)
+        paths.append(str(path))
+    return paths
+
+
+def run(paths: List[str], workers: int, output_dir: str) -> Dict:
+    with ImagePreprocessor(workers=workers, output_dir=output_dir) as preprocessor:
+        # Rozgrzewka - start procesów nie wlicza się do pomiaru
+        list(preprocessor.process(paths[:workers]))
+        start = time.perf_counter()
+        results = list(preprocessor.process(paths))
+        elapsed = time.perf_counter() - start
+    return {
+        'workers': workers,
+        'images': len(paths),
+        'elapsed_s': round(elapsed, 3),
+        'images_per_s': round(len(paths) / elapsed, 2) if elapsed > 0 else 0.0,
+        'errors': sum(1 for r in results if 'error' in r)
+    }
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Image preprocessing scaling benchmark")
+    parser.add_argument('--images', type=int, default=64)
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--workers', type=int, nargs='+', default=None)
+    parser.add_argument('--output', type=str, default=None)
+    args = parser.parse_args(argv)
+
+    cores = available_cores()
+    worker_counts = args.workers or sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_photos(Path(tmp), args.images, args.width, args.height)
+        for workers in worker_counts:
+            result = run(paths, workers, str(Path(tmp) / 'out'))
+            result['speedup'] = round(result['images_per_s'] / results[0]['images_per_s'], 2) if results else 1.0
+            results.append(result)
+            print(f"✅ {workers} proc.: {result['images_per_s']} zdjęć/s (×{result['speedup']})")
+
+    report = {'commit': git_commit(), 'benchmark': 'preprocess', 'cores': cores,
+              'image_size': [args.width, args.height], 'results': results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"📁 Raport zapisany: {args.output}")
+    return report
+
+if __name__ == "__main__":
+    main()
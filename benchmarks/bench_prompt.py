@@ -0,0 +1,140 @@
+"""
+Prompt Layout Benchmark
+Tokeny wejściowe (w tym z cache promptów) i czas zapytania dla układów:
+legacy (instrukcje + kontekst w jednym tekście, przed zdjęciem), full (stały prefiks
+system + kontekst i zdjęcie na końcu) i compact (krótsze instrukcje)
+
+Użycie:
+    python -m benchmarks.bench_prompt --requests 40 --output prompt.json
+    python -m benchmarks.bench_prompt --live --requests 5     # prawdziwe API (OPENAI_API_KEY)
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import textwrap
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Add project path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_model.image_encoding import image_data_url_template
+from ai_model.prompts import WEATHER_PROMPT_FULL
+from benchmarks.mock_servers import MockOpenAIServer
+from benchmarks.run_benchmarks import latency_stats, make_synthetic_images
+from monitoring.build_info import git_commit
+
+# Instrukcje w dawnym układzie: wcięte jak w kodzie, z kontekstem doklejonym w tym samym tekście
+LEGACY_PROMPT = "\n" + textwrap.indent(WEATHER_PROMPT_FULL, ' ' * 8) + "\n        "
+
+
+def legacy_analyzer_class():
+    from ai_model.openai_vision import OpenAIVisionAnalyzer
+
+    class LegacyLayoutAnalyzer(OpenAIVisionAnalyzer):
+        """Poprzedni układ zapytania: jedna wiadomość user, tekst przed zdjęciem"""
+
+        def _build_payload(self, image_path, additional_context="", plan=None, detail=None):
+            text = LEGACY_PROMPT + (f"\n\nDodatkowy kontekst: {additional_context}" if additional_context else "")
+            return {
+                "model": "gpt-4o",
+                "messages": [{"role": "user", "content": [
+                    {"type": "text", "text": text},
+                    {"type": "image_url", "image_url": {"url": image_data_url_template(image_path),
+                                                        "detail": detail or "high"}}
+                ]}],
+                "max_tokens": 500,
+                "temperature": 0.1
+            }
+
+    return LegacyLayoutAnalyzer
+
+
+def run_layout(layout: str, image_paths: List[str], contexts: List[str]) -> Dict:
+    from ai_model.openai_vision import OpenAIVisionAnalyzer
+
+    if layout == 'legacy':
+        analyzer = legacy_analyzer_class()(prompt_variant='full')
+    else:
+        analyzer = OpenAIVisionAnalyzer(prompt_variant=layout)
+
+    latencies, prompt_tokens, cached_tokens, completion_tokens, failures = [], [], [], [], 0
+    for image_path, context in zip(image_paths, contexts):
+        start = time.perf_counter()
+        result = analyzer.analyze_image(image_path, context)
+        latencies.append((time.perf_counter() - start) * 1000)
+        usage = result.get('usage')
+        if not usage:
+            failures += 1
+            continue
+        prompt_tokens.append(usage.get('prompt_tokens', 0))
+        completion_tokens.append(usage.get('completion_tokens', 0))
+        cached_tokens.append((usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0))
+
+    def mean(values: List[float]) -> Optional[float]:
+        return round(sum(values) / len(values), 1) if values else None
+
+    return {
+        'layout': layout,
+        'requests': len(image_paths),
+        'failures': failures,
+        'prompt_tokens_mean': mean(prompt_tokens),
+        'cached_tokens_mean': mean(cached_tokens),
+        'uncached_prompt_tokens_mean': mean([p - c for p, c in zip(prompt_tokens, cached_tokens)]),
+        'completion_tokens_mean': mean(completion_tokens),
+        'latency': latency_stats(latencies)
+    }
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Prompt layout benchmark (tokens and latency per request)")
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--image-kb', type=int, default=120)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="Opóźnienie stuba")
+    parser.add_argument('--layouts', nargs='+', default=['legacy', 'full', 'compact'])
+    parser.add_argument('--live', action='store_true', help="Prawdziwe API zamiast stuba (zużywa tokeny!)")
+    parser.add_argument('--images', type=str, default=None, help="Katalog z prawdziwymi zdjęciami (dla --live)")
+    parser.add_argument('--output', type=str, default=None)
+    args = parser.parse_args(argv)
+
+    # Bez bramki jakości i budżetu - mierzymy samo zapytanie
+    os.environ['QUALITY_GATE'] = 'off'
+    os.environ.pop('VISION_FALLBACKS', None)
+
+    contexts = [f"Zdjęcie {i + 1} z wydarzenia SpaceShield Hackathon" for i in range(args.requests)]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            image_paths = sorted(str(p) for p in Path(args.images).iterdir() if p.is_file())[:args.requests]
+            contexts = contexts[:len(image_paths)]
+        else:
+            image_paths = make_synthetic_images(Path(tmp), args.requests, args.image_kb)
+
+        if args.live:
+            if os.getenv('OPENAI_API_KEY', 'demo_key') == 'demo_key':
+                parser.error("--live wymaga OPENAI_API_KEY")
+            for layout in args.layouts:
+                results.append(run_layout(layout, image_paths, contexts))
+        else:
+            with MockOpenAIServer(latency_ms=args.latency_ms, seed=1) as stub:
+                os.environ.update({'OPENAI_API_KEY': 'bench_key', 'OPENAI_BASE_URL': f"{stub.url}/v1"})
+                for layout in args.layouts:
+                    results.append(run_layout(layout, image_paths, contexts))
+
+    for result in results:
+        print(f"✅ {result['layout']:8s} prompt {result['prompt_tokens_mean']} tok "
+              f"(cache {result['cached_tokens_mean']}, płatne {result['uncached_prompt_tokens_mean']}), "
+              f"odpowiedź {result['completion_tokens_mean']} tok, p50 {result['latency'].get('p50_ms')} ms")
+
+    report = {'commit': git_commit(), 'benchmark': 'prompt_layout', 'live': args.live, 'results': results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"📁 Raport zapisany: {args.output}")
+    return report
+
+if __name__ == "__main__":
+    main()
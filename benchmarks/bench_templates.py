@@ -0,0 +1,80 @@
+"""
+Template Rendering Benchmark
+Renderowanie alertów/s: prekompilowane szablony vs str.format na surowych szablonach
+
+Użycie:
+    python -m benchmarks.bench_templates --renders 20000 --output templates.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+# Add project path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from bot.message_templates import ALERT_TEMPLATES, TemplateRenderer
+from monitoring.build_info import git_commit
+
+SAMPLE_DATA = {
+    'weather_change': {'previous_weather': 'sunny', 'current_weather': 'rainy', 'confidence': 87.5,
+                       'location': 'Stadion Narodowy', 'timestamp': '18:00, 24.11.2024'},
+    'event_weather': {'event_name': 'SHAMAN Finał', 'event_time': '15:00, 24.11.2024', 'location': 'Warszawa',
+                      'weather_condition': 'cloudy', 'temperature': 12, 'rain_chance': 40,
+                      'recommendation': '☁️ Możliwy deszcz - warto mieć parasol.'},
+    'daily_summary': {'date': '24.11.2024', 'location': 'Warszawa', 'dominant_weather': 'cloudy',
+                      'avg_confidence': 81.2, 'posts_count': 240,
+                      'weather_trends': '• cloudy: 150 postów\n• rainy: 90 postów'},
+    'image_analysis': {'image_name': 'story_0042.jpg', 'weather_condition': 'rainy', 'confidence': 91.0,
+                       'description': 'Mokra nawierzchnia, ciemne chmury i parasole w tłumie.',
+                       'analysis_time': '18:02, 24.11.2024'}
+}
+
+
+def rate(func: Callable, renders: int) -> float:
+    start = time.perf_counter()
+    for _ in range(renders):
+        func()
+    elapsed = time.perf_counter() - start
+    return round(renders / elapsed, 1) if elapsed > 0 else 0.0
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Alert template rendering benchmark")
+    parser.add_argument('--renders', type=int, default=20000)
+    parser.add_argument('--output', type=str, default=None)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    renderer = TemplateRenderer(ALERT_TEMPLATES)
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    results = []
+    for name, channels in ALERT_TEMPLATES.items():
+        data = SAMPLE_DATA[name]
+        for channel, raw in channels.items():
+            rendered = renderer.render(name, channel, data)
+            results.append({
+                'template': f"{name}/{channel}",
+                'raw_format_per_s': rate(lambda: raw.format(**data), args.renders),
+                'compiled_per_s': rate(lambda: renderer.render(name, channel, data), args.renders),
+                'raw_length': len(raw.format(**data)),
+                'rendered_length': rendered['length'],
+                'sms_segments': rendered.get('segments')
+            })
+            print(f"✅ {name}/{channel}: {results[-1]['compiled_per_s']}/s, "
+                  f"{results[-1]['raw_length']} → {rendered['length']} znaków"
+                  + (f", {rendered['segments']} segment(y) {rendered['encoding']}" if channel == 'sms' else ""))
+
+    report = {'commit': git_commit(), 'benchmark': 'templates',
+              'compile_ms': round(compile_ms, 3), 'results': results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"📁 Raport zapisany: {args.output}")
+    return report
+
+if __name__ == "__main__":
+    main()
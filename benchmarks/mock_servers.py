@@ -0,0 +1,406 @@
+"""
+Mock API Servers for WeatherEyes benchmarks
+Lokalne stuby OpenAI (chat completions), Telegram (sendMessage/sendPhoto),
+Twilio (Messages) i SMTP z konfigurowalnym opóźnieniem, błędami i 429
+"""
+
+import hashlib
+import json
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+
+def _common_prefix(a: str, b: str) -> str:
+    return a[:next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))]
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Bez logowania każdego requestu - to zaburzałoby pomiary
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        stub = self.server.stub
+
+        status, payload = stub.handle(self.path, body, self.headers)
+        data = json.dumps(payload).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubServer:
+    """
+    Bazowy stub HTTP uruchamiany w osobnym wątku.
+    latency_ms / jitter_ms - sztuczne opóźnienie odpowiedzi
+    error_rate - odsetek odpowiedzi 500
+    rate_limit_rate - odsetek odpowiedzi 429
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.host = host
+        self.port = port
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'bytes_received': 0}
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> 'StubServer':
+        self._server = ThreadingHTTPServer((self.host, self.port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, path: str, body: bytes, headers) -> Tuple[int, Dict]:
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['bytes_received'] += len(body)
+            roll = self._random.random()
+            delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        if roll < self.rate_limit_rate:
+            with self._lock:
+                self.stats['rate_limited'] += 1
+            return 429, self.rate_limited_payload()
+        if roll < self.rate_limit_rate + self.error_rate:
+            with self._lock:
+                self.stats['errors'] += 1
+            return 500, {'error': {'message': 'stub internal error'}}
+
+        return self.respond(path, body, headers)
+
+    def rate_limited_payload(self) -> Dict:
+        return {'error': {'message': 'Rate limit reached', 'type': 'rate_limit'}}
+
+    def respond(self, path: str, body: bytes, headers) -> Tuple[int, Dict]:
+        raise NotImplementedError
+
+
+class MockOpenAIServer(StubServer):
+    """Stub POST /v1/chat/completions zwracający JSON z analizą pogody"""
+
+    conditions = ['sunny', 'cloudy', 'rainy', 'snow', 'stormy', 'foggy', 'clear']
+
+    # Cache promptów jak u OpenAI: od 1024 tokenów wspólnego prefiksu, w krokach po 128
+    cache_min_tokens = 1024
+    cache_step_tokens = 128
+    image_tokens = {'high': 765, 'low': 85}
+
+    def __init__(self, markdown_rate: float = 0.0, invalid_json_rate: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.markdown_rate = markdown_rate
+        self.invalid_json_rate = invalid_json_rate
+        self._completion_id = 0
+        self._prefixes = []
+
+    def prompt_usage(self, body: bytes) -> Tuple[int, int]:
+        """
+        (prompt_tokens, cached_tokens): tekst ~4 znaki/token, zdjęcie wg detail;
+        cached = najdłuższy wspólny prefiks z wcześniejszym zapytaniem (zdjęcie jako jego hash)
+        """
+        try:
+            messages = json.loads(body)['messages']
+        except (ValueError, KeyError):
+            return max(1, len(body) // 4), 0
+
+        parts, tokens = [], 0
+        for message in messages:
+            content = message.get('content')
+            for part in ([{'type': 'text', 'text': content}] if isinstance(content, str) else content or []):
+                if part.get('type') == 'image_url':
+                    image = part['image_url']
+                    parts.append(f"<image {hashlib.sha1(image['url'].encode()).hexdigest()}>")
+                    tokens += self.image_tokens.get(image.get('detail', 'high'), 765)
+                else:
+                    parts.append(part.get('text', ''))
+                    tokens += len(part.get('text', '')) // 4
+            parts.append('<end>')
+        prompt = '\x00'.join(parts)
+
+        with self._lock:
+            common = max((len(_common_prefix(prompt, seen)) for seen in self._prefixes), default=0)
+            self._prefixes = (self._prefixes + [prompt])[-64:]
+        common_tokens = common // 4
+        cached = 0
+        if common_tokens >= self.cache_min_tokens:
+            cached = common_tokens - (common_tokens - self.cache_min_tokens) % self.cache_step_tokens
+        return max(1, tokens), min(cached, tokens)
+
+    def respond(self, path: str, body: bytes, headers) -> Tuple[int, Dict]:
+        if not path.rstrip('/').endswith('/chat/completions'):
+            return 404, {'error': {'message': f'Unknown path {path}'}}
+
+        with self._lock:
+            self._completion_id += 1
+            completion_id = self._completion_id
+            roll = self._random.random()
+            condition = self._random.choice(self.conditions)
+            confidence = round(self._random.uniform(0.5, 0.95), 2)
+
+        analysis = {
+            "weather_condition": condition,
+            "confidence": confidence,
+            "description": f"Stub: {condition}",
+            "details": {
+                "sky_condition": "stub",
+                "visibility": "dobra",
+                "precipitation": "brak",
+                "lighting": "jasno"
+            },
+            "reasoning": "Odpowiedź z lokalnego stuba benchmarkowego"
+        }
+        content = json.dumps(analysis, ensure_ascii=False)
+        if roll < self.invalid_json_rate:
+            content = f"Na zdjęciu widać {condition}, confidence: {confidence}"
+        elif roll < self.invalid_json_rate + self.markdown_rate:
+            content = f"```json\n{content}\n```"
+
+        prompt_tokens, cached_tokens = self.prompt_usage(body)
+        completion_tokens = max(1, len(content) // 4)
+        return 200, {
+            "id": f"chatcmpl-stub-{completion_id}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}
+            }
+        }
+
+
+class MockTelegramServer(StubServer):
+    """Stub POST /bot<token>/sendMessage i /bot<token>/sendPhoto"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._message_id = 0
+
+    def rate_limited_payload(self) -> Dict:
+        return {'ok': False, 'error_code': 429,
+                'description': 'Too Many Requests: retry after 1',
+                'parameters': {'retry_after': 1}}
+
+    def respond(self, path: str, body: bytes, headers) -> Tuple[int, Dict]:
+        method = path.rstrip('/').rsplit('/', 1)[-1]
+        if method not in ('sendMessage', 'sendPhoto'):
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+
+        result = {'message_id': message_id, 'date': int(time.time()), 'chat': {'id': 0}}
+        if method == 'sendPhoto':
+            result['photo'] = [
+                {'file_id': f'stub_file_{message_id}_s', 'file_unique_id': f's{message_id}', 'width': 90, 'height': 90},
+                {'file_id': f'stub_file_{message_id}', 'file_unique_id': f'u{message_id}', 'width': 1280, 'height': 960}
+            ]
+        return 200, {'ok': True, 'result': result}
+
+
+class MockTwilioServer(StubServer):
+    """Stub POST /2010-04-01/Accounts/<sid>/Messages.json"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._message_id = 0
+
+    def rate_limited_payload(self) -> Dict:
+        return {'code': 20429, 'message': 'Too Many Requests', 'status': 429}
+
+    def respond(self, path: str, body: bytes, headers) -> Tuple[int, Dict]:
+        if not path.endswith('/Messages.json'):
+            return 404, {'code': 20404, 'message': 'Not Found', 'status': 404}
+
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+
+        account_sid = path.split('/Accounts/', 1)[-1].split('/', 1)[0]
+        return 201, {
+            'sid': f'SM{message_id:032d}',
+            'account_sid': account_sid,
+            'status': 'queued',
+            'num_segments': '1',
+            'direction': 'outbound-api',
+            'api_version': '2010-04-01',
+            'uri': f'/2010-04-01/Accounts/{account_sid}/Messages/SM{message_id:032d}.json'
+        }
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Minimalny dialog ESMTP: EHLO, AUTH, MAIL, RCPT, DATA, NOOP, RSET, QUIT"""
+
+    def reply(self, line: str):
+        self.wfile.write(line.encode('utf-8') + b"\r\n")
+
+    def handle(self):
+        stub = self.server.stub
+        stub.record('connections')
+        if stub.handshake_ms:
+            time.sleep(stub.handshake_ms / 1000)
+        self.reply("220 mock.weathereyes ESMTP")
+        sent = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.wfile.write(b"250-mock.weathereyes\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n")
+                self.reply("250 SMTPUTF8")
+            elif verb == 'AUTH':
+                stub.record('auths')
+                self.reply("235 2.7.0 Authentication successful")
+            elif verb == 'MAIL':
+                self.reply("250 2.1.0 Ok")
+            elif verb == 'RCPT':
+                if 'reject' in command.lower():
+                    stub.record('rejected')
+                    self.reply("550 5.1.1 Recipient rejected")
+                else:
+                    self.reply("250 2.1.5 Ok")
+            elif verb == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in iter(self.rfile.readline, b''):
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    data.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                if stub.latency_ms:
+                    time.sleep(stub.latency_ms / 1000)
+                stub.record('messages', b''.join(data))
+                self.reply("250 2.0.0 Ok: queued")
+                sent += 1
+                if stub.drop_after and sent >= stub.drop_after:
+                    # Limit wiadomości na sesję po stronie serwera - zerwanie bez 421
+                    stub.record('dropped')
+                    return
+            elif verb in ('NOOP', 'RSET'):
+                self.reply("250 2.0.0 Ok")
+            elif verb == 'QUIT':
+                self.reply("221 2.0.0 Bye")
+                return
+            else:
+                self.reply("502 5.5.2 Command not recognized")
+
+
+class MockSMTPServer:
+    """
+    Stub SMTP (bez TLS - klient z security='none').
+    handshake_ms - koszt nowego połączenia (TCP + TLS + AUTH u prawdziwego serwera)
+    latency_ms - czas przyjęcia jednej wiadomości
+    drop_after - serwer zrywa sesję po tylu wiadomościach
+    Odbiorcy z 'reject' w adresie dostają 550.
+    """
+
+    def __init__(self, handshake_ms: float = 0.0, latency_ms: float = 0.0, drop_after: Optional[int] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.handshake_ms = handshake_ms
+        self.latency_ms = latency_ms
+        self.drop_after = drop_after
+        self.host = host
+        self.port = port
+        self._lock = threading.Lock()
+        self.stats = {'connections': 0, 'auths': 0, 'messages': 0, 'rejected': 0, 'dropped': 0}
+        self.messages: List[bytes] = []
+        self._server = None
+
+    def record(self, stat: str, message: Optional[bytes] = None):
+        with self._lock:
+            self.stats[stat] += 1
+            if message is not None:
+                self.messages.append(message)
+
+    def start(self) -> 'MockSMTPServer':
+        self._server = socketserver.ThreadingTCPServer((self.host, self.port), _SMTPHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+# Test function
+def test_mock_servers():
+    """Test mock servers"""
+
+    import urllib.request
+
+    print("🧪 Testing Mock API Servers...")
+
+    with MockTelegramServer(latency_ms=5) as telegram:
+        request = urllib.request.Request(f"{telegram.url}/botTEST/sendMessage", data=b"text=hi", method="POST")
+        with urllib.request.urlopen(request) as response:
+            print(f"✅ Telegram stub: {json.loads(response.read())}")
+        print(f"📊 Stats: {telegram.stats}")
+
+    import smtplib
+    with MockSMTPServer() as smtp:
+        with smtplib.SMTP(smtp.host, smtp.port) as client:
+            client.sendmail("bot@weathereyes.local", ["fan@example.com"], "Subject: hi\r\n\r\nDeszcz")
+        print(f"✅ SMTP stub: {smtp.stats}")
+
+if __name__ == "__main__":
+    test_mock_servers()
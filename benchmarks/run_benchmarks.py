@@ -0,0 +1,250 @@
+"""
+WeatherEyes End-to-End Benchmarks
+Mierzy przepustowość i opóźnienia OpenAIVisionAnalyzer i RealAlertSystem
+na lokalnych stubach API - bez prawdziwych kluczy
+
+Użycie:
+    python -m benchmarks.run_benchmarks --images 50 --concurrency 4 --output bench.json
+    python -m benchmarks.run_benchmarks --compare baseline.json --output current.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# Add project path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_model.image_encoding import build_json_body, image_data_url_template
+from benchmarks.mock_servers import MockOpenAIServer, MockTelegramServer, MockTwilioServer
+from monitoring.build_info import git_commit
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentyl metodą nearest-rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def latency_stats(samples_ms: List[float]) -> Dict:
+    """Podsumowanie próbek opóźnień w milisekundach"""
+    if not samples_ms:
+        return {'count': 0}
+    return {
+        'count': len(samples_ms),
+        'mean_ms': round(sum(samples_ms) / len(samples_ms), 3),
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+        'max_ms': round(max(samples_ms), 3)
+    }
+
+
+def timed(func: Callable, *args, **kwargs):
+    """Wywołuje funkcję i zwraca (wynik, czas w ms)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def make_synthetic_images(directory: Path, count: int, size_kb: int) -> List[str]:
+    """Tworzy pliki o rozmiarze typowego zdjęcia (stub nie dekoduje obrazu)"""
+    paths = []
+    for i in range(count):
+        path = directory / f"bench_{i:05d}.jpg"
+        path.write_bytes(os.urandom(size_kb * 1024))
+        paths.append(str(path))
+    return paths
+
+
+def run_scenario(name: str, items: List, worker: Callable, concurrency: int) -> Dict:
+    """Uruchamia worker dla każdego elementu i zbiera czasy, błędy i pamięć"""
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(worker, items))
+    else:
+        outcomes = [worker(item) for item in items]
+
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stages: Dict[str, List[float]] = {}
+    failures = 0
+    for ok, stage_times in outcomes:
+        failures += 0 if ok else 1
+        for stage, ms in stage_times.items():
+            stages.setdefault(stage, []).append(ms)
+
+    return {
+        'scenario': name,
+        'items': len(items),
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 4),
+        'throughput_per_s': round(len(items) / elapsed, 3) if elapsed > 0 else 0.0,
+        'failures': failures,
+        'failure_rate': round(failures / max(len(items), 1), 4),
+        'peak_traced_memory_kb': round(peak / 1024, 1),
+        'stages': {stage: latency_stats(samples) for stage, samples in stages.items()}
+    }
+
+
+def benchmark_analysis(analyzer, image_paths: List[str], concurrency: int) -> Dict:
+    """Scenariusz: zdjęcia na sekundę i opóźnienia etapów analizy"""
+
+    def worker(image_path):
+        _, encode_ms = timed(build_json_body, {'url': image_data_url_template(image_path)}, image_path)
+        result, analyze_ms = timed(analyzer.analyze_image, image_path, "Benchmark")
+        return result.get('source') != 'error', {'encode': encode_ms, 'analyze_total': analyze_ms}
+
+    return run_scenario('analysis', image_paths, worker, concurrency)
+
+
+def benchmark_alerts(alert_system, image_paths: List[str], count: int, concurrency: int) -> List[Dict]:
+    """Scenariusze: sendMessage, sendPhoto i SMS"""
+
+    def message_worker(i):
+        result, ms = timed(alert_system.telegram.send_message, f"<b>Benchmark</b> #{i}")
+        return result['success'], {'telegram_message': ms}
+
+    def photo_worker(i):
+        result, ms = timed(alert_system.telegram.send_photo, image_paths[i % len(image_paths)], f"Benchmark #{i}")
+        return result['success'], {'telegram_photo': ms}
+
+    def sms_worker(i):
+        result, ms = timed(alert_system.sms.send_sms, f"WeatherEyes benchmark #{i}")
+        return result['success'], {'sms': ms}
+
+    def full_alert_worker(i):
+        result, ms = timed(alert_system.send_weather_change_alert, "sunny", "rainy", 0.87, "Benchmark")
+        ok = result['results']['telegram']['success'] and result['results']['sms']['success']
+        return ok, {'weather_change_alert': ms}
+
+    items = list(range(count))
+    return [
+        run_scenario('telegram_message', items, message_worker, concurrency),
+        run_scenario('telegram_photo', items, photo_worker, concurrency),
+        run_scenario('sms', items, sms_worker, concurrency),
+        run_scenario('weather_change_alert', items, full_alert_worker, concurrency)
+    ]
+
+
+def compare_reports(baseline: Dict, current: Dict) -> List[str]:
+    """Porównuje przepustowość i p95 między dwoma raportami"""
+
+    lines = [f"📊 {baseline.get('commit', '?')} → {current.get('commit', '?')}"]
+    base_by_name = {s['scenario']: s for s in baseline.get('scenarios', [])}
+
+    for scenario in current.get('scenarios', []):
+        base = base_by_name.get(scenario['scenario'])
+        if not base:
+            continue
+        if base['throughput_per_s']:
+            delta = (scenario['throughput_per_s'] - base['throughput_per_s']) / base['throughput_per_s'] * 100
+            lines.append(f"• {scenario['scenario']}: {base['throughput_per_s']} → "
+                         f"{scenario['throughput_per_s']} /s ({delta:+.1f}%)")
+        for stage, stats in scenario['stages'].items():
+            base_stats = base['stages'].get(stage, {})
+            if base_stats.get('p95_ms') and stats.get('p95_ms') is not None:
+                delta = (stats['p95_ms'] - base_stats['p95_ms']) / base_stats['p95_ms'] * 100
+                lines.append(f"    {stage} p95: {base_stats['p95_ms']} → {stats['p95_ms']} ms ({delta:+.1f}%)")
+    return lines
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="WeatherEyes end-to-end benchmarks on local API stubs")
+    parser.add_argument('--images', type=int, default=20, help="liczba zdjęć w scenariuszu analizy")
+    parser.add_argument('--image-kb', type=int, default=256, help="rozmiar syntetycznego zdjęcia w KB")
+    parser.add_argument('--alerts', type=int, default=20, help="liczba wysyłek w scenariuszach alertów")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="opóźnienie stuba OpenAI")
+    parser.add_argument('--alert-latency-ms', type=float, default=10.0, help="opóźnienie stubów Telegram/Twilio")
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="odsetek odpowiedzi 429")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', type=str, default=None, help="ścieżka raportu JSON")
+    parser.add_argument('--compare', type=str, default=None, help="raport bazowy do porównania")
+    args = parser.parse_args(argv)
+
+    stub_kwargs = dict(jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                       rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+
+    with MockOpenAIServer(latency_ms=args.latency_ms, **stub_kwargs) as openai_stub, \
+            MockTelegramServer(latency_ms=args.alert_latency_ms, **stub_kwargs) as telegram_stub, \
+            MockTwilioServer(latency_ms=args.alert_latency_ms, **stub_kwargs) as twilio_stub, \
+            tempfile.TemporaryDirectory() as tmp:
+
+        # Konfiguracja środowiska przed utworzeniem klientów (czytają env w __init__)
+        os.environ.update({
+            'OPENAI_API_KEY': 'bench_key',
+            'OPENAI_BASE_URL': f"{openai_stub.url}/v1",
+            'TELEGRAM_BOT_TOKEN': 'bench_token',
+            'TELEGRAM_CHAT_ID': '1',
+            'TELEGRAM_API_URL': telegram_stub.url,
+            'TWILIO_ACCOUNT_SID': 'ACbench',
+            'TWILIO_AUTH_TOKEN': 'bench',
+            'TWILIO_API_URL': twilio_stub.url
+        })
+
+        from ai_model.openai_vision import OpenAIVisionAnalyzer
+        from bot.real_alerts import RealAlertSystem
+
+        image_paths = make_synthetic_images(Path(tmp), args.images, args.image_kb)
+
+        print(f"🚀 Benchmark: {args.images} zdjęć, concurrency={args.concurrency}")
+        scenarios = [benchmark_analysis(OpenAIVisionAnalyzer(), image_paths, args.concurrency)]
+        scenarios += benchmark_alerts(RealAlertSystem(), image_paths, args.alerts, args.concurrency)
+
+        servers = {'openai': openai_stub.stats, 'telegram': telegram_stub.stats, 'twilio': twilio_stub.stats}
+
+        from monitoring.metrics import metrics
+        metrics_snapshot = metrics.snapshot()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'scenarios': scenarios,
+        'servers': servers,
+        'metrics': metrics_snapshot
+    }
+
+    for scenario in scenarios:
+        stage_summary = ', '.join(f"{stage} p50={s['p50_ms']}ms p95={s['p95_ms']}ms p99={s['p99_ms']}ms"
+                                  for stage, s in scenario['stages'].items())
+        print(f"✅ {scenario['scenario']}: {scenario['throughput_per_s']}/s, "
+              f"błędy {scenario['failure_rate']:.1%}, peak {scenario['peak_traced_memory_kb']} KB | {stage_summary}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"📁 Raport zapisany: {args.output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        for line in compare_reports(baseline, report):
+            print(line)
+
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+Email Channel for WeatherEyes
+Pula trwałych sesji SMTP (connect + STARTTLS + AUTH raz na sesję, nie na wiadomość)
+i digest per odbiorca: alerty zbierane przez EMAIL_DIGEST_INTERVAL_S i wysyłane jednym mailem
+"""
+
+import html
+import os
+import re
+import smtplib
+import sqlite3
+import ssl
+import sys
+import threading
+import time
+from datetime import datetime
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python bot/email_channel.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.metrics import metrics
+from monitoring.log_config import get_logger
+
+logger = get_logger(__name__)
+
+# Pusty SMTP_HOST = tryb demo (jak demo_token w Telegramie)
+SMTP_HOST = os.getenv('SMTP_HOST', '')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+SMTP_USER = os.getenv('SMTP_USER', '')
+SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
+# starttls (587) | ssl (465) | none (lokalny relay / stub)
+SMTP_SECURITY = os.getenv('SMTP_SECURITY', 'starttls')
+SMTP_FROM = os.getenv('SMTP_FROM', 'WeatherEyes <alerts@weathereyes.local>')
+SMTP_TIMEOUT_S = float(os.getenv('SMTP_TIMEOUT_S', '30'))
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', '2'))
+# Serwery zwykle limitują wiadomości na sesję i zrywają bezczynne połączenia (~5 min)
+SMTP_MAX_MESSAGES_PER_SESSION = int(os.getenv('SMTP_MAX_MESSAGES_PER_SESSION', '100'))
+SMTP_MAX_IDLE_S = float(os.getenv('SMTP_MAX_IDLE_S', '240'))
+SMTP_NOOP_AFTER_S = float(os.getenv('SMTP_NOOP_AFTER_S', '30'))
+EMAIL_DIGEST_INTERVAL_S = float(os.getenv('EMAIL_DIGEST_INTERVAL_S', '900'))
+EMAIL_DIGEST_DB = os.getenv('EMAIL_DIGEST_DB', 'data/email_digest.db')
+
+SECURITY_MODES = ('starttls', 'ssl', 'none')
+
+_BREAK = re.compile(r'(?:<br\s*/?>|<hr\s*/?>|</(?:p|h\d|div)>)\n?', re.IGNORECASE)
+_TAG = re.compile(r'<[^>]+>')
+
+
+def _disconnected(error: OSError) -> bool:
+    """Zerwana sesja (po niej łączymy się od nowa), a nie odrzucenie pojedynczej wiadomości"""
+    return isinstance(error, smtplib.SMTPServerDisconnected) or not isinstance(error, smtplib.SMTPException)
+
+
+def html_to_text(body: str) -> str:
+    """Wersja text/plain maila z HTML (bez tagów, z encjami zamienionymi na znaki)"""
+    return html.unescape(_TAG.sub('', _BREAK.sub('\n', body))).strip()
+
+
+def email_html(message: str) -> str:
+    """HTML maila z wiadomości w formacie Telegram HTML (<b>, <i>, nowe linie)"""
+    return ('<div style="font-family: sans-serif; line-height: 1.4">'
+            + message.strip().replace('\n', '<br>\n') + '</div>')
+
+
+def build_message(sender: str, to: str, subject: str, html_body: str,
+                  text_body: Optional[str] = None) -> EmailMessage:
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = to
+    message['Subject'] = subject
+    message['Date'] = formatdate(localtime=True)
+    message['Message-ID'] = make_msgid(domain='weathereyes.local')
+    message.set_content(text_body if text_body is not None else html_to_text(html_body))
+    message.add_alternative(html_body, subtype='html')
+    return message
+
+
+class _Session:
+    __slots__ = ('conn', 'opened_at', 'last_used', 'sent')
+
+    def __init__(self, conn: smtplib.SMTP):
+        self.conn = conn
+        self.opened_at = self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class SMTPPool:
+    """
+    Kilka trwałych sesji SMTP współdzielonych przez wątki (np. FanOutDispatcher).
+    Sesja jest brana z puli (LIFO - najcieplejsza), po dłuższej bezczynności
+    sprawdzana NOOP, a po SMTP_MAX_MESSAGES_PER_SESSION wiadomościach zamykana.
+    Zerwana sesja jest odtwarzana raz i wiadomość wysyłana ponownie.
+    """
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, user: str = SMTP_USER,
+                 password: str = SMTP_PASSWORD, security: str = SMTP_SECURITY, size: int = SMTP_POOL_SIZE,
+                 max_messages: int = SMTP_MAX_MESSAGES_PER_SESSION, max_idle_s: float = SMTP_MAX_IDLE_S,
+                 noop_after_s: float = SMTP_NOOP_AFTER_S, timeout: float = SMTP_TIMEOUT_S):
+        if security not in SECURITY_MODES:
+            raise ValueError(f"Unknown SMTP security mode: {security}")
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.security = security
+        self.size = max(1, size)
+        self.max_messages = max_messages
+        self.max_idle_s = max_idle_s
+        self.noop_after_s = noop_after_s
+        self.timeout = timeout
+
+        self._idle: List[_Session] = []
+        self._open = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.stats = {'connections_opened': 0, 'reconnects': 0, 'messages_sent': 0, 'messages_failed': 0}
+
+    def _connect(self) -> _Session:
+        with metrics.timer('smtp_connect'):
+            if self.security == 'ssl':
+                conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                        context=ssl.create_default_context())
+            else:
+                conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.security == 'starttls':
+                    conn.starttls(context=ssl.create_default_context())
+                if self.user:
+                    conn.login(self.user, self.password)
+            except Exception:
+                conn.close()
+                raise
+        metrics.inc('smtp_connections_total')
+        with self._cond:
+            self.stats['connections_opened'] += 1
+        logger.debug("SMTP session opened", extra={'host': self.host, 'port': self.port})
+        return _Session(conn)
+
+    @staticmethod
+    def _quit(session: _Session):
+        try:
+            session.conn.quit()
+        except OSError:
+            session.conn.close()
+
+    def _alive(self, session: _Session) -> bool:
+        idle = time.monotonic() - session.last_used
+        if idle > self.max_idle_s:
+            return False
+        if idle <= self.noop_after_s:
+            return True
+        try:
+            return session.conn.noop()[0] == 250
+        except OSError:
+            return False
+
+    def _acquire(self) -> _Session:
+        while True:
+            with self._cond:
+                while not self._idle and self._open >= self.size and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    raise RuntimeError("SMTP pool is closed")
+                session = self._idle.pop() if self._idle else None
+                if session is None:
+                    self._open += 1
+
+            if session is None:
+                try:
+                    return self._connect()
+                except BaseException:
+                    self._forget()
+                    raise
+            if self._alive(session):
+                return session
+            self._quit(session)
+            self._forget()
+
+    def _forget(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def _release(self, session: _Session, broken: bool = False):
+        if broken or self._closed or session.sent >= self.max_messages:
+            if broken:
+                session.conn.close()
+            else:
+                self._quit(session)
+            self._forget()
+            return
+        session.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    def _send_one(self, session: _Session, message: EmailMessage) -> Dict:
+        session.conn.send_message(message)
+        session.sent += 1
+        return {'success': True, 'message_id': message['Message-ID']}
+
+    def send_many(self, messages: Sequence[EmailMessage]) -> List[Dict]:
+        """
+        Wysyła wiadomości po kolei w jednej sesji (nowa sesja tylko po zerwaniu
+        albo po limicie wiadomości). Zwraca wynik per wiadomość, w tej samej kolejności.
+        """
+        results: List[Dict] = []
+        pending = list(messages)
+        retried = False
+        while pending:
+            try:
+                session = self._acquire()
+            except OSError as e:
+                # Serwer niedostępny / błąd logowania - reszta partii nie pójdzie
+                results += [self._failure(e) for _ in pending]
+                break
+
+            broken = False
+            try:
+                while pending and session.sent < self.max_messages:
+                    try:
+                        result = self._send_one(session, pending[0])
+                    except OSError as e:
+                        # smtplib.SMTPException to też OSError: odrzucony odbiorca/treść nie psuje sesji
+                        broken = _disconnected(e)
+                        if broken and not retried:
+                            # Sesja zerwana (timeout serwera, restart) - jedna próba na nowym połączeniu
+                            retried = True
+                            metrics.inc('smtp_reconnects_total')
+                            with self._cond:
+                                self.stats['reconnects'] += 1
+                            break
+                        result = self._failure(e)
+                        if not broken:
+                            broken = not self._reset(session)
+                    pending.pop(0)
+                    results.append(result)
+                    retried = False
+                    if broken:
+                        break
+            except BaseException:
+                self._release(session, broken=True)
+                raise
+            self._release(session, broken=broken)
+
+        sent = sum(1 for r in results if r['success'])
+        with self._cond:
+            self.stats['messages_sent'] += sent
+            self.stats['messages_failed'] += len(results) - sent
+        return results
+
+    @staticmethod
+    def _reset(session: _Session) -> bool:
+        """RSET po odrzuconej wiadomości; False = sesja nie nadaje się do dalszej wysyłki"""
+        try:
+            return session.conn.rset()[0] == 250
+        except OSError:
+            return False
+
+    def send(self, message: EmailMessage) -> Dict:
+        return self.send_many([message])[0]
+
+    @staticmethod
+    def _failure(error: Exception) -> Dict:
+        result = {'success': False, 'error': str(error)}
+        code = getattr(error, 'smtp_code', None)
+        if code is None and isinstance(error, smtplib.SMTPRecipientsRefused):
+            code = next(iter(error.recipients.values()), (None,))[0]
+        # 4xx (np. 421 za dużo połączeń, 451 greylisting) - przejściowe, FanOut ponowi
+        if code is not None and 400 <= code < 500:
+            result['retry_after'] = 30
+        return result
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for session in idle:
+            self._quit(session)
+
+
+class EmailDigest:
+    """
+    Kolejka digestów w SQLite: alerty per odbiorca czekają, aż najstarszy ma
+    EMAIL_DIGEST_INTERVAL_S, i idą jednym mailem. Kolejka przetrwa restart,
+    a pobranie partii (BEGIN IMMEDIATE) nie wyśle jej dwa razy z dwóch procesów.
+    """
+
+    def __init__(self, db_path: str = EMAIL_DIGEST_DB, interval_s: float = EMAIL_DIGEST_INTERVAL_S):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.interval_s = interval_s
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS digest_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipient TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                html TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_digest_recipient ON digest_items (recipient, created_at);
+        """)
+
+    def add(self, recipient: str, subject: str, html_body: str, now: Optional[float] = None) -> int:
+        """Dodaje alert do digestu odbiorcy; zwraca liczbę oczekujących alertów odbiorcy"""
+        with self._lock:
+            self.conn.execute("INSERT INTO digest_items (recipient, subject, html, created_at) VALUES (?, ?, ?, ?)",
+                              (recipient, subject, html_body, now if now is not None else time.time()))
+            pending = self.conn.execute("SELECT COUNT(*) FROM digest_items WHERE recipient = ?",
+                                        (recipient,)).fetchone()[0]
+        metrics.inc('email_digest_queued_total')
+        return pending
+
+    def pending(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT recipient, COUNT(*) FROM digest_items GROUP BY recipient").fetchall()
+        return dict(rows)
+
+    def take(self, force: bool = False, now: Optional[float] = None) -> Dict[str, List[Dict]]:
+        """Zabiera (usuwa z kolejki) alerty odbiorców, których digest jest już należny"""
+        cutoff = float('inf') if force else (now if now is not None else time.time()) - self.interval_s
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute(
+                    "SELECT id, recipient, subject, html, created_at FROM digest_items WHERE recipient IN "
+                    "(SELECT recipient FROM digest_items GROUP BY recipient HAVING MIN(created_at) <= ?) "
+                    "ORDER BY recipient, created_at, id", (cutoff,)
+                ).fetchall()
+                self.conn.executemany("DELETE FROM digest_items WHERE id = ?", [(row[0],) for row in rows])
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+        batches: Dict[str, List[Dict]] = {}
+        for item_id, recipient, subject, html_body, created_at in rows:
+            batches.setdefault(recipient, []).append(
+                {'id': item_id, 'subject': subject, 'html': html_body, 'created_at': created_at})
+        return batches
+
+    def restore(self, recipient: str, items: List[Dict]):
+        """Oddaje niewysłane alerty do kolejki (z pierwotnym czasem - digest jest od razu należny)"""
+        with self._lock:
+            self.conn.executemany(
+                "INSERT INTO digest_items (recipient, subject, html, created_at) VALUES (?, ?, ?, ?)",
+                [(recipient, item['subject'], item['html'], item['created_at']) for item in items]
+            )
+
+    @staticmethod
+    def render(sender: str, recipient: str, items: List[Dict]) -> EmailMessage:
+        if len(items) == 1:
+            return build_message(sender, recipient, items[0]['subject'], items[0]['html'])
+        first, last = (datetime.fromtimestamp(items[i]['created_at']) for i in (0, -1))
+        subject = f"WeatherEyes: {len(items)} alertów ({first:%H:%M}–{last:%H:%M}, {last:%d.%m.%Y})"
+        sections = [f"<h3>{html.escape(item['subject'])}</h3>"
+                    f"<p><small>{datetime.fromtimestamp(item['created_at']):%H:%M, %d.%m.%Y}</small></p>"
+                    f"{item['html']}" for item in items]
+        return build_message(sender, recipient, subject, '<hr>\n'.join(sections))
+
+    def flush(self, send_many: Callable[[List[EmailMessage]], List[Dict]], sender: str = SMTP_FROM,
+              force: bool = False, now: Optional[float] = None) -> Dict:
+        """Wysyła należne digesty jednym wywołaniem send_many (jedna sesja SMTP); błędy wracają do kolejki"""
+        batches = self.take(force=force, now=now)
+        if not batches:
+            return {'recipients': 0, 'alerts': 0, 'sent': 0, 'failed': 0}
+
+        recipients = list(batches)
+        results = send_many([self.render(sender, recipient, batches[recipient]) for recipient in recipients])
+        failed = []
+        for recipient, result in zip(recipients, results):
+            if not result.get('success'):
+                self.restore(recipient, batches[recipient])
+                failed.append({'recipient': recipient, 'error': result.get('error')})
+
+        sent = len(recipients) - len(failed)
+        metrics.inc('email_digest_sent_total', sent)
+        logger.info("Email digests flushed", extra={
+            'recipients': len(recipients), 'alerts': sum(len(items) for items in batches.values()),
+            'sent': sent, 'failed': len(failed)
+        })
+        return {'recipients': len(recipients), 'alerts': sum(len(items) for items in batches.values()),
+                'sent': sent, 'failed': len(failed), 'failures': failed}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+# Test function
+def test_email_channel():
+    """Test SMTP pool and digests"""
+
+    import tempfile
+    from benchmarks.mock_servers import MockSMTPServer
+
+    print("📧 Testing email channel...")
+
+    with MockSMTPServer(drop_after=5) as server, tempfile.TemporaryDirectory() as tmp:
+        pool = SMTPPool(server.host, server.port, user='bot', password='secret', security='none', size=2)
+        messages = [build_message(SMTP_FROM, f"user{i}@example.com", f"Alert {i}", "<b>Deszcz</b> za 15 min")
+                    for i in range(12)]
+        results = pool.send_many(messages)
+        print(f"✅ Wysłane: {sum(r['success'] for r in results)}/12, sesje: {pool.stats['connections_opened']}, "
+              f"ponowne połączenia: {pool.stats['reconnects']}")
+
+        digest = EmailDigest(str(Path(tmp) / "digest.db"), interval_s=60)
+        for i in range(3):
+            digest.add("fan@example.com", f"Zmiana pogody {i}", email_html(f"<b>Alert</b> {i}"), now=1000 + i)
+        print(f"✅ Digest przed terminem: {digest.flush(pool.send_many, now=1030)['sent']}")
+        print(f"✅ Digest po terminie: {digest.flush(pool.send_many, now=1061)}")
+        print(f"📊 Stub: {server.stats}")
+        digest.close()
+        pool.close()
+
+if __name__ == "__main__":
+    test_email_channel()
@@ -0,0 +1,151 @@
+"""
+Telegram file_id Cache for WeatherEyes
+Trwała mapa: hash zawartości zdjęcia → file_id zwrócony przez Telegram po pierwszym uploadzie
+"""
+
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+class FileIdCache:
+    """
+    file_id jest ważny tylko dla bota, który wysłał plik, więc kluczem jest
+    (bot_id, sha256 zawartości). Wpisy wygasają po max_age_days, a najdawniej
+    używane są usuwane powyżej max_entries.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, bot_id: str = "default",
+                 max_age_days: float = 30, max_entries: int = 50000):
+        self.db_path = Path(db_path or os.getenv('TELEGRAM_FILE_ID_CACHE', 'data/telegram_file_ids.db'))
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.bot_id = bot_id
+        self.max_age_seconds = max_age_days * 86400
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (ścieżka, rozmiar, mtime) → hash, żeby nie liczyć hasha przy każdym wysłaniu
+        self._hash_memo: Dict[Tuple[str, int, int], str] = {}
+
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_ids (
+                    bot_id TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    size_bytes INTEGER,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (bot_id, content_hash)
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_file_ids_last_used ON file_ids (last_used)")
+
+    def content_hash(self, path: str) -> str:
+        """SHA-256 zawartości pliku (mmap, bez wczytywania do pamięci)"""
+        stat = os.stat(path)
+        memo_key = (str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns)
+        cached = self._hash_memo.get(memo_key)
+        if cached:
+            return cached
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            if stat.st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    digest.update(mapped)
+        content_hash = digest.hexdigest()
+        self._hash_memo[memo_key] = content_hash
+        return content_hash
+
+    def get(self, content_hash: str) -> Optional[str]:
+        """Zwraca file_id albo None (brak lub wygasły wpis)"""
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT file_id, created_at FROM file_ids WHERE bot_id = ? AND content_hash = ?",
+                (self.bot_id, content_hash)
+            ).fetchone()
+            if not row:
+                return None
+            file_id, created_at = row
+            with self.conn:
+                if now - created_at > self.max_age_seconds:
+                    self.conn.execute("DELETE FROM file_ids WHERE bot_id = ? AND content_hash = ?",
+                                      (self.bot_id, content_hash))
+                    return None
+                self.conn.execute(
+                    "UPDATE file_ids SET last_used = ?, hits = hits + 1 WHERE bot_id = ? AND content_hash = ?",
+                    (now, self.bot_id, content_hash)
+                )
+            return file_id
+
+    def put(self, content_hash: str, file_id: str, size_bytes: Optional[int] = None):
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO file_ids (bot_id, content_hash, file_id, size_bytes, created_at, last_used, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (self.bot_id, content_hash, file_id, size_bytes, now, now)
+            )
+            self._prune()
+
+    def invalidate(self, content_hash: str):
+        """Usuwa wpis, np. gdy Telegram odrzuci file_id"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM file_ids WHERE bot_id = ? AND content_hash = ?",
+                              (self.bot_id, content_hash))
+
+    def _prune(self):
+        cutoff = time.time() - self.max_age_seconds
+        self.conn.execute("DELETE FROM file_ids WHERE created_at < ?", (cutoff,))
+        count = self.conn.execute("SELECT COUNT(*) FROM file_ids").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM file_ids WHERE rowid IN "
+                "(SELECT rowid FROM file_ids ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, hits, saved = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0), COALESCE(SUM(hits * size_bytes), 0) "
+                "FROM file_ids WHERE bot_id = ?", (self.bot_id,)
+            ).fetchone()
+        return {'entries': entries, 'hits': hits, 'upload_bytes_saved': saved}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+# Test function
+def test_file_id_cache():
+    """Test file_id cache"""
+
+    import tempfile
+
+    print("🗂️ Testing Telegram file_id cache...")
+
+    cache = FileIdCache("data/test_file_ids.db", bot_id="test")
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
+        tmp.write(os.urandom(4096))
+    photo_hash = cache.content_hash(tmp.name)
+
+    print(f"❌ Przed uploadem: {cache.get(photo_hash)}")
+    cache.put(photo_hash, "AgACAgIAAxkBAAIB", size_bytes=4096)
+    print(f"✅ Po uploadzie: {cache.get(photo_hash)}")
+    print(f"📊 {cache.stats()}")
+
+    os.unlink(tmp.name)
+    cache.close()
+
+if __name__ == "__main__":
+    test_file_id_cache()
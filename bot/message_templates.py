@@ -0,0 +1,303 @@
+"""
+Message Templates for WeatherEyes
+Prekompilowane szablony alertów (Telegram HTML, SMS, email) z limitami kanałów
+i liczeniem segmentów SMS (GSM-7 / UCS-2)
+"""
+
+import html
+import math
+import os
+import re
+import textwrap
+from string import Formatter
+from typing import Dict, List, Optional
+
+# Limity znaków per kanał (Telegram Bot API)
+CHANNEL_LIMITS = {
+    'telegram': 4096,
+    'telegram_caption': 1024,
+    'email_subject': 200,
+    'email': None
+}
+
+# Kanały renderowane jako HTML - wartości są escapowane
+HTML_CHANNELS = {'telegram', 'telegram_caption', 'email'}
+
+SMS_MAX_SEGMENTS = int(os.getenv('SMS_MAX_SEGMENTS', '1'))
+
+# GSM 03.38: podstawowa tabela i rozszerzenie (znaki liczone podwójnie)
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+
+# Zamiany na znaki GSM-7 (polskie litery, typografia)
+GSM7_TRANSLITERATION = str.maketrans({
+    'ą': 'a', 'ć': 'c', 'ę': 'e', 'ł': 'l', 'ń': 'n', 'ó': 'o', 'ś': 's', 'ź': 'z', 'ż': 'z',
+    'Ą': 'A', 'Ć': 'C', 'Ę': 'E', 'Ł': 'L', 'Ń': 'N', 'Ó': 'O', 'Ś': 'S', 'Ź': 'Z', 'Ż': 'Z',
+    '•': '-', '–': '-', '—': '-', '…': '...', '„': '"', '”': '"', '“': '"', '’': "'", '°': ''
+})
+
+# Szablony alertów: {typ_alertu: {kanał: szablon}}
+ALERT_TEMPLATES = {
+    'weather_change': {
+        'telegram': """
+🌤️ <b>WeatherEyes Alert</b>
+
+⚠️ <b>Zmiana Pogody Wykryta!</b>
+📍 Lokalizacja: {location}
+🕐 Czas: {timestamp}
+
+📊 <b>Analiza:</b>
+• Poprzednia pogoda: {previous_weather}
+• Aktualna pogoda: {current_weather}
+• Pewność: {confidence}%
+
+🔍 <b>Źródło:</b> Analiza social media
+📱 <i>WeatherEyes - SHAMAN 2024</i>
+        """,
+        'sms': "🌤️ WeatherEyes Alert: Zmiana pogody z {previous_weather} na {current_weather} w {location}. Pewność: {confidence}%",
+        'email_subject': "WeatherEyes: {previous_weather} → {current_weather} ({location})"
+    },
+    'event_weather': {
+        'telegram': """
+🎯 <b>Event Weather Alert</b>
+
+📅 <b>Wydarzenie:</b> {event_name}
+📍 Lokalizacja: {location}
+🕐 Czas wydarzenia: {event_time}
+
+🌤️ <b>Prognoza Pogody:</b>
+• Warunki: {weather_condition}
+• Temperatura: {temperature}°C
+• Deszcz: {rain_chance}%
+
+💡 <b>Rekomendacja:</b>
+{recommendation}
+
+📱 <i>WeatherEyes - Twój pogodowy asystent</i>
+        """,
+        'sms': "🎯 Event Alert: {event_name} - Pogoda: {weather_condition}, {temperature}°C. {recommendation}",
+        'email_subject': "WeatherEyes: {event_name} ({event_time}) - {weather_condition}, deszcz {rain_chance}%"
+    },
+    'daily_summary': {
+        'telegram': """
+📊 <b>WeatherEyes - Dzienny Raport</b>
+
+📅 Data: {date}
+📍 Lokalizacja: {location}
+
+🌤️ <b>Podsumowanie Pogody:</b>
+• Dominujące warunki: {dominant_weather}
+• Średnia pewność: {avg_confidence}%
+• Analizowane posty: {posts_count}
+
+📈 <b>Trendy:</b>
+{weather_trends}
+
+🔍 <b>Źródła:</b> Social Media Analysis
+📱 <i>WeatherEyes - SHAMAN 2024</i>
+        """,
+        'sms': "📊 WeatherEyes Raport: {dominant_weather} ({avg_confidence}% pewności) z {posts_count} postów.",
+        'email_subject': "WeatherEyes - Dzienny Raport {date}: {dominant_weather} ({location})"
+    },
+    'image_analysis': {
+        'telegram_caption': """
+🔍 <b>Analiza Zdjęcia WeatherEyes</b>
+
+📸 <b>Zdjęcie:</b> {image_name}
+🌤️ <b>Wykryta pogoda:</b> {weather_condition}
+📊 <b>Pewność:</b> {confidence}%
+
+💭 <b>Opis:</b>
+{description}
+
+🕐 <b>Czas analizy:</b> {analysis_time}
+📱 <i>WeatherEyes - SHAMAN 2024</i>
+        """,
+        'sms': "🔍 WeatherEyes: Wykryto {weather_condition} na zdjęciu {image_name} ({confidence}% pewności)",
+        'email_subject': "WeatherEyes: {weather_condition} na zdjęciu {image_name} ({confidence}%)"
+    }
+}
+
+_MULTI_SPACE = re.compile(r'[ \t]{2,}')
+_MULTI_BLANK = re.compile(r'\n{3,}')
+_PARTIAL_ENTITY = re.compile(r'&#?\w*$')
+
+
+def is_gsm7(text: str) -> bool:
+    return all(ch in GSM7_BASIC or ch in GSM7_EXTENDED for ch in text)
+
+
+def sms_units(text: str, encoding: str) -> int:
+    """Długość w jednostkach kodowania: septety GSM-7 albo jednostki UTF-16"""
+    if encoding == 'GSM-7':
+        return sum(2 if ch in GSM7_EXTENDED else 1 for ch in text)
+    return sum(2 if ord(ch) > 0xFFFF else 1 for ch in text)
+
+
+def sms_segments(text: str) -> Dict:
+    """Kodowanie i liczba segmentów SMS (160/153 dla GSM-7, 70/67 dla UCS-2)"""
+    encoding = 'GSM-7' if is_gsm7(text) else 'UCS-2'
+    single, multi = (160, 153) if encoding == 'GSM-7' else (70, 67)
+    units = sms_units(text, encoding)
+    segments = 1 if units <= single else math.ceil(units / multi)
+    return {'encoding': encoding, 'units': units, 'segments': segments,
+            'capacity': single if segments == 1 else multi * segments}
+
+
+def to_gsm7(text: str) -> str:
+    """Transliteracja do GSM-7: polskie znaki → ASCII, emoji i reszta usunięte"""
+    text = text.translate(GSM7_TRANSLITERATION)
+    text = ''.join(ch for ch in text if ch in GSM7_BASIC or ch in GSM7_EXTENDED)
+    return _MULTI_SPACE.sub(' ', text).strip()
+
+
+def truncate_sms(text: str, max_segments: int = 1) -> str:
+    """Przycina tekst GSM-7 tak, by zmieścił się w max_segments"""
+    capacity = 160 if max_segments == 1 else 153 * max_segments
+    if sms_units(text, 'GSM-7') <= capacity:
+        return text
+    result, used = [], 0
+    for ch in text:
+        cost = 2 if ch in GSM7_EXTENDED else 1
+        if used + cost > capacity - 3:
+            break
+        result.append(ch)
+        used += cost
+    return ''.join(result).rstrip() + '...'
+
+
+def clean_template(template: str) -> str:
+    """Usuwa wcięcia z kodu, spacje na końcach linii i nadmiarowe puste linie"""
+    text = textwrap.dedent(template).strip()
+    text = '\n'.join(line.strip() for line in text.split('\n'))
+    return _MULTI_BLANK.sub('\n\n', text)
+
+
+class CompiledTemplate:
+    """Szablon oczyszczony i przeanalizowany raz; render to jedno format_map"""
+
+    __slots__ = ('name', 'channel', 'source', 'fields', 'limit', 'html')
+
+    def __init__(self, name: str, channel: str, template: str):
+        self.name = name
+        self.channel = channel
+        self.source = clean_template(template)
+        self.fields = [field for _, field, _, _ in Formatter().parse(self.source) if field]
+        self.limit = CHANNEL_LIMITS.get(channel)
+        self.html = channel in HTML_CHANNELS
+
+    def _prepare(self, data: Dict) -> Dict:
+        missing = [field for field in self.fields if field not in data]
+        if missing:
+            raise KeyError(f"Template '{self.name}/{self.channel}' missing fields: {missing}")
+        if self.html:
+            return {field: html.escape(str(data[field]), quote=False) for field in self.fields}
+        return data
+
+    def render(self, data: Dict) -> Dict:
+        values = self._prepare(data)
+        text = self.source.format_map(values)
+        truncated = False
+
+        # Za długi tekst: skracamy najdłuższe pole (nie sam tekst - nie psujemy tagów HTML)
+        while self.limit and len(text) > self.limit:
+            longest = max(self.fields, key=lambda f: len(str(values[f])), default=None)
+            value = str(values[longest]) if longest else ''
+            overflow = len(text) - self.limit
+            if len(value) <= overflow + 1:
+                text = text[:self.limit - 1] + '…'
+                truncated = True
+                break
+            values = dict(values)
+            # Bez uciętych encji HTML (np. '&l' z '&lt;')
+            cut = _PARTIAL_ENTITY.sub('', value[:len(value) - overflow - 1])
+            values[longest] = cut.rstrip() + '…'
+            text = self.source.format_map(values)
+            truncated = True
+
+        return {'text': text, 'length': len(text), 'truncated': truncated, 'channel': self.channel}
+
+
+class SMSTemplate(CompiledTemplate):
+    """Szablon SMS pilnujący liczby segmentów"""
+
+    __slots__ = ('max_segments',)
+
+    def __init__(self, name: str, template: str, max_segments: int = SMS_MAX_SEGMENTS):
+        super().__init__(name, 'sms', template)
+        self.source = ' '.join(self.source.split('\n'))
+        self.max_segments = max_segments
+
+    def render(self, data: Dict) -> Dict:
+        text = self.source.format_map(self._prepare(data))
+        info = sms_segments(text)
+        transliterated = truncated = False
+
+        if info['segments'] > self.max_segments:
+            # Emoji i polskie znaki wymuszają UCS-2 (70 znaków) - najpierw GSM-7
+            text = to_gsm7(text)
+            transliterated = True
+            info = sms_segments(text)
+            if info['segments'] > self.max_segments:
+                text = truncate_sms(text, self.max_segments)
+                truncated = True
+                info = sms_segments(text)
+
+        return {'text': text, 'length': len(text), 'channel': 'sms',
+                'encoding': info['encoding'], 'segments': info['segments'],
+                'transliterated': transliterated, 'truncated': truncated}
+
+
+class TemplateRenderer:
+    """Rejestr prekompilowanych szablonów: {typ_alertu: {kanał: szablon}}"""
+
+    def __init__(self, templates: Optional[Dict[str, Dict[str, str]]] = None,
+                 sms_max_segments: int = SMS_MAX_SEGMENTS):
+        self.sms_max_segments = sms_max_segments
+        self._compiled: Dict[str, Dict[str, CompiledTemplate]] = {}
+        for name, channels in (templates or {}).items():
+            for channel, template in channels.items():
+                self.register(name, channel, template)
+
+    def register(self, name: str, channel: str, template: str):
+        if channel == 'sms':
+            compiled = SMSTemplate(name, template, self.sms_max_segments)
+        else:
+            compiled = CompiledTemplate(name, channel, template)
+        self._compiled.setdefault(name, {})[channel] = compiled
+
+    def render(self, name: str, channel: str, data: Dict) -> Dict:
+        """Zwraca {'text', 'length', 'truncated', ...} dla danego typu i kanału"""
+        return self._compiled[name][channel].render(data)
+
+    def render_text(self, name: str, channel: str, data: Dict) -> str:
+        return self.render(name, channel, data)['text']
+
+    def channels(self, name: str) -> List[str]:
+        return list(self._compiled.get(name, {}))
+
+# Test function
+def test_message_templates():
+    """Test template rendering"""
+
+    renderer = TemplateRenderer({
+        'weather_change': {
+            'telegram': """
+                🌤️ <b>WeatherEyes Alert</b>
+
+                📍 Lokalizacja: {location}
+            """,
+            'sms': "🌤️ WeatherEyes Alert: Zmiana pogody z {previous_weather} na {current_weather} w {location}. Pewność: {confidence}%"
+        }
+    })
+    data = {'location': 'Stadion <Narodowy>', 'previous_weather': 'sunny',
+            'current_weather': 'rainy', 'confidence': 89.0}
+
+    print(repr(renderer.render_text('weather_change', 'telegram', data)))
+    print(renderer.render('weather_change', 'sms', data))
+
+if __name__ == "__main__":
+    test_message_templates()
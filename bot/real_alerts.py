@@ -1,26 +1,144 @@
 """
 Real Alert System for WeatherEyes
-Prawdziwe alerty przez Telegram Bot i SMS
+Prawdziwe alerty przez Telegram Bot, SMS i email
 """
 
 import os
+import functools
+import inspect
 import requests
 import json
+import sys
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 from dotenv import load_dotenv
 from twilio.rest import Client
 from pathlib import Path
 
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python bot/real_alerts.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_model.geo import location_keys
+from bot.email_channel import SMTP_FROM, EmailDigest, SMTPPool, build_message, email_html
+from bot.file_id_cache import FileIdCache
+from bot.subscribers import FanOutDispatcher, SubscriberRegistry
+from bot.message_templates import ALERT_TEMPLATES, TemplateRenderer
+from monitoring.metrics import metrics
+from monitoring.log_config import get_logger, correlation_context
+from storage.jobs import ALERT_DEDUP_WINDOW_S, JobBackend, default_worker_id, idempotency_key, open_backend
+
 load_dotenv()
 
+logger = get_logger(__name__)
+
+# Domyślna lokalizacja alertów bez lokalizacji analizy
+DEFAULT_LOCATION = os.getenv('EVENT_LOCATION', 'SHAMAN Event')
+# Wspólna baza kluczy idempotencji (np. sqlite:////shared/jobs.db) - przy wielu węzłach alert idzie raz
+ALERT_IDEMPOTENCY_URL = os.getenv('ALERT_IDEMPOTENCY_URL', '')
+ALERT_IDEMPOTENCY_TTL_S = float(os.getenv('ALERT_IDEMPOTENCY_TTL_S', str(2 * 86400)))
+# Rezerwacja klucza na czas wysyłki; pełny TTL dopiero po udanej wysyłce
+ALERT_IDEMPOTENCY_RESERVE_S = float(os.getenv('ALERT_IDEMPOTENCY_RESERVE_S', '300'))
+# Limit czasu rozsyłki do subskrybentów - krótszy od rezerwacji klucza; 0 = bez limitu
+ALERT_FAN_OUT_DEADLINE_S = float(os.getenv('ALERT_FAN_OUT_DEADLINE_S', '240'))
+
+
+def _retry_after(error: Exception) -> Optional[int]:
+    """Sekundy do ponowienia przy 429 (Telegram: parameters.retry_after, Twilio: status 429)"""
+    response = getattr(error, 'response', None)
+    if response is not None and getattr(response, 'status_code', None) == 429:
+        try:
+            return int(response.json().get('parameters', {}).get('retry_after', 1))
+        except ValueError:
+            return 1
+    if getattr(error, 'status', None) == 429:
+        return 1
+    return None
+
+
+def _deduplicated(alert_type: str, key_parts, window: bool = True):
+    """
+    Przy wspólnej bazie idempotencji wysyła alert tylko raz na klucz (ze wszystkich węzłów).
+    Klucz z key_parts(argumenty), ważny ALERT_DEDUP_WINDOW_S (window=False: ALERT_IDEMPOTENCY_TTL_S),
+    albo podany wprost: idempotency_key=... (ważny ALERT_IDEMPOTENCY_TTL_S)
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, idempotency_key: Optional[str] = None, **kwargs):
+            if self.idempotency is None:
+                alert_record = method(self, *args, **kwargs)
+                alert_record['delivered'] = _delivered(alert_record)
+                return alert_record
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            key = idempotency_key or _alert_key(alert_type, *key_parts(bound.arguments))
+            # Ta sama treść blokuje kolejne wysyłki przez ALERT_DEDUP_WINDOW_S od ostatniej (okno przesuwne)
+            ttl_s = ALERT_DEDUP_WINDOW_S if window and not idempotency_key else ALERT_IDEMPOTENCY_TTL_S
+            if not self.idempotency.claim_once(key, self.node_id, min(ALERT_IDEMPOTENCY_RESERVE_S, ttl_s)):
+                metrics.inc('alerts_deduplicated_total', alert_type=alert_type)
+                logger.info("Duplicate alert skipped", extra={'alert_type': alert_type, 'idempotency_key': key})
+                skipped = {'success': False, 'duplicate': True}
+                return {'type': alert_type, 'duplicate': True, 'idempotency_key': key,
+                        'results': {'telegram': skipped, 'sms': skipped, 'email': skipped}, 'timestamp': datetime.now().isoformat()}
+            try:
+                alert_record = method(self, *args, **kwargs)
+            except Exception:
+                self.idempotency.release_claim(key, self.node_id)
+                raise
+            # delivered=False - scheduler ponawia termin (ten sam run_key)
+            alert_record['delivered'] = _delivered(alert_record)
+            if alert_record['delivered']:
+                self.idempotency.renew_claim(key, self.node_id, ttl_s)
+            else:
+                # Żaden kanał nie doręczył - klucz wolny dla ponowienia (np. retry schedulera)
+                self.idempotency.release_claim(key, self.node_id)
+                logger.warning("Alert not delivered, idempotency key released",
+                               extra={'alert_type': alert_type, 'idempotency_key': key})
+            alert_record['idempotency_key'] = key
+            return alert_record
+        return wrapper
+    return decorator
+
+
+def _delivered(alert_record: Dict) -> bool:
+    """Czy alert doszedł choć jednym kanałem (domyślni odbiorcy albo subskrybenci)"""
+    if any(result.get('success') for result in alert_record.get('results', {}).values()):
+        return True
+    return bool((alert_record.get('fan_out') or {}).get('sent'))
+
+
+def _alert_key(alert_type: str, *parts) -> str:
+    return idempotency_key(alert_type, *parts)
+
+
+def _correlated(method):
+    """Wykonuje wysyłkę alertu w correlation context i zapisuje id w rekordzie alertu"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with correlation_context() as correlation_id:
+            alert_record = method(self, *args, **kwargs)
+            alert_record['correlation_id'] = correlation_id
+            return alert_record
+    return wrapper
+
 class TelegramBot:
     def __init__(self):
         self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN', 'demo_token')
         self.chat_id = os.getenv('TELEGRAM_CHAT_ID', 'demo_chat')
-        self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
-        
-    def send_message(self, message: str, parse_mode: str = "HTML") -> Dict:
+        self.api_url = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
+        self.base_url = f"{self.api_url}/bot{self.bot_token}"
+        self._file_id_cache = None
+    
+    @property
+    def file_id_cache(self) -> FileIdCache:
+        """Cache file_id tworzony przy pierwszym wysłaniu zdjęcia (nie w trybie demo)"""
+        if self._file_id_cache is None:
+            self._file_id_cache = FileIdCache(bot_id=self.bot_token.split(':')[0])
+        return self._file_id_cache
+        
+    def send_message(self, message: str, parse_mode: str = "HTML", chat_id: Optional[str] = None) -> Dict:
         """Wysyła wiadomość przez Telegram"""
         
         if self.bot_token == 'demo_token':
@@ -29,14 +147,16 @@ class TelegramBot:
         try:
             url = f"{self.base_url}/sendMessage"
             data = {
-                'chat_id': self.chat_id,
+                'chat_id': chat_id or self.chat_id,
                 'text': message,
                 'parse_mode': parse_mode
             }
             
-            response = requests.post(url, data=data)
+            with metrics.timer('alert', channel='telegram_message'):
+                response = requests.post(url, data=data)
             response.raise_for_status()
             
+            metrics.inc('alerts_total', channel='telegram_message', outcome='success')
             return {
                 'success': True,
                 'message_id': response.json()['result']['message_id'],
@@ -45,54 +165,86 @@ class TelegramBot:
             }
             
         except Exception as e:
-            print(f"Telegram Error: {e}")
+            logger.error("Telegram Error", extra={'error': str(e)})
+            metrics.inc('alerts_total', channel='telegram_message', outcome='error')
             return {
                 'success': False,
                 'error': str(e),
+                'retry_after': _retry_after(e),
                 'timestamp': datetime.now().isoformat(),
                 'platform': 'telegram'
             }
     
-    def send_photo(self, photo_path: str, caption: str = "") -> Dict:
-        """Wysyła zdjęcie z opisem przez Telegram"""
+    def send_photo(self, photo_path: str, caption: str = "", chat_id: Optional[str] = None) -> Dict:
+        """
+        Wysyła zdjęcie z opisem przez Telegram.
+        To samo zdjęcie (po hashu zawartości) jest wysyłane jako file_id zamiast ponownego uploadu.
+        """
         
         if self.bot_token == 'demo_token':
             return self._demo_send_photo(photo_path, caption)
         
         try:
             url = f"{self.base_url}/sendPhoto"
+            data = {
+                'chat_id': chat_id or self.chat_id,
+                'caption': caption,
+                'parse_mode': 'HTML'
+            }
             
-            with open(photo_path, 'rb') as photo:
-                files = {'photo': photo}
-                data = {
-                    'chat_id': self.chat_id,
-                    'caption': caption,
-                    'parse_mode': 'HTML'
-                }
-                
-                response = requests.post(url, files=files, data=data)
-                response.raise_for_status()
-                
-                return {
-                    'success': True,
-                    'message_id': response.json()['result']['message_id'],
-                    'timestamp': datetime.now().isoformat(),
-                    'platform': 'telegram',
-                    'type': 'photo'
-                }
+            photo_hash = self.file_id_cache.content_hash(photo_path)
+            file_id = self.file_id_cache.get(photo_hash)
+            
+            if file_id:
+                with metrics.timer('alert', channel='telegram_photo', upload='cached'):
+                    response = requests.post(url, data={**data, 'photo': file_id})
+                if response.status_code == 400:
+                    # file_id odrzucony (np. inny bot / usunięty plik) - unieważnij i wyślij plik
+                    metrics.inc('telegram_file_id_cache_total', outcome='invalidated')
+                    self.file_id_cache.invalidate(photo_hash)
+                    file_id = None
+                else:
+                    metrics.inc('telegram_file_id_cache_total', outcome='hit')
+            
+            if not file_id:
+                metrics.inc('telegram_file_id_cache_total', outcome='miss')
+                with open(photo_path, 'rb') as photo:
+                    with metrics.timer('alert', channel='telegram_photo', upload='file'):
+                        response = requests.post(url, files={'photo': photo}, data=data)
+            response.raise_for_status()
+            
+            result = response.json()['result']
+            uploaded = not file_id
+            if uploaded and result.get('photo'):
+                # Największy rozmiar z listy PhotoSize
+                file_id = result['photo'][-1]['file_id']
+                self.file_id_cache.put(photo_hash, file_id, size_bytes=os.path.getsize(photo_path))
+            
+            metrics.inc('alerts_total', channel='telegram_photo', outcome='success')
+            return {
+                'success': True,
+                'message_id': result['message_id'],
+                'timestamp': datetime.now().isoformat(),
+                'platform': 'telegram',
+                'type': 'photo',
+                'file_id': file_id,
+                'uploaded': uploaded
+            }
                 
         except Exception as e:
-            print(f"Telegram Photo Error: {e}")
+            logger.error("Telegram Photo Error", extra={'error': str(e), 'photo': Path(photo_path).name})
+            metrics.inc('alerts_total', channel='telegram_photo', outcome='error')
             return {
                 'success': False,
                 'error': str(e),
+                'retry_after': _retry_after(e),
                 'timestamp': datetime.now().isoformat(),
                 'platform': 'telegram'
             }
     
     def _demo_send_message(self, message: str) -> Dict:
         """Demo wysyłania wiadomości"""
-        print(f"📱 [TELEGRAM DEMO] Wysłano: {message[:50]}...")
+        logger.info("[TELEGRAM DEMO] Wysłano wiadomość", extra={'preview': message.strip()[:50]})
         return {
             'success': True,
             'message_id': f"demo_{int(datetime.now().timestamp())}",
@@ -102,8 +254,9 @@ class TelegramBot:
     
     def _demo_send_photo(self, photo_path: str, caption: str) -> Dict:
         """Demo wysyłania zdjęcia"""
-        print(f"📷 [TELEGRAM DEMO] Wysłano zdjęcie: {Path(photo_path).name}")
-        print(f"📝 [TELEGRAM DEMO] Opis: {caption[:50]}...")
+        logger.info("[TELEGRAM DEMO] Wysłano zdjęcie", extra={
+            'photo': Path(photo_path).name, 'preview': caption.strip()[:50]
+        })
         return {
             'success': True,
             'message_id': f"demo_photo_{int(datetime.now().timestamp())}",
@@ -121,22 +274,28 @@ class SMSAlert:
         
         if self.account_sid != 'demo_sid':
             self.client = Client(self.account_sid, self.auth_token)
+            # TWILIO_API_URL pozwala przekierować Messages API (np. na lokalny stub)
+            api_url = os.getenv('TWILIO_API_URL')
+            if api_url:
+                self.client.api.base_url = api_url.rstrip('/')
         else:
             self.client = None
     
-    def send_sms(self, message: str) -> Dict:
+    def send_sms(self, message: str, to_number: Optional[str] = None) -> Dict:
         """Wysyła SMS przez Twilio"""
         
         if self.client is None:
-            return self._demo_send_sms(message)
+            return self._demo_send_sms(message, to_number)
         
         try:
-            message_obj = self.client.messages.create(
-                body=message,
-                from_=self.from_number,
-                to=self.to_number
-            )
+            with metrics.timer('alert', channel='sms'):
+                message_obj = self.client.messages.create(
+                    body=message,
+                    from_=self.from_number,
+                    to=to_number or self.to_number
+                )
             
+            metrics.inc('alerts_total', channel='sms', outcome='success')
             return {
                 'success': True,
                 'message_sid': message_obj.sid,
@@ -145,17 +304,19 @@ class SMSAlert:
             }
             
         except Exception as e:
-            print(f"SMS Error: {e}")
+            logger.error("SMS Error", extra={'error': str(e)})
+            metrics.inc('alerts_total', channel='sms', outcome='error')
             return {
                 'success': False,
                 'error': str(e),
+                'retry_after': _retry_after(e),
                 'timestamp': datetime.now().isoformat(),
                 'platform': 'sms'
             }
     
-    def _demo_send_sms(self, message: str) -> Dict:
+    def _demo_send_sms(self, message: str, to_number: Optional[str] = None) -> Dict:
         """Demo wysyłania SMS"""
-        print(f"📞 [SMS DEMO] Wysłano na {self.to_number}: {message[:50]}...")
+        logger.info("[SMS DEMO] Wysłano SMS", extra={'to': to_number or self.to_number, 'preview': message[:50]})
         return {
             'success': True,
             'message_sid': f"demo_sms_{int(datetime.now().timestamp())}",
@@ -163,76 +324,106 @@ class SMSAlert:
             'platform': 'sms_demo'
         }
 
+class EmailAlert:
+    """
+    Email przez pulę trwałych sesji SMTP (bot/email_channel.py): wiele wiadomości
+    na jednym połączeniu zamiast connect + TLS + AUTH na każdą. Odbiorcy digestu
+    dostają alerty zebrane w jeden mail co EMAIL_DIGEST_INTERVAL_S.
+    """
+
+    def __init__(self, pool: Optional[SMTPPool] = None, digest: Optional[EmailDigest] = None):
+        self.smtp_host = os.getenv('SMTP_HOST', '')
+        self.from_address = os.getenv('SMTP_FROM', SMTP_FROM)
+        self.to_address = os.getenv('EMAIL_TO', 'demo@weathereyes.local')
+        
+        # Bez SMTP_HOST - tryb demo
+        self.pool = pool or (SMTPPool(self.smtp_host) if self.smtp_host else None)
+        self._digest = digest
+    
+    @property
+    def digest(self) -> EmailDigest:
+        """Kolejka digestów tworzona przy pierwszym użyciu"""
+        if self._digest is None:
+            self._digest = EmailDigest()
+        return self._digest
+    
+    def send_email(self, subject: str, html_body: str, to: Optional[str] = None) -> Dict:
+        """Wysyła email (HTML + wersja tekstowa) sesją z puli"""
+        
+        if self.pool is None:
+            return self._demo_send_email(subject, to)
+        
+        message = build_message(self.from_address, to or self.to_address, subject, html_body)
+        with metrics.timer('alert', channel='email'):
+            result = self.pool.send(message)
+        
+        metrics.inc('alerts_total', channel='email', outcome='success' if result['success'] else 'error')
+        if not result['success']:
+            logger.error("Email Error", extra={'error': result['error'], 'to': to or self.to_address})
+        return dict(result, timestamp=datetime.now().isoformat(), platform='email')
+    
+    def queue_digest(self, subject: str, html_body: str, to: Optional[str] = None) -> Dict:
+        """Dodaje alert do digestu odbiorcy (wysyłka w flush_digests)"""
+        pending = self.digest.add(to or self.to_address, subject, html_body)
+        return {
+            'success': True,
+            'queued': True,
+            'pending': pending,
+            'timestamp': datetime.now().isoformat(),
+            'platform': 'email_digest'
+        }
+    
+    def flush_digests(self, force: bool = False) -> Dict:
+        """Wysyła należne digesty (force - wszystkie) w jednej sesji SMTP"""
+        send_many = self.pool.send_many if self.pool else self._demo_send_many
+        return self.digest.flush(send_many, self.from_address, force=force)
+    
+    def close(self):
+        if self.pool:
+            self.pool.close()
+        if self._digest:
+            self._digest.close()
+    
+    def _demo_send_email(self, subject: str, to: Optional[str] = None) -> Dict:
+        """Demo wysyłania emaila"""
+        logger.info("[EMAIL DEMO] Wysłano email", extra={'to': to or self.to_address, 'subject': subject})
+        return {
+            'success': True,
+            'message_id': f"demo_email_{int(datetime.now().timestamp())}",
+            'timestamp': datetime.now().isoformat(),
+            'platform': 'email_demo'
+        }
+    
+    def _demo_send_many(self, messages: List) -> List[Dict]:
+        return [self._demo_send_email(message['Subject'], message['To']) for message in messages]
+
 class RealAlertSystem:
-    def __init__(self):
+    def __init__(self, subscribers: Optional[SubscriberRegistry] = None,
+                 dispatcher: Optional[FanOutDispatcher] = None,
+                 idempotency: Optional[JobBackend] = None):
         self.telegram = TelegramBot()
         self.sms = SMSAlert()
+        self.email = EmailAlert()
         self.alert_history = []
         
-        # Templates wiadomości
-        self.templates = {
-            'weather_change': {
-                'telegram': """
-🌤️ <b>WeatherEyes Alert</b>
-
-⚠️ <b>Zmiana Pogody Wykryta!</b>
-📍 Lokalizacja: {location}
-🕐 Czas: {timestamp}
-
-📊 <b>Analiza:</b>
-• Poprzednia pogoda: {previous_weather}
-• Aktualna pogoda: {current_weather}
-• Pewność: {confidence}%
-
-🔍 <b>Źródło:</b> Analiza social media
-📱 <i>WeatherEyes - SHAMAN 2024</i>
-                """,
-                'sms': "🌤️ WeatherEyes Alert: Zmiana pogody z {previous_weather} na {current_weather} w {location}. Pewność: {confidence}%"
-            },
-            'event_weather': {
-                'telegram': """
-🎯 <b>Event Weather Alert</b>
-
-📅 <b>Wydarzenie:</b> {event_name}
-📍 Lokalizacja: {location}
-🕐 Czas wydarzenia: {event_time}
-
-🌤️ <b>Prognoza Pogody:</b>
-• Warunki: {weather_condition}
-• Temperatura: {temperature}°C
-• Deszcz: {rain_chance}%
-
-💡 <b>Rekomendacja:</b>
-{recommendation}
-
-📱 <i>WeatherEyes - Twój pogodowy asystent</i>
-                """,
-                'sms': "🎯 Event Alert: {event_name} - Pogoda: {weather_condition}, {temperature}°C. {recommendation}"
-            },
-            'daily_summary': {
-                'telegram': """
-📊 <b>WeatherEyes - Dzienny Raport</b>
-
-📅 Data: {date}
-📍 Lokalizacja: {location}
-
-🌤️ <b>Podsumowanie Pogody:</b>
-• Dominujące warunki: {dominant_weather}
-• Średnia pewność: {avg_confidence}%
-• Analizowane posty: {posts_count}
-
-📈 <b>Trendy:</b>
-{weather_trends}
-
-🔍 <b>Źródła:</b> Social Media Analysis
-📱 <i>WeatherEyes - SHAMAN 2024</i>
-                """,
-                'sms': "📊 WeatherEyes Raport: {dominant_weather} ({avg_confidence}% pewności) z {posts_count} postów."
-            }
-        }
+        # Opcjonalnie: rozsyłka do wszystkich pasujących subskrybentów (poza domyślnym czatem/numerem)
+        self.subscribers = subscribers
+        self.dispatcher = dispatcher or (FanOutDispatcher() if subscribers else None)
+        
+        # Templates wiadomości (bot/message_templates.py)
+        self.templates = ALERT_TEMPLATES
+        
+        # Kompilacja szablonów raz przy starcie: bez wcięć, z limitami kanałów i segmentów SMS
+        self.renderer = TemplateRenderer(self.templates)
+        
+        # Deduplikacja między węzłami (storage/jobs.py); bez niej każdy węzeł wysyła swoje
+        self.idempotency = idempotency or (open_backend(ALERT_IDEMPOTENCY_URL) if ALERT_IDEMPOTENCY_URL else None)
+        self.node_id = default_worker_id()
     
+    @_deduplicated('weather_change', lambda a: (a['location'], a['previous_weather'], a['current_weather']))
+    @_correlated
     def send_weather_change_alert(self, previous_weather: str, current_weather: str, 
-                                  confidence: float, location: str = "SHAMAN Event") -> Dict:
+                                  confidence: float, location: str = DEFAULT_LOCATION) -> Dict:
         """Wysyła alert o zmianie pogody"""
         
         timestamp = datetime.now().strftime("%H:%M, %d.%m.%Y")
@@ -247,29 +438,40 @@ class RealAlertSystem:
         }
         
         # Wysyłanie przez Telegram
-        telegram_msg = self.templates['weather_change']['telegram'].format(**data)
+        telegram_msg = self.renderer.render_text('weather_change', 'telegram', data)
         telegram_result = self.telegram.send_message(telegram_msg)
         
         # Wysyłanie SMS
-        sms_msg = self.templates['weather_change']['sms'].format(**data)
+        sms_msg = self.renderer.render_text('weather_change', 'sms', data)
         sms_result = self.sms.send_sms(sms_msg)
         
+        # Wysyłanie emaila
+        email_subject = self.renderer.render_text('weather_change', 'email_subject', data)
+        email_result = self.email.send_email(email_subject, email_html(telegram_msg))
+        
+        # Subskrybenci
+        fan_out = self._fan_out('weather_change', location, telegram_msg, sms_msg, email_subject=email_subject)
+        
         # Zapisz w historii
         alert_record = {
             'type': 'weather_change',
             'data': data,
             'results': {
                 'telegram': telegram_result,
-                'sms': sms_result
+                'sms': sms_result,
+                'email': email_result
             },
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            'fan_out': fan_out
         }
         self.alert_history.append(alert_record)
         
         return alert_record
     
+    @_deduplicated('event_weather', lambda a: (a['location'], a['event_name'], a['event_time']))
+    @_correlated
     def send_event_weather_alert(self, event_name: str, event_time: str, 
-                                weather_data: Dict, location: str = "SHAMAN Event") -> Dict:
+                                weather_data: Dict, location: str = DEFAULT_LOCATION) -> Dict:
         """Wysyła alert pogodowy dla wydarzenia"""
         
         # Przygotuj rekomendację
@@ -299,27 +501,37 @@ class RealAlertSystem:
         }
         
         # Wysyłanie alertów
-        telegram_msg = self.templates['event_weather']['telegram'].format(**data)
+        telegram_msg = self.renderer.render_text('event_weather', 'telegram', data)
         telegram_result = self.telegram.send_message(telegram_msg)
         
-        sms_msg = self.templates['event_weather']['sms'].format(**data)
+        sms_msg = self.renderer.render_text('event_weather', 'sms', data)
         sms_result = self.sms.send_sms(sms_msg)
         
+        email_subject = self.renderer.render_text('event_weather', 'email_subject', data)
+        email_result = self.email.send_email(email_subject, email_html(telegram_msg))
+        
+        # Subskrybenci
+        fan_out = self._fan_out('event_weather', location, telegram_msg, sms_msg, email_subject=email_subject)
+        
         # Zapisz w historii
         alert_record = {
             'type': 'event_weather',
             'data': data,
             'results': {
                 'telegram': telegram_result,
-                'sms': sms_result
+                'sms': sms_result,
+                'email': email_result
             },
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            'fan_out': fan_out
         }
         self.alert_history.append(alert_record)
         
         return alert_record
     
-    def send_daily_summary_alert(self, weather_summary: Dict, location: str = "SHAMAN Event") -> Dict:
+    @_deduplicated('daily_summary', lambda a: (a['location'], datetime.now().strftime("%Y-%m-%d")), window=False)
+    @_correlated
+    def send_daily_summary_alert(self, weather_summary: Dict, location: str = DEFAULT_LOCATION) -> Dict:
         """Wysyła dzienny raport pogodowy"""
         
         date = datetime.now().strftime("%d.%m.%Y")
@@ -328,61 +540,76 @@ class RealAlertSystem:
         weather_dist = weather_summary.get('weather_distribution', {})
         trends = []
         for weather, info in weather_dist.items():
-            trends.append(f"• {weather}: {info['count']} postów")
+            trends.append(f"• {weather}: {round(info.get('estimated_count', info['count']))} postów")
         
         data = {
             'date': date,
             'location': location,
             'dominant_weather': weather_summary.get('dominant_weather', 'unknown'),
             'avg_confidence': round(weather_summary.get('confidence', 0) * 100, 1),
-            'posts_count': weather_summary.get('total_images_analyzed', 0),
+            'posts_count': round(weather_summary.get('estimated_total_images',
+                                                     weather_summary.get('total_images_analyzed', 0))),
             'weather_trends': '\n'.join(trends) if trends else 'Brak danych'
         }
         
         # Wysyłanie alertów
-        telegram_msg = self.templates['daily_summary']['telegram'].format(**data)
+        telegram_msg = self.renderer.render_text('daily_summary', 'telegram', data)
         telegram_result = self.telegram.send_message(telegram_msg)
         
-        sms_msg = self.templates['daily_summary']['sms'].format(**data)
+        sms_msg = self.renderer.render_text('daily_summary', 'sms', data)
         sms_result = self.sms.send_sms(sms_msg)
         
+        email_subject = self.renderer.render_text('daily_summary', 'email_subject', data)
+        email_result = self.email.send_email(email_subject, email_html(telegram_msg))
+        
+        # Subskrybenci
+        fan_out = self._fan_out('daily_summary', location, telegram_msg, sms_msg, email_subject=email_subject)
+        
         # Zapisz w historii
         alert_record = {
             'type': 'daily_summary',
             'data': data,
             'results': {
                 'telegram': telegram_result,
-                'sms': sms_result
+                'sms': sms_result,
+                'email': email_result
             },
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            'fan_out': fan_out
         }
         self.alert_history.append(alert_record)
         
         return alert_record
     
+    @_deduplicated('image_analysis', lambda a: (a['image_path'],), window=False)
     def send_image_analysis_alert(self, image_path: str, analysis: Dict) -> Dict:
         """Wysyła alert z analizą zdjęcia"""
         
-        caption = f"""
-🔍 <b>Analiza Zdjęcia WeatherEyes</b>
-
-📸 <b>Zdjęcie:</b> {Path(image_path).name}
-🌤️ <b>Wykryta pogoda:</b> {analysis.get('weather_condition', 'unknown')}
-📊 <b>Pewność:</b> {round(analysis.get('confidence', 0) * 100, 1)}%
-
-💭 <b>Opis:</b>
-{analysis.get('description', 'Brak opisu')}
-
-🕐 <b>Czas analizy:</b> {datetime.now().strftime("%H:%M, %d.%m.%Y")}
-📱 <i>WeatherEyes - SHAMAN 2024</i>
-        """
-        
-        # Wyślij zdjęcie z analizą przez Telegram
-        telegram_result = self.telegram.send_photo(image_path, caption)
+        data = {
+            'image_name': Path(image_path).name,
+            'weather_condition': analysis.get('weather_condition', 'unknown'),
+            'confidence': round(analysis.get('confidence', 0) * 100, 1),
+            'description': analysis.get('description', 'Brak opisu'),
+            'analysis_time': datetime.now().strftime("%H:%M, %d.%m.%Y")
+        }
+        caption = self.renderer.render_text('image_analysis', 'telegram_caption', data)
         
-        # SMS z podstawowymi informacjami
-        sms_msg = f"🔍 WeatherEyes: Wykryto {analysis.get('weather_condition', 'unknown')} na zdjęciu {Path(image_path).name} ({round(analysis.get('confidence', 0) * 100, 1)}% pewności)"
-        sms_result = self.sms.send_sms(sms_msg)
+        # Ten sam correlation_id co analiza zdjęcia
+        with correlation_context(analysis.get('correlation_id')) as correlation_id:
+            # Wyślij zdjęcie z analizą przez Telegram
+            telegram_result = self.telegram.send_photo(image_path, caption)
+            
+            # SMS z podstawowymi informacjami
+            sms_msg = self.renderer.render_text('image_analysis', 'sms', data)
+            sms_result = self.sms.send_sms(sms_msg)
+            
+            # Email z opisem analizy (bez załącznika - zdjęcie idzie Telegramem)
+            email_subject = self.renderer.render_text('image_analysis', 'email_subject', data)
+            email_result = self.email.send_email(email_subject, email_html(caption))
+            
+            # Subskrybenci miejsca i komórki geohash - to samo zdjęcie idzie jako file_id po pierwszym uploadzie
+            fan_out = self._fan_out('image_analysis', location_keys(analysis) or DEFAULT_LOCATION,
+                                    caption, sms_msg, photo_path=image_path, email_subject=email_subject)
         
         # Zapisz w historii
         alert_record = {
@@ -393,14 +620,42 @@ class RealAlertSystem:
             },
             'results': {
                 'telegram': telegram_result,
-                'sms': sms_result
+                'sms': sms_result,
+                'email': email_result
             },
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            'correlation_id': correlation_id,
+            'fan_out': fan_out
         }
         self.alert_history.append(alert_record)
         
         return alert_record
     
+    def _fan_out(self, alert_type: str, location: Union[str, List[str]], telegram_msg: str, sms_msg: str,
+                 photo_path: Optional[str] = None, email_subject: Optional[str] = None) -> Optional[Dict]:
+        """Wysyła alert do subskrybentów danej lokalizacji i typu alertu"""
+        
+        if self.subscribers is None:
+            return None
+        
+        recipients = self.subscribers.find(location=location, alert_type=alert_type)
+        email_body = email_html(telegram_msg)
+        
+        def send(recipient: Dict) -> Dict:
+            if recipient['channel'] == 'telegram':
+                if photo_path:
+                    return self.telegram.send_photo(photo_path, telegram_msg, chat_id=recipient['address'])
+                return self.telegram.send_message(telegram_msg, chat_id=recipient['address'])
+            if recipient['channel'] == 'sms':
+                return self.sms.send_sms(sms_msg, to_number=recipient['address'])
+            if recipient['channel'] == 'email':
+                return self.email.send_email(email_subject or alert_type, email_body, to=recipient['address'])
+            if recipient['channel'] == 'email_digest':
+                return self.email.queue_digest(email_subject or alert_type, email_body, to=recipient['address'])
+            return {'success': False, 'error': f"Nieobsługiwany kanał: {recipient['channel']}"}
+        
+        return self.dispatcher.broadcast(recipients, send, deadline_s=ALERT_FAN_OUT_DEADLINE_S or None)
+    
     def get_alert_history(self) -> List[Dict]:
         """Zwraca historię alertów"""
         return self.alert_history
@@ -413,6 +668,8 @@ class RealAlertSystem:
                                   if alert['results']['telegram']['success'])
         successful_sms = sum(1 for alert in self.alert_history 
                             if alert['results']['sms']['success'])
+        successful_email = sum(1 for alert in self.alert_history
+                               if alert['results'].get('email', {}).get('success'))
         
         by_type = {}
         for alert in self.alert_history:
@@ -423,8 +680,10 @@ class RealAlertSystem:
             'total_alerts': total,
             'successful_telegram': successful_telegram,
             'successful_sms': successful_sms,
+            'successful_email': successful_email,
             'success_rate_telegram': successful_telegram / max(total, 1),
             'success_rate_sms': successful_sms / max(total, 1),
+            'success_rate_email': successful_email / max(total, 1),
             'by_type': by_type,
             'last_alert': self.alert_history[-1]['timestamp'] if self.alert_history else None
         }
@@ -433,6 +692,9 @@ class RealAlertSystem:
 def test_real_alerts():
     """Test real alert system"""
     
+    from monitoring.log_config import setup_logging
+    setup_logging(fmt="text")
+    
     print("🚨 Testing Real Alert System...")
     
     alert_system = RealAlertSystem()
@@ -476,6 +738,7 @@ def test_real_alerts():
     print(f"Total alerts sent: {stats['total_alerts']}")
     print(f"Telegram success rate: {stats['success_rate_telegram']:.1%}")
     print(f"SMS success rate: {stats['success_rate_sms']:.1%}")
+    print(f"Email success rate: {stats['success_rate_email']:.1%}")
 
 if __name__ == "__main__":
     test_real_alerts() 
\ No newline at end of file
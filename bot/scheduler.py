@@ -0,0 +1,500 @@
+"""
+Alert Scheduler for WeatherEyes
+Cykliczne podsumowania i alerty przed wydarzeniami (np. 60 i 15 min przed event_time)
+dla wielu lokalizacji: kopiec terminów w pamięci, harmonogramy w bazie wyników,
+proces śpi do najbliższego terminu i po restarcie nadrabia pominięte wg polityki
+(CLI: alert_scheduler.py)
+"""
+
+import heapq
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python bot/scheduler.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_model.geo import GeoPartitionedAnalyses, location_key
+from ai_model.records import AnalysisRecord, compact_analyses
+from monitoring.metrics import metrics
+from monitoring.log_config import get_logger
+from storage.results_store import ResultsStore, _to_epoch
+
+logger = get_logger(__name__)
+
+SCHEDULER_CATCH_UP = os.getenv('SCHEDULER_CATCH_UP', 'once')
+SCHEDULER_MISFIRE_GRACE_S = float(os.getenv('SCHEDULER_MISFIRE_GRACE_S', '300'))
+SCHEDULER_MAX_CATCH_UP = int(os.getenv('SCHEDULER_MAX_CATCH_UP', '24'))
+# Górna granica snu - po zmianie zegara systemowego termin zostanie przeliczony najpóźniej po tym czasie
+SCHEDULER_MAX_SLEEP_S = float(os.getenv('SCHEDULER_MAX_SLEEP_S', '300'))
+EVENT_ALERT_LEADS = [int(m) for m in os.getenv('EVENT_ALERT_LEADS', '60,15').split(',') if m.strip()]
+DAILY_SUMMARY_AT = os.getenv('DAILY_SUMMARY_AT', '20:00')
+# Ponowienie terminu po błędzie handlera albo braku doręczenia: backoff wykładniczy do limitu prób
+SCHEDULER_RETRY_BASE_S = float(os.getenv('SCHEDULER_RETRY_BASE_S', '60'))
+SCHEDULER_RETRY_MAX_S = float(os.getenv('SCHEDULER_RETRY_MAX_S', '1800'))
+SCHEDULER_MAX_RETRIES = int(os.getenv('SCHEDULER_MAX_RETRIES', '10'))
+
+# skip - pominięte terminy przepadają (odpala się tylko termin w granicach grace),
+# once - jedno zbiorcze wywołanie za wszystkie pominięte, all - każdy pominięty (do SCHEDULER_MAX_CATCH_UP)
+CATCH_UP_POLICIES = ('skip', 'once', 'all')
+
+
+def parse_repeat(repeat: Optional[str]) -> Optional[Tuple[str, object]]:
+    """'daily@HH:MM' -> ('daily', (h, m)); 'every:SECONDS' -> ('every', s); None = jednorazowy"""
+    if not repeat:
+        return None
+    kind, _, value = repeat.partition('@' if repeat.startswith('daily') else ':')
+    try:
+        if kind == 'daily':
+            hour, minute = (int(part) for part in value.split(':'))
+            if 0 <= hour < 24 and 0 <= minute < 60:
+                return 'daily', (hour, minute)
+        elif kind == 'every' and float(value) > 0:
+            return 'every', float(value)
+    except ValueError:
+        pass
+    raise ValueError(f"Niepoprawne powtarzanie '{repeat}' - oczekiwano daily@HH:MM albo every:SECONDS")
+
+
+def next_occurrence(repeat: Optional[str], after: float) -> Optional[float]:
+    """
+    Pierwszy termin > after. Dzienne liczone w czasie lokalnym od daty,
+    a nie przez +86400 s, więc zmiana czasu letniego nie przesuwa godziny.
+    """
+    parsed = parse_repeat(repeat)
+    if parsed is None:
+        return None
+    kind, value = parsed
+    if kind == 'every':
+        return after + value
+
+    hour, minute = value
+    moment = datetime.fromtimestamp(after)
+    candidate = moment.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    while candidate.timestamp() <= after:
+        candidate = (candidate + timedelta(days=1)).replace(hour=hour, minute=minute)
+    return candidate.timestamp()
+
+
+class AlertScheduler:
+    """
+    Harmonogramy w tabeli `schedules` (ta sama baza co wyniki), terminy w kopcu min:
+    dodanie i pobranie najbliższego terminu to O(log n), sprawdzenie "czy coś jest do zrobienia" O(1).
+    Usunięte/przesunięte wpisy zostają w kopcu i są pomijane przy zdjęciu (porównanie z aktualnym terminem).
+
+    Handler dostaje słownik harmonogramu z 'scheduled_for' (epoch terminu) i 'run_key'
+    (id@termin - stały przy ponowieniu). Termin w bazie jest przesuwany dopiero po udanym handlerze,
+    więc awaria w trakcie wysyłki oznacza ponowienie po restarcie (at-least-once). Wyjątek handlera
+    albo wynik z delivered=False zostawia next_run na nieudanym terminie i ponawia go z backoffem
+    (czas ponowienia w last_result['retry']); po SCHEDULER_MAX_RETRIES próbach termin przepada.
+    """
+
+    def __init__(self, store: ResultsStore, handlers: Dict[str, Callable[[Dict], Dict]],
+                 clock: Callable[[], float] = time.time, grace_s: float = SCHEDULER_MISFIRE_GRACE_S,
+                 max_catch_up: int = SCHEDULER_MAX_CATCH_UP):
+        self.store = store
+        self.handlers = handlers
+        self.clock = clock
+        self.grace_s = grace_s
+        self.max_catch_up = max_catch_up
+
+        self._heap: List[Tuple[float, int, str]] = []
+        self._due: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._wakeup = threading.Condition()
+        self._stopped = threading.Event()
+
+        with store.transaction() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS schedules (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    location TEXT,
+                    payload TEXT NOT NULL,
+                    next_run REAL,
+                    repeat TEXT,
+                    catch_up TEXT NOT NULL,
+                    expires_at REAL,
+                    last_run REAL,
+                    last_result TEXT,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_schedules_next_run ON schedules (next_run);
+            """)
+        with store._lock:
+            rows = store.conn.execute(
+                "SELECT id, next_run, last_result FROM schedules WHERE next_run IS NOT NULL").fetchall()
+        for job_id, next_run, last_result in rows:
+            self._push(job_id, self._due_at({'next_run': next_run,
+                                             'last_result': json.loads(last_result) if last_result else None}))
+
+    @staticmethod
+    def _due_at(job: Dict) -> float:
+        """Kiedy odpalić: next_run albo - po nieudanej próbie tego terminu - czas ponowienia"""
+        retry = (job['last_result'] or {}).get('retry')
+        if retry and retry['scheduled_for'] == job['next_run']:
+            return retry['at']
+        return job['next_run']
+
+    def _push(self, job_id: str, next_run: float):
+        self._due[job_id] = next_run
+        heapq.heappush(self._heap, (next_run, next(self._seq), job_id))
+        metrics.set_gauge('scheduler_jobs', len(self._due))
+
+    def _get(self, job_id: str) -> Optional[Dict]:
+        with self.store._lock:
+            row = self.store.conn.execute(
+                "SELECT id, kind, location, payload, next_run, repeat, catch_up, expires_at, "
+                "last_run, last_result FROM schedules WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ('id', 'kind', 'location', 'payload', 'next_run', 'repeat', 'catch_up', 'expires_at',
+                'last_run', 'last_result')
+        job = dict(zip(keys, row))
+        job['payload'] = json.loads(job['payload'])
+        job['last_result'] = json.loads(job['last_result']) if job['last_result'] else None
+        return job
+
+    def add(self, job_id: str, kind: str, first_run: float, payload: Optional[Dict] = None,
+            location: Optional[str] = None, repeat: Optional[str] = None,
+            catch_up: str = SCHEDULER_CATCH_UP, expires_at: Optional[float] = None) -> Dict:
+        """Dodaje albo nadpisuje harmonogram (to samo id = ten sam harmonogram, bez duplikatów)"""
+        if kind not in self.handlers:
+            raise ValueError(f"Brak handlera dla '{kind}'")
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"Unknown catch_up policy: {catch_up}")
+        parse_repeat(repeat)
+
+        with self.store.transaction() as conn:
+            conn.execute(
+                "INSERT INTO schedules (id, kind, location, payload, next_run, repeat, catch_up, expires_at, "
+                "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET kind = excluded.kind, location = excluded.location, "
+                "payload = excluded.payload, next_run = excluded.next_run, repeat = excluded.repeat, "
+                "catch_up = excluded.catch_up, expires_at = excluded.expires_at, "
+                "updated_at = excluded.updated_at",
+                (job_id, kind, location, json.dumps(payload or {}, ensure_ascii=False), first_run,
+                 repeat, catch_up, expires_at, self.clock())
+            )
+        job = self._get(job_id)
+        with self._wakeup:
+            self._push(job_id, self._due_at(job))
+            self._wakeup.notify()
+        return job
+
+    def add_daily_summary(self, location: str, at: str = DAILY_SUMMARY_AT, hours: float = 24,
+                          catch_up: str = SCHEDULER_CATCH_UP) -> Dict:
+        """Codzienne podsumowanie dla lokalizacji o godzinie `at` (czas lokalny)"""
+        repeat = f"daily@{at}"
+        return self.add(f"daily_summary:{location}", 'daily_summary', next_occurrence(repeat, self.clock()),
+                        {'hours': hours}, location=location, repeat=repeat, catch_up=catch_up)
+
+    def add_event(self, event_name: str, event_time, location: str,
+                  leads_min: Sequence[int] = EVENT_ALERT_LEADS, weather: Optional[Dict] = None) -> List[Dict]:
+        """
+        Alerty `leads_min` minut przed wydarzeniem. Każdy wygasa w chwili rozpoczęcia,
+        więc po dłuższym przestoju alert "za 15 min" nie przyjdzie w trakcie wydarzenia.
+        """
+        event_ts = _to_epoch(event_time)
+        jobs = []
+        for lead in leads_min:
+            payload = {'event_name': event_name, 'event_time': event_ts, 'lead_min': lead, 'weather': weather}
+            jobs.append(self.add(f"event:{event_name}:{int(event_ts)}:{lead}", 'event_alert',
+                                 event_ts - lead * 60, payload, location=location,
+                                 catch_up='once', expires_at=event_ts))
+        return jobs
+
+    def add_email_digest(self, every_s: float) -> Dict:
+        """Wysyłka digestów email co every_s sekund (należne wg EMAIL_DIGEST_INTERVAL_S)"""
+        repeat = f"every:{every_s:g}"
+        return self.add('email_digest', 'email_digest', next_occurrence(repeat, self.clock()),
+                        repeat=repeat, catch_up='once')
+
+    def remove(self, job_id: str) -> bool:
+        with self.store.transaction() as conn:
+            removed = conn.execute("DELETE FROM schedules WHERE id = ?", (job_id,)).rowcount > 0
+        with self._wakeup:
+            self._due.pop(job_id, None)
+            metrics.set_gauge('scheduler_jobs', len(self._due))
+        return removed
+
+    def schedules(self) -> List[Dict]:
+        with self.store._lock:
+            ids = [row[0] for row in self.store.conn.execute(
+                "SELECT id FROM schedules ORDER BY next_run IS NULL, next_run").fetchall()]
+        return [self._get(job_id) for job_id in ids]
+
+    def next_due(self) -> Optional[float]:
+        """Najbliższy aktualny termin (nieaktualne wpisy kopca są zdejmowane)"""
+        with self._wakeup:
+            while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def _occurrences(self, job: Dict, now: float) -> Tuple[List[float], List[float], Optional[float]]:
+        """Terminy, które minęły, te do odpalenia teraz wg polityki catch-up i następny termin"""
+        due = [job['next_run']]
+        following = next_occurrence(job['repeat'], job['next_run'])
+        while following is not None and following <= now:
+            due.append(following)
+            following = next_occurrence(job['repeat'], following)
+        due = due[-(self.max_catch_up + 1):]
+
+        if job['expires_at'] is not None and now >= job['expires_at']:
+            fire = []
+        elif job['catch_up'] == 'all':
+            fire = due
+        elif job['catch_up'] == 'once':
+            fire = due[-1:]
+        else:
+            fire = [ts for ts in due[-1:] if now - ts <= self.grace_s]
+        return due, fire, following
+
+    def _run_job(self, job: Dict, now: float) -> List[Dict]:
+        due, fire, following = self._occurrences(job, now)
+        if not fire:
+            metrics.inc('scheduler_runs_total', kind=job['kind'], outcome='misfire')
+            logger.info("Schedule misfire", extra={'schedule_id': job['id'], 'scheduled_for': job['next_run'],
+                                                   'late_s': round(now - job['next_run'], 1)})
+
+        results, error, failed_at = [], None, None
+        for scheduled_for in fire:
+            metrics.observe('scheduler_lag_seconds', max(0.0, now - scheduled_for), kind=job['kind'])
+            run = dict(job, scheduled_for=scheduled_for, run_key=f"{job['id']}@{int(scheduled_for)}")
+            try:
+                with metrics.timer('schedule', kind=job['kind']):
+                    result = self.handlers[job['kind']](run) or {}
+            except Exception as exc:
+                error, failed_at = f"{type(exc).__name__}: {exc}", scheduled_for
+                metrics.inc('scheduler_runs_total', kind=job['kind'], outcome='error')
+                logger.exception("Scheduled job failed", extra={'schedule_id': job['id']})
+                break
+            if result.get('skipped') or result.get('duplicate'):
+                outcome = 'skipped'
+            elif result.get('delivered') is False:
+                outcome = 'failed'
+            else:
+                outcome = 'sent'
+            metrics.inc('scheduler_runs_total', kind=job['kind'], outcome=outcome)
+            results.append({'run_key': run['run_key'], 'outcome': outcome})
+            if outcome == 'failed':
+                error, failed_at = "no channel delivered", scheduled_for
+                break
+
+        last_result = {'results': results, 'error': error, 'missed': len(due) - len(fire)}
+        next_run, due_at = following, following
+        if failed_at is not None:
+            # Nieudany termin zostaje w next_run (ten sam run_key); kolejne terminy czekają za nim
+            previous = (job['last_result'] or {}).get('retry') or {}
+            attempts = previous.get('attempts', 0) + 1 if previous.get('scheduled_for') == failed_at else 1
+            if attempts <= SCHEDULER_MAX_RETRIES:
+                delay = min(SCHEDULER_RETRY_MAX_S, SCHEDULER_RETRY_BASE_S * 2 ** (attempts - 1))
+                next_run, due_at = failed_at, now + delay
+                last_result['retry'] = {'scheduled_for': failed_at, 'at': due_at, 'attempts': attempts}
+                logger.warning("Scheduled run will be retried", extra={
+                    'schedule_id': job['id'], 'scheduled_for': failed_at, 'attempts': attempts, 'delay_s': delay})
+            else:
+                next_run = due_at = next_occurrence(job['repeat'], failed_at)
+                metrics.inc('scheduler_runs_total', kind=job['kind'], outcome='gave_up')
+                logger.error("Scheduled run abandoned", extra={
+                    'schedule_id': job['id'], 'scheduled_for': failed_at, 'attempts': attempts - 1})
+        with self.store.transaction() as conn:
+            conn.execute(
+                "UPDATE schedules SET next_run = ?, last_run = ?, last_result = ?, updated_at = ? "
+                "WHERE id = ? AND next_run = ?",
+                (next_run, now, json.dumps(last_result, ensure_ascii=False), now, job['id'], job['next_run'])
+            )
+        with self._wakeup:
+            if self._due.get(job['id']) == self._due_at(job):
+                self._due.pop(job['id'])
+                if due_at is not None:
+                    self._push(job['id'], due_at)
+            metrics.set_gauge('scheduler_jobs', len(self._due))
+        return results
+
+    def run_pending(self) -> List[Dict]:
+        """Wykonuje wszystkie harmonogramy z terminem <= teraz"""
+        now = self.clock()
+        done = []
+        while True:
+            next_run = self.next_due()
+            if next_run is None or next_run > now:
+                return done
+            with self._wakeup:
+                _, _, job_id = heapq.heappop(self._heap)
+            job = self._get(job_id)
+            if job is None or job['next_run'] is None or self._due_at(job) != next_run:
+                continue
+            done.extend(self._run_job(job, now))
+
+    def run_forever(self):
+        """Pętla: śpi do najbliższego terminu (add() budzi wcześniej), potem run_pending()"""
+        logger.info("Scheduler started", extra={'jobs': len(self._due)})
+        while not self._stopped.is_set():
+            self.run_pending()
+            next_run = self.next_due()
+            timeout = SCHEDULER_MAX_SLEEP_S if next_run is None else next_run - self.clock()
+            with self._wakeup:
+                if not self._stopped.is_set() and timeout > 0:
+                    self._wakeup.wait(min(timeout, SCHEDULER_MAX_SLEEP_S))
+        logger.info("Scheduler stopped")
+
+    def stop(self):
+        self._stopped.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+
+def _analyses_for(store: ResultsStore, location: Optional[str], hours: float,
+                  before_hours: float = 0) -> List[AnalysisRecord]:
+    """
+    Analizy z okna `hours` godzin kończącego się `before_hours` temu, dla lokalizacji
+    (nazwa albo geohash); bez lokalizacji - wszystkie. Doba analiz zostaje w pamięci
+    na czas podsumowań, więc jako kompaktowe rekordy bez surowych odpowiedzi.
+    """
+    if before_hours:
+        until = datetime.now() - timedelta(hours=before_hours)
+        analyses = store.query_analyses(since=until - timedelta(hours=hours), until=until)
+    else:
+        analyses = store.recent_analyses(hours=hours)
+    if location:
+        analyses = [a for a in analyses
+                    if location_key(a) == location or (a.get('location') or {}).get('name') == location]
+    return compact_analyses(analyses, policy='drop')
+
+
+def _cell_changes(alert_system, store: ResultsStore, job: Dict, hours: float,
+                  summarize: Callable[[List[Dict]], Dict]) -> List[Dict]:
+    """
+    Zmiany dominującej pogody per komórka geohash: ostatnie `hours` godzin wobec okna
+    wcześniejszego. Każda zmiana to alert lokalny z kluczem idempotencji terminu i komórki,
+    więc ponowienie terminu nie dubluje alertów już doręczonych.
+    """
+    previous, current = GeoPartitionedAnalyses(), GeoPartitionedAnalyses()
+    previous.extend(_analyses_for(store, job['location'], hours, before_hours=hours))
+    current.extend(_analyses_for(store, job['location'], hours))
+    changes = GeoPartitionedAnalyses.detect_changes(previous.summaries(summarize), current.summaries(summarize))
+    for change in changes:
+        alert = alert_system.send_weather_change_alert(
+            change['previous_weather'], change['current_weather'], change['confidence'],
+            location=change['location'], idempotency_key=f"{job['run_key']}:{change['cell']}")
+        store.append_alert(dict(alert, schedule_run=job['run_key'], cell=change['cell']))
+        change['delivered'] = alert.get('delivered', True)
+    return changes
+
+
+def alert_handlers(alert_system, store: ResultsStore,
+                   summarize: Optional[Callable[[List[Dict]], Dict]] = None) -> Dict[str, Callable[[Dict], Dict]]:
+    """
+    Handlery 'daily_summary' i 'event_alert' na RealAlertSystem: podsumowanie z analiz
+    zapisanych w bazie, alert zapisany w tej samej bazie. Bez analiz - pominięcie zamiast pustego alertu.
+    Przy okazji alerty lokalne dla komórek geohash, w których zmieniła się dominująca pogoda.
+    'email_digest' wysyła należne digesty email.
+    """
+    if summarize is None:
+        from ai_model.openai_vision import OpenAIVisionAnalyzer
+        summarize = OpenAIVisionAnalyzer().get_weather_summary_from_images
+
+    def daily_summary(job: Dict) -> Dict:
+        summary = summarize(_analyses_for(store, job['location'], job['payload'].get('hours', 24)))
+        if 'error' in summary:
+            return {'skipped': summary['error']}
+        alert = alert_system.send_daily_summary_alert(summary, location=job['location'],
+                                                      idempotency_key=job['run_key'])
+        store.append_alert(dict(alert, schedule_run=job['run_key']))
+        alert['cell_changes'] = _cell_changes(alert_system, store, job, job['payload'].get('hours', 24), summarize)
+        return alert
+
+    def event_alert(job: Dict) -> Dict:
+        payload = job['payload']
+        weather = payload.get('weather')
+        if not weather:
+            summary = summarize(_analyses_for(store, job['location'], payload.get('hours', 3)))
+            if 'error' in summary:
+                return {'skipped': summary['error']}
+            posterior = summary.get('posterior') or {}
+            weather = {'condition': summary['dominant_weather'],
+                       'rain_chance': round(100 * sum(posterior.get(c, 0) for c in ('rainy', 'stormy')))}
+        event_time = datetime.fromtimestamp(payload['event_time']).strftime("%H:%M, %d.%m.%Y")
+        alert = alert_system.send_event_weather_alert(payload['event_name'], event_time, weather,
+                                                      location=job['location'], idempotency_key=job['run_key'])
+        store.append_alert(dict(alert, schedule_run=job['run_key']))
+        alert['cell_changes'] = _cell_changes(alert_system, store, job, payload.get('hours', 3), summarize)
+        return alert
+
+    def email_digest(job: Dict) -> Dict:
+        result = alert_system.email.flush_digests()
+        return result if result['recipients'] else {'skipped': 'no pending digests'}
+
+    return {'daily_summary': daily_summary, 'event_alert': event_alert, 'email_digest': email_digest}
+
+
+# Test function
+def test_scheduler():
+    """Test alert scheduler"""
+
+    import tempfile
+    from pathlib import Path
+
+    print("⏰ Testing alert scheduler...")
+
+    now = [datetime(2026, 7, 12, 12, 0).timestamp()]
+    sent = []
+    failures = [0]
+
+    def event_alert(job):
+        if failures[0]:
+            failures[0] -= 1
+            return {'delivered': False}
+        sent.append((f"event -{job['payload']['lead_min']}m", job['run_key']))
+        return {'delivered': True}
+
+    handlers = {
+        'daily_summary': lambda job: sent.append(('daily', job['run_key'])) or {},
+        'event_alert': event_alert
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultsStore(str(Path(tmp) / "results.db"))
+        scheduler = AlertScheduler(store, handlers, clock=lambda: now[0])
+        scheduler.add_daily_summary("SHAMAN Event", at="20:00")
+        scheduler.add_event("Koncert", datetime(2026, 7, 12, 19, 0), "SHAMAN Event", leads_min=(60, 15))
+        print(f"✅ Harmonogramy: {len(scheduler.schedules())}, najbliższy: "
+              f"{datetime.fromtimestamp(scheduler.next_due()):%H:%M}")
+
+        now[0] = datetime(2026, 7, 12, 18, 0, 30).timestamp()
+        scheduler.run_pending()
+        print(f"✅ 18:00 -> {sent}")
+
+        # Przestój od 18:10 do 21:00 następnego dnia: alert -15m wygasł, podsumowania zbiorczo raz
+        store.close()
+        now[0] = datetime(2026, 7, 13, 21, 0).timestamp()
+        store = ResultsStore(str(Path(tmp) / "results.db"))
+        scheduler = AlertScheduler(store, handlers, clock=lambda: now[0])
+        sent.clear()
+        scheduler.run_pending()
+        print(f"✅ Po restarcie (catch-up once): {sent}")
+        print(f"✅ Następny termin: {datetime.fromtimestamp(scheduler.next_due()):%d.%m %H:%M}")
+
+        # Jednorazowy alert bez doręczenia: ten sam run_key ponawiany z backoffem, nie przepada
+        failures[0] = 2
+        sent.clear()
+        scheduler.add_event("Pokaz", datetime(2026, 7, 14, 12, 0), "SHAMAN Event", leads_min=(60,))
+        now[0] = datetime(2026, 7, 14, 11, 0).timestamp()
+        for _ in range(3):
+            scheduler.run_pending()
+            now[0] = max(now[0], scheduler.next_due() or now[0])
+        assert sent == [('event -60m', f"event:Pokaz:{int(datetime(2026, 7, 14, 12, 0).timestamp())}:60@"
+                                       f"{int(datetime(2026, 7, 14, 11, 0).timestamp())}")], sent
+        print(f"✅ Po 2 nieudanych próbach: {sent}")
+        store.close()
+
+if __name__ == "__main__":
+    test_scheduler()
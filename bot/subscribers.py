@@ -0,0 +1,291 @@
+"""
+Subscribers for WeatherEyes
+Rejestr odbiorców alertów (SQLite) i rozsyłanie w partiach z limitami Telegram/SMS
+"""
+
+import contextvars
+import math
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python bot/subscribers.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.log_config import get_logger
+from monitoring.metrics import metrics
+
+logger = get_logger(__name__)
+
+# Dowolna lokalizacja / dowolny typ alertu
+ANY = '*'
+
+
+class SubscriberRegistry:
+    """
+    Subskrybenci z preferencjami (lokalizacja × typ alertu).
+    Każda kombinacja to wiersz w `preferences` z indeksem (location, alert_type),
+    więc wyszukanie odbiorców alertu to jedno zapytanie po indeksie.
+    """
+
+    def __init__(self, db_path: str = "data/subscribers.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS subscribers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel TEXT NOT NULL,
+                    address TEXT NOT NULL,
+                    name TEXT,
+                    active INTEGER NOT NULL DEFAULT 1,
+                    created_at TEXT NOT NULL,
+                    UNIQUE (channel, address)
+                );
+                CREATE TABLE IF NOT EXISTS preferences (
+                    subscriber_id INTEGER NOT NULL REFERENCES subscribers (id) ON DELETE CASCADE,
+                    location TEXT NOT NULL,
+                    alert_type TEXT NOT NULL,
+                    PRIMARY KEY (subscriber_id, location, alert_type)
+                );
+                CREATE INDEX IF NOT EXISTS idx_preferences_lookup ON preferences (location, alert_type);
+            """)
+
+    def add_subscriber(self, channel: str, address: str, locations: Iterable[str] = (ANY,),
+                       alert_types: Iterable[str] = (ANY,), name: Optional[str] = None) -> int:
+        """Dodaje (lub aktualizuje) subskrybenta; zwraca jego id"""
+        locations, alert_types = list(locations) or [ANY], list(alert_types) or [ANY]
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO subscribers (channel, address, name, created_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (channel, address) DO UPDATE SET name = excluded.name, active = 1",
+                (channel, str(address), name, datetime.now().isoformat())
+            )
+            subscriber_id = self.conn.execute(
+                "SELECT id FROM subscribers WHERE channel = ? AND address = ?", (channel, str(address))
+            ).fetchone()[0]
+            self.conn.execute("DELETE FROM preferences WHERE subscriber_id = ?", (subscriber_id,))
+            self.conn.executemany(
+                "INSERT INTO preferences (subscriber_id, location, alert_type) VALUES (?, ?, ?)",
+                [(subscriber_id, loc, alert_type) for loc in locations for alert_type in alert_types]
+            )
+        return subscriber_id
+
+    def deactivate(self, subscriber_id: int):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE subscribers SET active = 0 WHERE id = ?", (subscriber_id,))
+
+    def remove(self, subscriber_id: int):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM subscribers WHERE id = ?", (subscriber_id,))
+
+    def find(self, location: Union[str, Sequence[str], None] = None, alert_type: Optional[str] = None,
+             channel: Optional[str] = None) -> List[Dict]:
+        """
+        Aktywni subskrybenci danej lokalizacji i typu alertu (z uwzględnieniem '*').
+        location może być listą kluczy (np. nazwa miejsca i komórki geohash) - każdy odbiorca raz.
+        """
+        locations = [location] if isinstance(location, str) else list(location or [])
+        locations = list(dict.fromkeys(locations + [ANY]))
+        sql = ("SELECT DISTINCT s.id, s.channel, s.address, s.name FROM preferences p "
+               "JOIN subscribers s ON s.id = p.subscriber_id "
+               f"WHERE s.active = 1 AND p.location IN ({', '.join('?' * len(locations))}) "
+               "AND p.alert_type IN (?, ?)")
+        params = locations + [alert_type or ANY, ANY]
+        if channel:
+            sql += " AND s.channel = ?"
+            params.append(channel)
+        sql += " ORDER BY s.id"
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [{'id': r[0], 'channel': r[1], 'address': r[2], 'name': r[3]} for r in rows]
+
+    def count(self, active_only: bool = True) -> int:
+        sql = "SELECT COUNT(*) FROM subscribers" + (" WHERE active = 1" if active_only else "")
+        with self._lock:
+            return self.conn.execute(sql).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class RateLimiter:
+    """
+    Token bucket dla limitu globalnego + minimalny odstęp per odbiorca.
+    acquire() blokuje wątek do momentu, aż wysyłka jest dozwolona.
+    """
+
+    def __init__(self, per_second: float, per_recipient_interval: Optional[float] = None):
+        self.per_second = per_second
+        self.per_recipient_interval = per_recipient_interval
+        self._tokens = per_second
+        self._updated = time.monotonic()
+        self._last_sent: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, recipient: Optional[str] = None):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.per_second, self._tokens + (now - self._updated) * self.per_second)
+                self._updated = now
+
+                wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.per_second
+                if recipient and self.per_recipient_interval:
+                    last = self._last_sent.get(recipient)
+                    if last is not None:
+                        wait = max(wait, last + self.per_recipient_interval - now)
+
+                if wait <= 0:
+                    self._tokens -= 1
+                    if recipient and self.per_recipient_interval:
+                        self._last_sent[recipient] = now
+                    return
+            time.sleep(wait)
+
+    def penalize(self, seconds: float):
+        """Po 429 (retry_after) wstrzymuje wszystkie wysyłki kanału"""
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.per_second
+
+
+# Domyślne limity: Telegram ~30 wiadomości/s globalnie i 1/s na czat, Twilio long code ~1 SMS/s
+DEFAULT_LIMITS = {
+    'telegram': {'per_second': 30, 'per_recipient_interval': 1.0},
+    'sms': {'per_second': 1, 'per_recipient_interval': None},
+    'email': {'per_second': 10, 'per_recipient_interval': None}
+}
+
+
+class FanOutDispatcher:
+    """
+    Dzieli odbiorców na partie (shardy) i rozsyła je równolegle w puli wątków.
+    Wspólny RateLimiter per kanał pilnuje limitu globalnego niezależnie od liczby wątków,
+    więc czas rozsyłki to ~liczba_odbiorców / limit_kanału.
+    """
+
+    def __init__(self, workers: int = 8, batch_size: int = 500, max_retries: int = 2,
+                 limits: Optional[Dict[str, Dict]] = None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.limiters = {channel: RateLimiter(**config)
+                         for channel, config in (limits or DEFAULT_LIMITS).items()}
+
+    def shard(self, recipients: List[Dict]) -> List[List[Dict]]:
+        """Partie jednego kanału, nie większe niż batch_size"""
+        by_channel: Dict[str, List[Dict]] = {}
+        for recipient in recipients:
+            by_channel.setdefault(recipient['channel'], []).append(recipient)
+        batches = []
+        for channel_recipients in by_channel.values():
+            size = max(1, min(self.batch_size, math.ceil(len(channel_recipients) / self.workers)))
+            batches += [channel_recipients[i:i + size] for i in range(0, len(channel_recipients), size)]
+        return batches
+
+    def _send_batch(self, batch: List[Dict], send: Callable[[Dict], Dict],
+                    deadline: Optional[float]) -> List[Dict]:
+        outcomes = []
+        for recipient in batch:
+            if deadline and time.monotonic() > deadline:
+                outcomes.append({'recipient': recipient['id'], 'success': False, 'error': 'deadline'})
+                continue
+
+            limiter = self.limiters.get(recipient['channel'])
+            result = {'success': False, 'error': 'not sent'}
+            for attempt in range(self.max_retries + 1):
+                if limiter:
+                    limiter.acquire(recipient['address'])
+                result = send(recipient)
+                retry_after = result.get('retry_after')
+                if result.get('success') or not retry_after:
+                    break
+                metrics.inc('fan_out_retries_total', channel=recipient['channel'])
+                if limiter:
+                    limiter.penalize(retry_after)
+
+            metrics.inc('fan_out_total', channel=recipient['channel'],
+                        outcome='success' if result.get('success') else 'error')
+            outcomes.append({'recipient': recipient['id'], 'success': bool(result.get('success')),
+                             'error': result.get('error')})
+        return outcomes
+
+    def broadcast(self, recipients: List[Dict], send: Callable[[Dict], Dict],
+                  deadline_s: Optional[float] = None) -> Dict:
+        """Wysyła do wszystkich odbiorców; send(recipient) zwraca dict z 'success'"""
+        start = time.monotonic()
+        deadline = start + deadline_s if deadline_s else None
+        batches = self.shard(recipients)
+
+        outcomes: List[Dict] = []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(batches) or 1))) as pool:
+            # Kopia kontekstu per partia - logi wątków zachowują correlation id alertu
+            futures = [pool.submit(contextvars.copy_context().run, self._send_batch, batch, send, deadline)
+                       for batch in batches]
+            for future in as_completed(futures):
+                outcomes += future.result()
+
+        sent = sum(1 for o in outcomes if o['success'])
+        # Odbiorcy pominięci po przekroczeniu deadline_s - do ponownej rozsyłki
+        unsent = [o['recipient'] for o in outcomes if o['error'] == 'deadline']
+        elapsed = time.monotonic() - start
+        logger.info("Fan-out finished", extra={
+            'recipients': len(recipients), 'sent': sent, 'unsent': len(unsent), 'batches': len(batches),
+            'elapsed_s': round(elapsed, 3)
+        })
+        if unsent:
+            logger.warning("Fan-out deadline exceeded", extra={'deadline_s': deadline_s, 'unsent': len(unsent)})
+        return {
+            'recipients': len(recipients),
+            'sent': sent,
+            'failed': len(outcomes) - sent - len(unsent),
+            'unsent': unsent,
+            'batches': len(batches),
+            'elapsed_s': round(elapsed, 3),
+            'failures': [o for o in outcomes if not o['success'] and o['error'] != 'deadline'][:100],
+            'timestamp': datetime.now().isoformat()
+        }
+
+# Test function
+def test_subscribers():
+    """Test subscriber registry and fan-out"""
+
+    print("👥 Testing Subscriber Registry...")
+
+    registry = SubscriberRegistry("data/test_subscribers.db")
+    for i in range(200):
+        registry.add_subscriber('telegram', f"chat_{i}", locations=['Warszawa' if i % 2 else 'Kraków'],
+                                alert_types=['weather_change', 'daily_summary'])
+    registry.add_subscriber('sms', '+48123456789', alert_types=['weather_change'])
+
+    recipients = registry.find(location='Warszawa', alert_type='weather_change')
+    print(f"✅ Odbiorcy (Warszawa, weather_change): {len(recipients)}")
+    registry.add_subscriber('telegram', 'chat_geo', locations=['u3qcn', 'Warszawa'])
+    both = registry.find(location=['Warszawa', 'u3qcnh', 'u3qcn'], alert_type='weather_change')
+    assert sum(1 for r in both if r['address'] == 'chat_geo') == 1
+    print(f"✅ Odbiorcy (nazwa + geohash, bez duplikatów): {len(both)}")
+
+    dispatcher = FanOutDispatcher(workers=4, limits={'telegram': {'per_second': 1000}, 'sms': {'per_second': 1000}})
+    report = dispatcher.broadcast(recipients, lambda r: {'success': True})
+    print(f"📡 {report}")
+
+    # Wolny kanał i krótki deadline - reszta odbiorców wraca jako 'unsent'
+    report = dispatcher.broadcast(recipients, lambda r: time.sleep(0.02) or {'success': True}, deadline_s=0.1)
+    assert report['unsent'] and report['sent'] + len(report['unsent']) == len(recipients)
+    print(f"⏱️ Deadline 0.1s: wysłano {report['sent']}, niewysłane {len(report['unsent'])}")
+    registry.close()
+
+if __name__ == "__main__":
+    test_subscribers()
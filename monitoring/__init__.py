@@ -0,0 +1 @@
+# WeatherEyes Monitoring Module 
\ No newline at end of file
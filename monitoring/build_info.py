@@ -0,0 +1,29 @@
+"""
+Build Info for WeatherEyes
+Wersja kodu (commit git) do raportów benchmarków i odtworzeń korpusu
+"""
+
+import subprocess
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+def git_commit() -> str:
+    """Skrócony hash bieżącego commitu; 'unknown' poza repozytorium albo bez git"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=PROJECT_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return 'unknown'
+
+# Test function
+def test_build_info():
+    """Test build info"""
+
+    print(f"🏷️ Commit: {git_commit()}")
+
+if __name__ == "__main__":
+    test_build_info()
@@ -0,0 +1,175 @@
+"""
+Logging setup for WeatherEyes
+Nieblokujące logowanie (QueueHandler/QueueListener), JSON i correlation id per zdjęcie
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+ROOT_LOGGER = "weathereyes"
+
+_correlation_id: contextvars.ContextVar = contextvars.ContextVar('correlation_id', default=None)
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger w hierarchii 'weathereyes.*'"""
+    if not name.startswith(ROOT_LOGGER):
+        name = f"{ROOT_LOGGER}.{name}"
+    return logging.getLogger(name)
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def get_correlation_id() -> Optional[str]:
+    return _correlation_id.get()
+
+
+@contextmanager
+def correlation_context(correlation_id: Optional[str] = None):
+    """
+    Ustawia correlation id dla bieżącego wątku/zadania.
+    Bez argumentu zachowuje istniejące id albo tworzy nowe.
+    """
+    cid = correlation_id or _correlation_id.get() or new_correlation_id()
+    token = _correlation_id.set(cid)
+    try:
+        yield cid
+    finally:
+        _correlation_id.reset(token)
+
+
+class CorrelationFilter(logging.Filter):
+    """Dopisuje correlation_id do rekordu w wątku, który loguje (przed kolejką)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'correlation_id'):
+            record.correlation_id = _correlation_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Przepuszcza tylko część rekordów oznaczonych extra={'sampled': True}
+    (np. linia na każde zdjęcie). Ostrzeżenia i błędy nigdy nie są próbkowane.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = max(0.0, min(1.0, rate))
+        self._random = random.Random()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'sampled', False) or record.levelno >= logging.WARNING:
+            return True
+        return self.rate >= 1.0 or self._random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Jeden obiekt JSON na linię"""
+
+    _reserved = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'correlation_id', 'sampled'}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'correlation_id': getattr(record, 'correlation_id', None),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in self._reserved and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None,
+                  sample_rate: Optional[float] = None, stream=None) -> logging.Logger:
+    """
+    Konfiguruje logger 'weathereyes': wątki aplikacji tylko wrzucają rekordy do kolejki,
+    a zapis na stdout/stderr robi osobny wątek QueueListener.
+
+    Ustawienia (argument > env > domyślne):
+    - WEATHEREYES_LOG_LEVEL: DEBUG|INFO|WARNING|ERROR (INFO)
+    - WEATHEREYES_LOG_FORMAT: json|text (json)
+    - WEATHEREYES_LOG_SAMPLE_RATE: odsetek logowanych linii per zdjęcie (1.0)
+    """
+    global _listener
+
+    level = (level or os.getenv('WEATHEREYES_LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.getenv('WEATHEREYES_LOG_FORMAT', 'json')).lower()
+    if sample_rate is None:
+        sample_rate = float(os.getenv('WEATHEREYES_LOG_SAMPLE_RATE', '1.0'))
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level)
+
+    # Idempotentnie - Streamlit wykonuje skrypt przy każdej interakcji
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if fmt == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s"))
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationFilter())
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return logger
+
+
+def shutdown_logging():
+    """Opróżnia kolejkę i zatrzymuje wątek zapisu"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+# Test function
+def test_logging():
+    """Test logging setup"""
+
+    setup_logging(level="DEBUG", sample_rate=0.5)
+    logger = get_logger("test")
+
+    with correlation_context() as cid:
+        logger.info("Analiza zdjęcia", extra={'image': 'demo_sunny.jpg'})
+        for i in range(4):
+            logger.info("Linia per zdjęcie", extra={'sampled': True, 'index': i})
+        logger.warning("Ostrzeżenie nigdy nie jest próbkowane", extra={'sampled': True})
+    print(f"🔗 Correlation id: {cid}")
+    shutdown_logging()
+
+if __name__ == "__main__":
+    test_logging()
@@ -0,0 +1,317 @@
+"""
+Metrics for WeatherEyes
+Liczniki, timery etapów i koszt tokenów z eksportem w formacie Prometheus
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python monitoring/metrics.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.log_config import get_logger
+
+logger = get_logger(__name__)
+
+# Domyślne przedziały histogramów czasu (sekundy)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Ceny OpenAI w USD za 1M tokenów (gpt-4o), nadpisywalne przez env
+PRICE_INPUT_PER_1M = float(os.getenv('OPENAI_PRICE_INPUT_PER_1M', '2.50'))
+PRICE_OUTPUT_PER_1M = float(os.getenv('OPENAI_PRICE_OUTPUT_PER_1M', '10.00'))
+# Tokeny promptu z cache dostawcy (usage.prompt_tokens_details.cached_tokens)
+PRICE_CACHED_INPUT_PER_1M = float(os.getenv('OPENAI_PRICE_CACHED_INPUT_PER_1M', '1.25'))
+
+# Ceny innych modeli (np. backendów zapasowych): (input, cached input, output) za 1M tokenów.
+# OPENAI_MODEL_PRICES='{"model": [input, cached, output]}' dodaje/nadpisuje pozycje.
+DEFAULT_MODEL = 'gpt-4o'
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    DEFAULT_MODEL: (PRICE_INPUT_PER_1M, PRICE_CACHED_INPUT_PER_1M, PRICE_OUTPUT_PER_1M),
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+    'gpt-4.1': (2.00, 0.50, 8.00),
+    'gpt-4.1-mini': (0.40, 0.10, 1.60),
+    'gpt-4.1-nano': (0.10, 0.025, 0.40),
+}
+MODEL_PRICES.update({model: tuple(map(float, prices)) for model, prices in
+                     json.loads(os.getenv('OPENAI_MODEL_PRICES', '{}')).items()})
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    """Rejestr metryk bezpieczny dla wielu wątków"""
+
+    def __init__(self, namespace: str = "weathereyes"):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._buckets: Dict[str, tuple] = {}
+
+    def _name(self, name: str) -> str:
+        return f"{self.namespace}_{name}"
+
+    def describe(self, name: str, help_text: str, buckets: Optional[tuple] = None):
+        """Ustawia opis (HELP) i opcjonalnie przedziały histogramu"""
+        self._help[self._name(name)] = help_text
+        if buckets:
+            self._buckets[self._name(name)] = tuple(buckets)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """Zwiększa licznik"""
+        full, key = self._name(name), _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(full, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        full, key = self._name(name), _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(full, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Dodaje obserwację do histogramu"""
+        full, key = self._name(name), _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(full, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self._buckets.get(full, DEFAULT_BUCKETS))
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        """Mierzy czas etapu jako weathereyes_stage_seconds{stage=...}"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage, **labels)
+
+    def record_openai_usage(self, usage: Optional[Dict], model: str = DEFAULT_MODEL) -> float:
+        """Zapisuje tokeny z pola `usage` odpowiedzi OpenAI i zwraca koszt zdjęcia w USD"""
+        if not usage:
+            return 0.0
+        prompt_tokens = usage.get('prompt_tokens', 0) or 0
+        completion_tokens = usage.get('completion_tokens', 0) or 0
+        cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0) or 0
+        cost = usage_cost_usd(usage, model)
+
+        self.inc('openai_tokens_total', prompt_tokens, kind='prompt', model=model)
+        self.inc('openai_tokens_total', completion_tokens, kind='completion', model=model)
+        if cached_tokens:
+            self.inc('openai_tokens_total', cached_tokens, kind='cached', model=model)
+        self.inc('openai_cost_usd_total', cost, model=model)
+        self.observe('image_cost_usd', cost, model=model)
+        return cost
+
+    def snapshot(self) -> Dict:
+        """Zwraca stan wszystkich metryk jako słownik (np. do JSON lub dashboardu)"""
+        with self._lock:
+            return {
+                'counters': {name: [{'labels': dict(k), 'value': v} for k, v in series.items()]
+                             for name, series in self._counters.items()},
+                'gauges': {name: [{'labels': dict(k), 'value': v} for k, v in series.items()]
+                           for name, series in self._gauges.items()},
+                'histograms': {name: [{'labels': dict(k), 'count': h.count, 'sum': h.sum,
+                                       'mean': h.sum / h.count if h.count else 0.0,
+                                       'buckets': dict(zip(h.buckets, h.counts))}
+                                      for k, h in series.items()]
+                               for name, series in self._histograms.items()},
+                'timestamp': time.time()
+            }
+
+    def render_prometheus(self) -> str:
+        """Eksport w formacie tekstowym Prometheus (exposition format 0.0.4)"""
+        lines = []
+        with self._lock:
+            for kind, store in (('counter', self._counters), ('gauge', self._gauges)):
+                for name in sorted(store):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in store[name].items():
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in self._histograms[name].items():
+                    for bound, count in zip(h.buckets, h.counts):
+                        lines.append(f"{name}_bucket{_format_labels(key, {'le': repr(float(bound))})} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {h.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+def model_prices(model: Optional[str] = None) -> Tuple[float, float, float]:
+    """
+    Cennik modelu (input, cached input, output). Wersje z datą (gpt-4o-mini-2024-07-18)
+    biorą cennik najdłuższej pasującej nazwy; nieznany model - cennik DEFAULT_MODEL.
+    """
+    model = model or DEFAULT_MODEL
+    if model in MODEL_PRICES:
+        return MODEL_PRICES[model]
+    matches = [name for name in MODEL_PRICES if model.startswith(name + '-')]
+    return MODEL_PRICES[max(matches, key=len)] if matches else MODEL_PRICES[DEFAULT_MODEL]
+
+
+def estimate_cost_usd(prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0,
+                      model: Optional[str] = None) -> float:
+    """Koszt wywołania w USD wg cennika modelu za 1M tokenów (cached_tokens to część prompt_tokens)"""
+    input_price, cached_price, output_price = model_prices(model)
+    return ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price +
+            completion_tokens * output_price) / 1_000_000
+
+
+def usage_cost_usd(usage: Optional[Dict], model: Optional[str] = None) -> float:
+    """Koszt wywołania z pola `usage` odpowiedzi OpenAI (bez zapisu metryk)"""
+    if not usage:
+        return 0.0
+    return estimate_cost_usd(usage.get('prompt_tokens', 0) or 0, usage.get('completion_tokens', 0) or 0,
+                             (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0) or 0, model)
+
+
+# Globalny rejestr używany przez analyzer i system alertów
+metrics = MetricsRegistry()
+metrics.describe('stage_seconds', "Czas etapów pipeline'u (encode, request, parse, alerty)")
+metrics.describe('analyses_total', "Liczba analiz wg źródła wyniku")
+metrics.describe('fallback_total', "Liczba analiz obsłużonych ścieżką awaryjną")
+metrics.describe('upload_bytes_total', "Bajty wysłane do API OpenAI")
+metrics.describe('openai_tokens_total', "Tokeny OpenAI z pola usage (prompt, completion, cached - część promptu z cache)")
+metrics.describe('openai_cost_usd_total', "Szacowany łączny koszt OpenAI w USD")
+metrics.describe('image_cost_usd', "Szacowany koszt analizy jednego zdjęcia w USD",
+                 buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05))
+metrics.describe('alerts_total', "Wysłane alerty wg kanału i wyniku")
+metrics.describe('fan_out_total', "Wysyłki do subskrybentów wg kanału i wyniku")
+metrics.describe('fan_out_retries_total', "Ponowienia wysyłek po 429")
+metrics.describe('telegram_file_id_cache_total', "Wysyłki zdjęć: file_id z cache (hit), upload (miss), odrzucony file_id")
+metrics.describe('preprocess_bytes_saved_total', "Bajty uploadu zaoszczędzone przez zmniejszenie zdjęć przed analizą")
+metrics.describe('budget_decisions_total', "Decyzje budżetu OpenAI wg priorytetu, trybu detail i powodu")
+metrics.describe('budget_utilization', "Wykorzystanie budżetu OpenAI wg okna (minuta/dzień)")
+metrics.describe('sampler_images_total', "Zdjęcia w samplerze wg decyzji (selected, deferred, dropped, expired)")
+metrics.describe('circuit_state', "Stan circuit breakera backendu analizy (0 closed, 1 half_open, 2 open)")
+metrics.describe('circuit_transitions_total', "Zmiany stanu circuit breakera wg backendu")
+metrics.describe('circuit_rejected_total', "Zapytania odrzucone od razu przez otwarty breaker")
+metrics.describe('quality_gate_total', "Decyzje bramki jakości przed API (analyze, downgrade, reject, unchecked)")
+metrics.describe('quality_gate_reasons_total', "Powody bramki jakości (too_dark, blurry, no_sky)")
+metrics.describe('clip_frames_total', "Klatki wideo/animacji: przejrzane (sampled) i wysłane do analizy (keyframe)")
+metrics.describe('scheduler_jobs', "Aktywne harmonogramy alertów (z przyszłym terminem)")
+metrics.describe('scheduler_runs_total', "Wykonania harmonogramów wg rodzaju (sent, skipped, error, misfire)")
+metrics.describe('scheduler_lag_seconds', "Opóźnienie wykonania względem terminu harmonogramu")
+metrics.describe('jobs_claimed_total', "Zadania wzięte z kolejki (reclaimed=true - po wygasłej dzierżawie)")
+metrics.describe('jobs_lease_lost_total', "Wyniki odrzucone, bo dzierżawa wygasła i przejął ją inny worker")
+metrics.describe('alerts_deduplicated_total', "Alerty pominięte - ten sam klucz idempotencji wysłał już inny węzeł")
+metrics.describe('smtp_connections_total', "Nowe sesje SMTP (connect + TLS + AUTH) otwarte przez pulę")
+metrics.describe('smtp_reconnects_total', "Sesje SMTP zerwane w trakcie wysyłki i odtworzone")
+metrics.describe('email_digest_queued_total', "Alerty dodane do digestów email")
+metrics.describe('email_digest_sent_total', "Wysłane digesty email (jeden mail na odbiorcę)")
+metrics.describe('corpus_recorded_total', "Odpowiedzi API wizji zapisane do korpusu (VISION_CORPUS_MODE=record)")
+metrics.describe('corpus_replay_total', "Odtworzenia z korpusu wg wyniku (hit, stale - nagranie sprzed zmiany promptu, miss)")
+metrics.describe('sampler_latency_seconds', "Średni (EWMA) czas analizy jednego zdjęcia widziany przez sampler")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        registry = self.server.registry
+        if self.path.startswith('/metrics'):
+            body = registry.render_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path.startswith('/snapshot'):
+            body = json.dumps(registry.snapshot()).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int = 9108, host: str = "127.0.0.1",
+                         registry: MetricsRegistry = metrics) -> ThreadingHTTPServer:
+    """Uruchamia lokalny endpoint /metrics (Prometheus) i /snapshot (JSON) w wątku w tle"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Metrics endpoint started", extra={'url': f"http://{host}:{server.server_address[1]}/metrics"})
+    return server
+
+# Test function
+def test_metrics():
+    """Test metrics registry"""
+
+    print("📈 Testing Metrics...")
+
+    with metrics.timer('encode'):
+        time.sleep(0.01)
+    metrics.inc('analyses_total', source='openai_vision')
+    cost = metrics.record_openai_usage({'prompt_tokens': 1200, 'completion_tokens': 150})
+
+    mini_cost = metrics.record_openai_usage({'prompt_tokens': 1200, 'completion_tokens': 150},
+                                            model='gpt-4o-mini-2024-07-18')
+    assert mini_cost < cost
+
+    print(f"💰 Koszt zdjęcia: ${cost:.5f} (gpt-4o-mini: ${mini_cost:.5f})")
+    print(metrics.render_prometheus())
+
+if __name__ == "__main__":
+    test_metrics()
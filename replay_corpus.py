@@ -0,0 +1,128 @@
+"""
+WeatherEyes - Vision Corpus Replay CLI
+Przeliczenie nagranych odpowiedzi API (storage/corpus.py) po zmianie parsera, kalibracji
+albo agregacji - bez płatnych zapytań - i porównanie z raportem bazowym
+
+Nagrywanie:
+    VISION_CORPUS_MODE=record python batch_analyze.py data/event_images
+
+Użycie:
+    python replay_corpus.py stats
+    python replay_corpus.py replay --output baseline.json
+    python replay_corpus.py replay --output new.json --baseline baseline.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+# Add project path
+sys.path.append(str(Path(__file__).parent))
+
+from ai_model.openai_vision import OpenAIVisionAnalyzer
+from monitoring.build_info import git_commit
+from monitoring.log_config import setup_logging
+from storage.corpus import VISION_CORPUS_PATH, InteractionCorpus
+
+
+def replay(corpus: InteractionCorpus, analyzer: OpenAIVisionAnalyzer) -> Dict:
+    """Każde nagranie przez _parse_completion, potem podsumowanie sezonu"""
+    analyses = []
+    start = time.perf_counter()
+    for entry in corpus.entries():
+        analyses.append(analyzer.analyze_recorded(entry))
+    parse_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary = analyzer.get_weather_summary_from_images(analyses)
+    summary_s = time.perf_counter() - start
+
+    elapsed = parse_s + summary_s
+    return {
+        'replayed': len(analyses),
+        'text_fallbacks': sum(1 for a in analyses if a.get('source') == 'openai_vision_text'),
+        'elapsed_s': round(elapsed, 3),
+        'parse_s': round(parse_s, 3),
+        'summary_s': round(summary_s, 3),
+        'analyses_per_s': round(len(analyses) / elapsed, 1) if elapsed else None,
+        'recorded_cost_usd': round(sum(a.get('cost_usd', 0) for a in analyses), 4),
+        'summary': {key: summary.get(key) for key in
+                    ('dominant_weather', 'confidence', 'valid_analyses', 'posterior', 'posterior_confidence', 'error')
+                    if key in summary},
+        'distribution': {weather: info['count'] for weather, info in summary.get('weather_distribution', {}).items()},
+        'analyses': {a['replayed']['key']: [a.get('weather_condition'), round(a.get('confidence', 0), 4)]
+                     for a in analyses}
+    }
+
+
+def compare(current: Dict, baseline: Dict) -> Dict:
+    """Różnice względem raportu bazowego: zmienione warunki, pewność, wynik sezonu, przepustowość"""
+    before, after = baseline['analyses'], current['analyses']
+    common = before.keys() & after.keys()
+    changed = sorted(key for key in common if before[key][0] != after[key][0])
+    confidence_delta = [abs(after[key][1] - before[key][1]) for key in common]
+    throughput = baseline.get('analyses_per_s')
+    return {
+        'baseline_commit': baseline.get('commit'),
+        'common': len(common),
+        'only_in_baseline': len(before.keys() - after.keys()),
+        'only_in_current': len(after.keys() - before.keys()),
+        'condition_changed': len(changed),
+        'changed_examples': [{'key': key, 'before': before[key], 'after': after[key]} for key in changed[:20]],
+        'mean_abs_confidence_delta': round(sum(confidence_delta) / len(confidence_delta), 4)
+        if confidence_delta else None,
+        'dominant_before': baseline['summary'].get('dominant_weather'),
+        'dominant_after': current['summary'].get('dominant_weather'),
+        'throughput_ratio': round(current['analyses_per_s'] / throughput, 2)
+        if throughput and current.get('analyses_per_s') else None
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded vision API responses")
+    parser.add_argument('--corpus', default=VISION_CORPUS_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help="Rozmiar i zakres korpusu")
+    run = commands.add_parser('replay', help="Przelicza nagrania obecnym kodem")
+    run.add_argument('--output', default=None, help="Raport JSON (może być bazą następnego porównania)")
+    run.add_argument('--baseline', default=None, help="Raport JSON z wcześniejszego replay")
+    args = parser.parse_args(argv)
+
+    # Bez logu per analiza - przy replay liczy się przepustowość
+    setup_logging(level="WARNING", fmt="text")
+    if not Path(args.corpus).exists():
+        parser.error(f"Brak korpusu: {args.corpus} (nagraj z VISION_CORPUS_MODE=record)")
+    corpus = InteractionCorpus(args.corpus, mode='replay')
+
+    if args.command == 'stats':
+        print(json.dumps(corpus.stats(), indent=2, ensure_ascii=False))
+        corpus.close()
+        return 0
+
+    analyzer = OpenAIVisionAnalyzer(corpus=corpus)
+    report = dict({'commit': git_commit(), 'corpus': corpus.stats()}, **replay(corpus, analyzer))
+    corpus.close()
+
+    print(f"✅ Odtworzone: {report['replayed']} w {report['elapsed_s']} s ({report['analyses_per_s']}/s), "
+          f"fallback tekstowy: {report['text_fallbacks']}, koszt nagrań: ${report['recorded_cost_usd']}")
+    print(f"🌤️ Sezon: {report['summary'].get('dominant_weather')} {report['distribution']}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        report['comparison'] = compare(report, baseline)
+        comparison = report['comparison']
+        print(f"🔁 Vs {comparison['baseline_commit']}: zmieniony warunek {comparison['condition_changed']}/"
+              f"{comparison['common']}, średnia |Δ pewności| {comparison['mean_abs_confidence_delta']}, "
+              f"dominująca {comparison['dominant_before']} -> {comparison['dominant_after']}, "
+              f"przepustowość x{comparison['throughput_ratio']}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"📁 Raport zapisany: {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
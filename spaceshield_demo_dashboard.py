@@ -5,7 +5,6 @@ Mega prosty dashboard pokazujący cały workflow na żywo
 
 import streamlit as st
 import time
-import json
 from datetime import datetime
 from pathlib import Path
 import sys
@@ -15,7 +14,16 @@ import os
 sys.path.append(str(Path(__file__).parent))
 
 from ai_model.openai_vision import OpenAIVisionAnalyzer
+from ai_model.keyframes import VIDEO_SUFFIXES, analyze_media
 from bot.real_alerts import RealAlertSystem
+from storage.results_store import ResultsStore
+from monitoring.log_config import setup_logging
+
+# Zdjęcia oraz video Stories (wideo i animacje analizowane przez klatki kluczowe)
+MEDIA_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp'} | VIDEO_SUFFIXES
+
+# Logowanie przez kolejkę - analiza i alerty nie czekają na zapis do stderr
+setup_logging()
 
 # Page config
 st.set_page_config(
@@ -62,6 +70,11 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_results_store() -> ResultsStore:
+    """Jedno połączenie z bazą wyników na proces - wspólne dla odświeżeń i sesji Streamlit"""
+    return ResultsStore()
+
 def main():
     # Header
     st.markdown('<div class="big-title">🌤️ WeatherEyes - LIVE DEMO</div>', unsafe_allow_html=True)
@@ -97,7 +110,7 @@ def main():
     # Sprawdź prawdziwe zdjęcia z wydarzenia
     if event_dir.exists():
         for file_path in event_dir.iterdir():
-            if file_path.suffix.lower() in ['.jpg', '.jpeg', '.png', '.bmp', '.gif']:
+            if file_path.suffix.lower() in MEDIA_SUFFIXES:
                 images.append(str(file_path))
         if images:
             source_label = "SpaceShield Hackathon Event"
@@ -105,7 +118,7 @@ def main():
     # Jeśli brak prawdziwych, użyj demo
     if not images and demo_dir.exists():
         for file_path in demo_dir.iterdir():
-            if file_path.suffix.lower() in ['.jpg', '.jpeg', '.png', '.bmp', '.gif']:
+            if file_path.suffix.lower() in MEDIA_SUFFIXES:
                 images.append(str(file_path))
         if images:
             source_label = "Demo Images"
@@ -123,6 +136,10 @@ def main():
     st.sidebar.markdown(f"**Zdjęcia:** {len(images)} z {source_label}")
     st.sidebar.markdown(f"**Source:** {source_label}")
     
+    # Historia wyników z ostatnich 24h (bez ładowania całej bazy)
+    store = get_results_store()
+    st.sidebar.markdown(f"**Analizy (24h):** {store.count_analyses(since=datetime.now().timestamp() - 24 * 3600)}")
+    
     # Główny przycisk demo
     if st.button("🚀 START LIVE DEMO", type="primary", use_container_width=True):
         run_live_demo(images, api_key != 'demo_key')
@@ -145,7 +162,10 @@ def run_live_demo(images, use_real_api):
     for i, img_path in enumerate(images[:3]):
         with [col1, col2, col3][i]:
             try:
-                st.image(img_path, caption=f"Story {i+1}: {Path(img_path).name}", width=150)
+                if Path(img_path).suffix.lower() in VIDEO_SUFFIXES:
+                    st.video(img_path)
+                else:
+                    st.image(img_path, caption=f"Story {i+1}: {Path(img_path).name}", width=150)
             except:
                 st.write(f"📷 {Path(img_path).name}")
     
@@ -172,11 +192,15 @@ def run_live_demo(images, use_real_api):
     
     analysis_container = st.empty()
     
+    # Wyniki dopisywane na bieżąco do magazynu (append-only)
+    store = get_results_store()
+    
     for i, image_path in enumerate(images):
         analysis_container.markdown(f"🔍 Analyzing image {i+1}/{len(images)}: {Path(image_path).name}")
         
-        analysis = analyzer.analyze_image(image_path, context)
+        analysis = analyze_media(analyzer, image_path, context)
         analyses.append(analysis)
+        store.append_analysis(analysis)
         
         # Show intermediate result
         weather = analysis.get('weather_condition', 'unknown')
@@ -239,6 +263,7 @@ def run_live_demo(images, use_real_api):
             'message': f"Weather analysis from {summary['valid_analyses']} images shows {summary['dominant_weather']} conditions with {summary['confidence']:.1%} confidence."
         }
         alerts_generated.append(summary_alert)
+        store.append_alert(summary_alert)
         st.markdown("✅ Daily summary alert created")
     
     # Weather change alert (if multiple conditions)
@@ -256,6 +281,7 @@ def run_live_demo(images, use_real_api):
             'message': f"Weather conditions changed from {weather_types[0]} to {weather_types[1]} during SpaceShield event."
         }
         alerts_generated.append(change_alert)
+        store.append_alert(change_alert)
         st.markdown("✅ Weather change alert created")
     
     # Event alert
@@ -271,6 +297,7 @@ def run_live_demo(images, use_real_api):
         'message': f"Weather forecast for SpaceShield finale: {summary.get('dominant_weather', 'unknown')} conditions expected."
     }
     alerts_generated.append(event_alert)
+    store.append_alert(event_alert)
     st.markdown("✅ Event-specific alert created")
     
     st.markdown(f"**🎯 Generated {len(alerts_generated)} smart alerts**")
@@ -343,19 +370,15 @@ def run_live_demo(images, use_real_api):
         st.markdown('</div>', unsafe_allow_html=True)
     
     # Save results
-    results_file = Path("data/demo_results.json")
-    results_file.parent.mkdir(exist_ok=True)
-    
-    with open(results_file, 'w', encoding='utf-8') as f:
-        json.dump({
-            'summary': summary,
-            'alerts': alerts_generated,
-            'channels': channels,
-            'timestamp': datetime.now().isoformat(),
-            'api_mode': 'real' if use_real_api else 'demo'
-        }, f, indent=2, ensure_ascii=False)
-    
-    st.success(f"📁 Demo results saved to: {results_file}")
+    store.append_run({
+        'summary': summary,
+        'alerts': alerts_generated,
+        'channels': channels,
+        'timestamp': datetime.now().isoformat(),
+        'api_mode': 'real' if use_real_api else 'demo'
+    })
+    
+    st.success(f"📁 Demo results appended to: {store.db_path}")
     
     # Call to action
     st.markdown("---")
@@ -0,0 +1 @@
+# WeatherEyes Storage Module 
\ No newline at end of file
@@ -0,0 +1,342 @@
+"""
+Columnar Archive for WeatherEyes
+Długoterminowe archiwum analiz w kolumnach NumPy (.npy), partycje dzienne,
+odczyt przez memmap - zapytania o sezon bez ładowania i bez parsowania JSON
+"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python storage/archive.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_model.aggregation import CONDITION_CODES, CONDITIONS, UNKNOWN, AnalysisColumns, _epoch
+from ai_model.geo import GEOHASH_PRECISION
+from storage.results_store import ResultsStore, TimeBound, _to_epoch
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'data/archive')
+
+# Kolumna -> dtype; hour to godzina czasu lokalnego w chwili analizy (zapytania "o 18:00")
+COLUMNS = {
+    'timestamp': np.float64,
+    'condition': np.int8,
+    'confidence': np.float32,
+    'weight': np.float32,
+    'source': np.int16,
+    'cell': np.int32,
+    'place': np.int32,
+    'hour': np.int8
+}
+NO_LOCATION = -1
+
+
+def local_parts(timestamp: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Numer dnia i godzina w czasie lokalnym, wektorowo: przesunięcie strefy liczone
+    raz na pełną godzinę UTC (zmiany czasu zachodzą na granicach godzin)
+    """
+    utc_hours = np.floor_divide(timestamp, 3600).astype(np.int64)
+    unique_hours, inverse = np.unique(utc_hours, return_inverse=True)
+    offsets = np.fromiter((time.localtime(h * 3600).tm_gmtoff for h in unique_hours), np.int64, len(unique_hours))
+    local = timestamp + offsets[inverse]
+    return np.floor_divide(local, 86400).astype(np.int64), (np.floor_divide(local, 3600) % 24).astype(np.int8)
+
+
+def _day_name(day_index: int) -> str:
+    return str(np.datetime64(int(day_index), 'D'))
+
+
+class ColumnarArchive:
+    """
+    root/YYYY-MM-DD/<chunk>/<kolumna>.npy + root/dictionary.json (źródła, komórki geohash, nazwy miejsc).
+    Każdy zapis to nowy chunk, widoczny dopiero po atomowym rename katalogu,
+    więc czytelnik nigdy nie widzi połowy zapisu; compact() scala chunki dnia w jeden.
+    Jeden proces zapisujący na katalog, czytelników dowolnie wielu.
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._dictionary_path = self.root / "dictionary.json"
+        self.dictionary = {'sources': [], 'cells': [], 'places': [], 'last_store_id': 0}
+        if self._dictionary_path.exists():
+            self.dictionary.update(json.loads(self._dictionary_path.read_text(encoding='utf-8')))
+        self._codes = {name: {key: code for code, key in enumerate(self.dictionary[name])}
+                       for name in ('sources', 'cells', 'places')}
+
+    def _code(self, name: str, key: Optional[str]) -> int:
+        if not key:
+            return NO_LOCATION
+        code = self._codes[name].get(key)
+        if code is None:
+            code = self._codes[name][key] = len(self.dictionary[name])
+            self.dictionary[name].append(key)
+        return code
+
+    def _save_dictionary(self):
+        tmp = self._dictionary_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.dictionary, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, self._dictionary_path)
+
+    def _write_chunk(self, day: str, columns: Dict[str, np.ndarray]):
+        partition = self.root / day
+        partition.mkdir(exist_ok=True)
+        staging = partition / f".{uuid.uuid4().hex}"
+        staging.mkdir()
+        for name, dtype in COLUMNS.items():
+            np.save(staging / f"{name}.npy", np.ascontiguousarray(columns[name], dtype=dtype))
+        os.rename(staging, partition / f"{time.time_ns():020d}-{uuid.uuid4().hex[:6]}")
+
+    def append_columns(self, timestamp: np.ndarray, condition: np.ndarray, confidence: np.ndarray,
+                       source: np.ndarray, cell: Optional[np.ndarray] = None, place: Optional[np.ndarray] = None,
+                       weight: Optional[np.ndarray] = None) -> int:
+        """Dopisuje gotowe kolumny (kody wg self.dictionary), dzieląc je na partycje dzienne"""
+        count = len(timestamp)
+        if count == 0:
+            return 0
+        timestamp = np.asarray(timestamp, dtype=np.float64)
+        days, hours = local_parts(timestamp)
+        columns = {
+            'timestamp': timestamp,
+            'condition': condition,
+            'confidence': confidence,
+            'weight': np.ones(count, np.float32) if weight is None else weight,
+            'source': source,
+            'cell': np.full(count, NO_LOCATION, np.int32) if cell is None else cell,
+            'place': np.full(count, NO_LOCATION, np.int32) if place is None else place,
+            'hour': hours
+        }
+        columns = {name: np.asarray(values) for name, values in columns.items()}
+
+        order = np.argsort(days, kind='stable')
+        boundaries = np.flatnonzero(np.diff(days[order])) + 1
+        with self._lock:
+            self._save_dictionary()
+            for rows in np.split(order, boundaries):
+                self._write_chunk(_day_name(days[rows[0]]), {name: values[rows] for name, values in columns.items()})
+        return count
+
+    def append(self, analyses: Iterable[Dict]) -> int:
+        """Dopisuje wyniki analiz (słowniki z OpenAIVisionAnalyzer / ResultsStore)"""
+        analyses = [a for a in analyses if not np.isnan(_epoch(a.get('timestamp')))]
+        count = len(analyses)
+        with self._lock:
+            locations = [a.get('location') or {} for a in analyses]
+            cell = np.fromiter((self._code('cells', (loc.get('geohash') or '')[:GEOHASH_PRECISION])
+                                for loc in locations), np.int32, count)
+            place = np.fromiter((self._code('places', loc.get('name')) for loc in locations), np.int32, count)
+            source = np.fromiter((self._code('sources', a.get('source', 'unknown')) for a in analyses), np.int16, count)
+        return self.append_columns(
+            timestamp=np.fromiter((_epoch(a.get('timestamp')) for a in analyses), np.float64, count),
+            condition=np.fromiter((CONDITION_CODES.get(a.get('weather_condition'), UNKNOWN) for a in analyses),
+                                  np.int8, count),
+            confidence=np.fromiter((a.get('confidence', 0.0) or 0.0 for a in analyses), np.float32, count),
+            source=source, cell=cell, place=place,
+            weight=np.fromiter((a.get('sampling_weight', 1.0) for a in analyses), np.float32, count)
+        )
+
+    def import_results_store(self, store: ResultsStore, batch: int = 50_000) -> int:
+        """Dopisuje analizy z bazy wyników, których jeszcze nie ma (po id - ponowne wywołanie nic nie dubluje)"""
+        imported = 0
+        while True:
+            with store._lock:
+                rows = store.conn.execute(
+                    "SELECT id, ts, payload FROM analyses WHERE id > ? ORDER BY id LIMIT ?",
+                    (self.dictionary['last_store_id'], batch)).fetchall()
+            if not rows:
+                return imported
+            analyses = []
+            for _, ts, payload in rows:
+                analysis = json.loads(payload)
+                analysis.setdefault('timestamp', ts)
+                analyses.append(analysis)
+            imported += self.append(analyses)
+            # Znacznik przesuwany po zapisie chunków: awaria w środku = ponowny import partii, nie utrata
+            with self._lock:
+                self.dictionary['last_store_id'] = rows[-1][0]
+                self._save_dictionary()
+
+    @staticmethod
+    def _day_of(value: Optional[float]) -> Optional[str]:
+        return _day_name(local_parts(np.array([value], dtype=np.float64))[0][0]) if value is not None else None
+
+    def partitions(self, since: Optional[float] = None, until: Optional[float] = None) -> List[Path]:
+        """Katalogi dni przecinające [since, until) - przycinanie partycji po nazwie, bez czytania danych"""
+        first, last = self._day_of(since), self._day_of(until)
+        return [p for p in sorted(self.root.iterdir())
+                if p.is_dir() and not p.name.startswith('.')
+                and (first is None or p.name >= first) and (last is None or p.name <= last)]
+
+    @staticmethod
+    def _chunks(partition: Path) -> List[Path]:
+        return [c for c in sorted(partition.iterdir()) if c.is_dir() and not c.name.startswith('.')]
+
+    @staticmethod
+    def _load(chunk: Path, name: str) -> np.ndarray:
+        return np.load(os.path.join(str(chunk), f"{name}.npy"), mmap_mode='r')
+
+    def _location_codes(self, location: Union[str, Sequence[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Kody komórek (prefiks geohash) i miejsc (dokładna nazwa) pasujące do location"""
+        keys = [location] if isinstance(location, str) else list(location)
+        cells = [code for code, cell in enumerate(self.dictionary['cells']) if any(cell.startswith(k) for k in keys)]
+        places = [code for code, place in enumerate(self.dictionary['places']) if place in keys]
+        return np.array(cells, np.int32), np.array(places, np.int32)
+
+    def scan(self, since: TimeBound = None, until: TimeBound = None,
+             location: Union[str, Sequence[str], None] = None,
+             condition: Union[str, Sequence[str], None] = None,
+             hours: Optional[Sequence[int]] = None,
+             columns: Sequence[str] = ('condition', 'confidence', 'timestamp', 'source', 'weight')
+             ) -> Dict[str, np.ndarray]:
+        """
+        Pasujące wiersze wybranych kolumn. Maski liczone na memmapach, otwierane są tylko
+        kolumny potrzebne do filtrów i wyniku, a czas sprawdzany tylko w dniach na krańcach zakresu.
+        """
+        since, until = _to_epoch(since), _to_epoch(until)
+        first, last = self._day_of(since), self._day_of(until)
+        filters = []
+        if location is not None:
+            cells, places = self._location_codes(location)
+            filters.append(lambda data: np.isin(data('cell'), cells) | np.isin(data('place'), places))
+        if condition is not None:
+            names = [condition] if isinstance(condition, str) else condition
+            conditions = np.array([CONDITION_CODES.get(name, UNKNOWN) for name in names], np.int8)
+            filters.append(lambda data: np.isin(data('condition'), conditions))
+        if hours is not None:
+            wanted_hours = np.asarray(hours, np.int8)
+            filters.append(lambda data: np.isin(data('hour'), wanted_hours))
+
+        selected = {name: [] for name in columns}
+        for partition in self.partitions(since, until):
+            edge = partition.name in (first, last)
+            for chunk in self._chunks(partition):
+                opened = {}
+
+                def data(name: str, chunk: Path = chunk) -> np.ndarray:
+                    if name not in opened:
+                        opened[name] = self._load(chunk, name)
+                    return opened[name]
+
+                mask = None
+                if edge and since is not None:
+                    mask = data('timestamp') >= since
+                if edge and until is not None:
+                    mask = data('timestamp') < until if mask is None else mask & (data('timestamp') < until)
+                for keep in filters:
+                    mask = keep(data) if mask is None else mask & keep(data)
+                if mask is not None and not mask.any():
+                    continue
+                for name, parts in selected.items():
+                    parts.append(np.array(data(name) if mask is None else data(name)[mask]))
+
+        return {name: np.concatenate(parts) if parts else np.empty(0, COLUMNS[name])
+                for name, parts in selected.items()}
+
+    def query(self, since: TimeBound = None, until: TimeBound = None,
+              location: Union[str, Sequence[str], None] = None,
+              condition: Union[str, Sequence[str], None] = None,
+              hours: Optional[Sequence[int]] = None) -> AnalysisColumns:
+        """
+        Analizy z [since, until), dla lokalizacji (nazwa miejsca albo prefiks geohash),
+        warunku i godzin lokalnych. Wynik to AnalysisColumns - prosto do aggregate().
+        """
+        selected = self.scan(since, until, location, condition, hours)
+        result = AnalysisColumns(capacity=len(selected['timestamp']))
+        for source in self.dictionary['sources']:
+            result.source_code(source)
+        result.extend_arrays(**selected)
+        return result
+
+    def frequency(self, since: TimeBound = None, until: TimeBound = None,
+                  location: Union[str, Sequence[str], None] = None, hours: Optional[Sequence[int]] = None) -> Dict:
+        """Jak często był każdy warunek (np. deszcz na miejscu o 18:00 w sezonie) - liczby i udziały"""
+        condition = self.scan(since, until, location, hours=hours, columns=('condition',))['condition']
+        counts = np.bincount(condition[condition >= 0].astype(np.intp), minlength=len(CONDITIONS))
+        total = int(counts.sum())
+        return {
+            'total': total,
+            'counts': {name: int(count) for name, count in zip(CONDITIONS, counts) if count},
+            'shares': {name: round(float(count) / total, 4) for name, count in zip(CONDITIONS, counts) if count}
+        }
+
+    def compact(self) -> Dict:
+        """Scala chunki każdego dnia w jeden (posortowany po czasie) - mniej plików do otwarcia przy zapytaniu"""
+        merged = 0
+        with self._lock:
+            for partition in self.partitions():
+                chunks = self._chunks(partition)
+                if len(chunks) < 2:
+                    continue
+                columns = {name: np.concatenate([self._load(chunk, name) for chunk in chunks]) for name in COLUMNS}
+                order = np.argsort(columns['timestamp'], kind='stable')
+                self._write_chunk(partition.name, {name: values[order] for name, values in columns.items()})
+                for chunk in chunks:
+                    shutil.rmtree(chunk)
+                merged += len(chunks)
+        return {'chunks_merged': merged, 'partitions': len(self.partitions())}
+
+    def stats(self) -> Dict:
+        partitions = self.partitions()
+        rows = sum(len(self._load(chunk, 'timestamp'))
+                   for partition in partitions for chunk in self._chunks(partition))
+        size = sum(f.stat().st_size for f in self.root.rglob('*.npy'))
+        return {'rows': rows, 'partitions': len(partitions), 'size_bytes': size,
+                'first_day': partitions[0].name if partitions else None,
+                'last_day': partitions[-1].name if partitions else None}
+
+# Test function
+def test_archive():
+    """Test columnar archive"""
+
+    import tempfile
+    from ai_model.aggregation import aggregate
+
+    print("🗃️ Testing columnar archive...")
+
+    rng = np.random.default_rng(11)
+    n = 2_000_000
+    season_start = datetime(2026, 5, 1).timestamp()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = ColumnarArchive(tmp)
+        for source in ('openai_vision', 'demo_openai_vision'):
+            archive._code('sources', source)
+        for place in ('SHAMAN Event', 'Stadion'):
+            archive._code('places', place)
+
+        start = time.perf_counter()
+        archive.append_columns(
+            timestamp=season_start + rng.uniform(0, 120 * 86400, n),
+            condition=rng.choice(len(CONDITIONS), n, p=[0.25, 0.3, 0.25, 0.0, 0.05, 0.05, 0.1]).astype(np.int8),
+            confidence=rng.uniform(0.3, 0.95, n).astype(np.float32),
+            source=rng.integers(0, 2, n).astype(np.int16),
+            place=rng.integers(0, 2, n).astype(np.int32)
+        )
+        print(f"✅ Zapis {n} analiz: {(time.perf_counter() - start):.1f} s, {archive.stats()}")
+
+        # Nowy obiekt = zimny start: tylko dictionary.json i memmapy
+        start = time.perf_counter()
+        archive = ColumnarArchive(tmp)
+        result = archive.frequency(location='SHAMAN Event', hours=[18])
+        print(f"✅ 'SHAMAN Event' o 18:00 w sezonie ({result['total']} analiz) w "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms: deszcz {result['shares'].get('rainy', 0):.1%}")
+
+        start = time.perf_counter()
+        june = archive.query(since=datetime(2026, 6, 1), until=datetime(2026, 7, 1), condition=['rainy', 'stormy'])
+        print(f"✅ Czerwiec, rainy/stormy: {len(june)} analiz w {(time.perf_counter() - start) * 1000:.0f} ms")
+        print(f"📊 Posterior sezonu: {aggregate(archive.query(), half_life_s=None)['dominant_weather']}")
+
+if __name__ == "__main__":
+    test_archive()
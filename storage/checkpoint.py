@@ -0,0 +1,149 @@
+"""
+Batch Checkpoint for WeatherEyes
+Postęp przetwarzania wsadowego w tej samej bazie co wyniki - analiza
+i znacznik "zrobione" zapisywane w jednej transakcji
+"""
+
+import hashlib
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python storage/checkpoint.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from storage.results_store import ResultsStore
+
+
+def parse_shard(spec: Optional[str]) -> Tuple[int, int]:
+    """'i/N' -> (i, N); brak = (0, 1), czyli całość"""
+    if not spec:
+        return 0, 1
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Niepoprawny shard '{spec}' - oczekiwano i/N, np. 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Niepoprawny shard '{spec}' - wymagane 0 <= i < N")
+    return index, count
+
+
+def shard_of(key: str, count: int) -> int:
+    """
+    Stabilny przydział do sharda - hash klucza (ścieżki), a nie pozycja na liście,
+    więc dopisanie nowych zdjęć nie przesuwa już przydzielonych między maszynami
+    """
+    digest = hashlib.sha1(key.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+
+class BatchCheckpoint:
+    """
+    Stan każdego elementu zadania wsadowego: done / failed (z licznikiem prób) / deferred.
+    Zadanie identyfikuje `job` (np. katalog wejściowy + shard), więc kilka zadań
+    może dzielić jedną bazę. Zapis analizy i checkpointu to jedna transakcja -
+    po awarii nie ma ani wyniku bez znacznika, ani znacznika bez wyniku.
+    """
+
+    def __init__(self, store: ResultsStore, job: str):
+        self.store = store
+        self.job = job
+        with store.transaction() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS batch_items (
+                    job TEXT NOT NULL,
+                    item TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    analysis_id INTEGER,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (job, item)
+                );
+                CREATE INDEX IF NOT EXISTS idx_batch_items_status ON batch_items (job, status);
+            """)
+
+    def _upsert(self, conn, item: str, status: str, attempts_delta: int,
+                analysis_id: Optional[int] = None, error: Optional[str] = None):
+        conn.execute(
+            "INSERT INTO batch_items (job, item, status, attempts, analysis_id, error, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (job, item) DO UPDATE SET status = excluded.status, "
+            "attempts = attempts + ?, analysis_id = excluded.analysis_id, "
+            "error = excluded.error, updated_at = excluded.updated_at",
+            (self.job, item, status, attempts_delta, analysis_id, error, time.time(), attempts_delta)
+        )
+
+    def complete(self, item: str, analysis: Dict) -> int:
+        """Zapisuje analizę i oznacza element jako zrobiony (atomowo)"""
+        with self.store.transaction() as conn:
+            analysis_id = self.store.insert_analysis(conn, analysis)
+            self._upsert(conn, item, 'done', 1, analysis_id=analysis_id)
+        return analysis_id
+
+    def fail(self, item: str, error: str):
+        """Nieudana próba - element wróci przy wznowieniu, dopóki nie wyczerpie limitu prób"""
+        with self.store.transaction() as conn:
+            self._upsert(conn, item, 'failed', 1, error=error)
+
+    def defer(self, item: str, reason: str):
+        """Odłożony bez próby (np. budżet) - nie zużywa limitu prób"""
+        with self.store.transaction() as conn:
+            self._upsert(conn, item, 'deferred', 0, error=reason)
+
+    def finished(self, max_attempts: Optional[int] = None) -> Set[str]:
+        """Elementy do pominięcia: zrobione oraz te, które wyczerpały limit prób"""
+        sql = "SELECT item FROM batch_items WHERE job = ? AND (status = 'done'"
+        params: List = [self.job]
+        if max_attempts is not None:
+            sql += " OR (status = 'failed' AND attempts >= ?)"
+            params.append(max_attempts)
+        with self.store.transaction() as conn:
+            return {row[0] for row in conn.execute(sql + ")", params)}
+
+    def pending(self, items: Iterable[str], max_attempts: Optional[int] = None) -> List[str]:
+        """Elementy z listy, które trzeba jeszcze przetworzyć (kolejność zachowana)"""
+        skip = self.finished(max_attempts)
+        return [item for item in items if item not in skip]
+
+    def stats(self) -> Dict[str, int]:
+        with self.store.transaction() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM batch_items WHERE job = ? GROUP BY status",
+                                (self.job,)).fetchall()
+        return {status: count for status, count in rows}
+
+    def reset(self, status: Optional[str] = None) -> int:
+        """Czyści stan zadania (albo tylko elementy o danym statusie, np. 'failed')"""
+        sql, params = "DELETE FROM batch_items WHERE job = ?", [self.job]
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        with self.store.transaction() as conn:
+            return conn.execute(sql, params).rowcount
+
+# Test function
+def test_checkpoint():
+    """Test batch checkpoint"""
+
+    print("📌 Testing Batch Checkpoint...")
+
+    store = ResultsStore("data/test_results.db")
+    checkpoint = BatchCheckpoint(store, job="test")
+    checkpoint.reset()
+
+    items = [f"img_{i}.jpg" for i in range(10)]
+    mine = [item for item in items if shard_of(item, 2) == parse_shard("0/2")[0]]
+    for item in mine[:3]:
+        checkpoint.complete(item, {'weather_condition': 'sunny', 'confidence': 0.9, 'image_path': item})
+    if len(mine) > 3:
+        checkpoint.fail(mine[3], "timeout")
+
+    print(f"✅ Shard 0/2: {len(mine)} z {len(items)}")
+    print(f"✅ Do wznowienia: {checkpoint.pending(mine, max_attempts=1)}")
+    print(f"📊 {checkpoint.stats()}")
+    store.close()
+
+if __name__ == "__main__":
+    test_checkpoint()
@@ -0,0 +1,256 @@
+"""
+Vision Interaction Corpus for WeatherEyes
+Nagrania odpowiedzi API wizji (VISION_CORPUS_MODE=record) w skompresowanym korpusie SQLite
+i ich odtwarzanie (replay) przez parsowanie i agregację bez płatnych zapytań
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python storage/corpus.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.metrics import metrics
+
+# off | record (zapis każdej udanej odpowiedzi) | replay (odpowiedzi z korpusu zamiast API)
+VISION_CORPUS_MODE = os.getenv('VISION_CORPUS_MODE', 'off')
+VISION_CORPUS_PATH = os.getenv('VISION_CORPUS_PATH', 'data/vision_corpus.db')
+
+CORPUS_MODES = ('off', 'record', 'replay')
+
+# Słownik wstępny zlib: powtarzalne fragmenty odpowiedzi chat/completions - małe rekordy
+# kompresują się kilka razy lepiej niż bez niego. Zmiana treści = nowy kodek (stare rekordy czytelne).
+_ZDICT_V1 = json.dumps({
+    "id": "chatcmpl-", "object": "chat.completion", "created": 0, "model": "gpt-4o-2024-08-06",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": (
+        '```json\n{\n  "weather_condition": "sunny", "cloudy", "rainy", "snow", "stormy", "foggy", "clear",\n'
+        '  "confidence": 0.85,\n  "description": "Niebo jest zachmurzone, widoczne są ciemne chmury",\n'
+        '  "details": {\n    "sky_condition": "partly cloudy",\n    "visibility": "good",\n'
+        '    "precipitation": "none",\n    "lighting": "natural daylight"\n  },\n'
+        '  "reasoning": "Na zdjęciu widać niebo, słońce, deszcz, mgłę i cienie"\n}\n```'),
+        "refusal": None}, "logprobs": None, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+              "prompt_tokens_details": {"cached_tokens": 0, "audio_tokens": 0},
+              "completion_tokens_details": {"reasoning_tokens": 0}},
+    "system_fingerprint": "fp_"
+}, ensure_ascii=False).encode('utf-8')
+_ZDICTS = {'zlib-d1': _ZDICT_V1}
+CODEC = 'zlib-d1'
+
+
+def _compress(data: bytes, codec: str = CODEC) -> bytes:
+    compressor = zlib.compressobj(level=9, zdict=_ZDICTS[codec])
+    return compressor.compress(data) + compressor.flush()
+
+
+def _decompress(blob: bytes, codec: str) -> bytes:
+    if codec == 'zlib':
+        return zlib.decompress(blob)
+    decompressor = zlib.decompressobj(zdict=_ZDICTS[codec])
+    return decompressor.decompress(blob) + decompressor.flush()
+
+
+def file_digest(path: str) -> Optional[str]:
+    """sha256 treści zdjęcia (ta sama treść pod inną ścieżką = ta sama odpowiedź); None bez pliku"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _texts(payload: Dict) -> Tuple[List[str], str]:
+    """(wszystkie teksty wiadomości, teksty użytkownika) - bez zdjęcia, detail i max_tokens"""
+    texts, user = [], []
+    for message in payload.get('messages', []):
+        content = message.get('content')
+        parts = [content] if isinstance(content, str) else [
+            part.get('text', '') for part in content or [] if part.get('type') == 'text']
+        texts += [f"{message.get('role')}:{text}" for text in parts]
+        if message.get('role') == 'user':
+            user += parts
+    return texts, '\n'.join(user)
+
+
+def request_fingerprint(payload: Dict) -> Tuple[str, str]:
+    """
+    (kontekst, odcisk promptu). Kontekst (tekst użytkownika) wchodzi do klucza nagrania,
+    odcisk całego promptu pozwala w replay wykryć nagrania sprzed zmiany instrukcji.
+    """
+    texts, context = _texts(payload)
+    return context, hashlib.sha1('\n'.join(texts).encode('utf-8')).hexdigest()
+
+
+def _key(image_digest: str, context: str) -> str:
+    return hashlib.sha1(f"{image_digest}\n{context}".encode('utf-8')).hexdigest()
+
+
+class InteractionCorpus:
+    """
+    Korpus nagranych odpowiedzi: klucz = treść zdjęcia + kontekst, wartość = pełna
+    odpowiedź chat/completions (z usage) skompresowana zlib ze słownikiem.
+    Replay podaje ją z powrotem do _parse_completion - parser, kalibracja i agregacja
+    liczą się lokalnie, więc sezon danych przelicza się w sekundach.
+    """
+
+    def __init__(self, db_path: str = VISION_CORPUS_PATH, mode: str = 'record'):
+        if mode not in CORPUS_MODES:
+            raise ValueError(f"Unknown corpus mode: {mode}")
+        self.mode = mode
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS interactions (
+                    key TEXT PRIMARY KEY,
+                    image_digest TEXT NOT NULL,
+                    image_path TEXT NOT NULL,
+                    context TEXT NOT NULL,
+                    prompt_fp TEXT NOT NULL,
+                    model TEXT,
+                    codec TEXT NOT NULL,
+                    raw_size INTEGER NOT NULL,
+                    response BLOB NOT NULL,
+                    recorded_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_interactions_path ON interactions (image_path, context);
+            """)
+
+    @classmethod
+    def from_env(cls) -> Optional['InteractionCorpus']:
+        """Korpus wg VISION_CORPUS_MODE / VISION_CORPUS_PATH (None przy 'off')"""
+        if VISION_CORPUS_MODE == 'off':
+            return None
+        return cls(VISION_CORPUS_PATH, VISION_CORPUS_MODE)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == 'record'
+
+    def record(self, image_path: str, payload: Dict, response: Dict, model: Optional[str] = None,
+               recorded_at: Optional[float] = None) -> Optional[str]:
+        """Zapisuje odpowiedź (nowsze nagranie tego samego klucza zastępuje starsze); zwraca klucz"""
+        image_digest = file_digest(image_path)
+        if image_digest is None:
+            return None
+        context, prompt_fp = request_fingerprint(payload)
+        raw = json.dumps(response, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        key = _key(image_digest, context)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO interactions (key, image_digest, image_path, context, prompt_fp, model, "
+                "codec, raw_size, response, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, image_digest, str(image_path), context, prompt_fp, model or payload.get('model'),
+                 CODEC, len(raw), _compress(raw), recorded_at if recorded_at is not None else time.time())
+            )
+        metrics.inc('corpus_recorded_total')
+        return key
+
+    def _entry(self, row) -> Dict:
+        key, image_digest, image_path, context, prompt_fp, model, codec, blob, recorded_at = row
+        return {'key': key, 'image_digest': image_digest, 'image_path': image_path, 'context': context,
+                'prompt_fp': prompt_fp, 'model': model, 'recorded_at': recorded_at,
+                'response': json.loads(_decompress(blob, codec))}
+
+    _COLUMNS = "key, image_digest, image_path, context, prompt_fp, model, codec, response, recorded_at"
+
+    def lookup(self, image_path: str, payload: Dict) -> Optional[Dict]:
+        """
+        Nagranie dla zdjęcia i zapytania: po treści pliku, a gdy pliku już nie ma - po ścieżce.
+        'stale' = nagranie sprzed zmiany promptu (odpowiedź dotyczy starych instrukcji).
+        """
+        context, prompt_fp = request_fingerprint(payload)
+        image_digest = file_digest(image_path)
+        with self._lock:
+            if image_digest is not None:
+                row = self.conn.execute(f"SELECT {self._COLUMNS} FROM interactions WHERE key = ?",
+                                        (_key(image_digest, context),)).fetchone()
+            else:
+                row = self.conn.execute(
+                    f"SELECT {self._COLUMNS} FROM interactions WHERE image_path = ? AND context = ? "
+                    "ORDER BY recorded_at DESC LIMIT 1", (str(image_path), context)).fetchone()
+        if row is None:
+            metrics.inc('corpus_replay_total', outcome='miss')
+            return None
+        entry = self._entry(row)
+        entry['stale'] = entry['prompt_fp'] != prompt_fp
+        metrics.inc('corpus_replay_total', outcome='stale' if entry['stale'] else 'hit')
+        return entry
+
+    def entries(self, batch_size: int = 1000) -> Iterator[Dict]:
+        """Wszystkie nagrania w kolejności nagrania (partiami - bez ładowania całego korpusu)"""
+        last = (float('-inf'), '')
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT {self._COLUMNS} FROM interactions WHERE (recorded_at, key) > (?, ?) "
+                    "ORDER BY recorded_at, key LIMIT ?", (*last, batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._entry(row)
+            last = (rows[-1][-1], rows[-1][0])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, raw, stored, first, last = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(LENGTH(response)), 0), "
+                "MIN(recorded_at), MAX(recorded_at) FROM interactions").fetchone()
+        return {'interactions': count, 'raw_bytes': raw, 'stored_bytes': stored,
+                'compression_ratio': round(raw / stored, 2) if stored else None,
+                'first_recorded_at': first, 'last_recorded_at': last, 'path': str(self.db_path)}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+# Test function
+def test_corpus():
+    """Test record/replay corpus"""
+
+    import tempfile
+
+    print("🎞️ Testing vision corpus...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image = Path(tmp) / "sky.jpg"
+        image.write_bytes(b"\xff\xd8 fake jpeg")
+        payload = {'model': 'gpt-4o', 'messages': [
+            {'role': 'system', 'content': 'Instrukcje'},
+            {'role': 'user', 'content': [{'type': 'text', 'text': 'Dodatkowy kontekst: Stadion'},
+                                         {'type': 'image_url', 'image_url': {'url': '...', 'detail': 'high'}}]}]}
+        response = {'choices': [{'message': {'content': '{"weather_condition": "rainy", "confidence": 0.8}'}}],
+                    'usage': {'prompt_tokens': 900, 'completion_tokens': 60}}
+
+        corpus = InteractionCorpus(str(Path(tmp) / "corpus.db"))
+        corpus.record(str(image), payload, response)
+        entry = corpus.lookup(str(image), payload)
+        print(f"✅ Odtworzona odpowiedź: {entry['response'] == response}, stale: {entry['stale']}")
+        changed = dict(payload, messages=[{'role': 'system', 'content': 'Nowe instrukcje'}] + payload['messages'][1:])
+        print(f"✅ Po zmianie promptu stale: {corpus.lookup(str(image), changed)['stale']}")
+        print(f"📊 {corpus.stats()}")
+        corpus.close()
+
+if __name__ == "__main__":
+    test_corpus()
@@ -0,0 +1,375 @@
+"""
+Distributed Jobs for WeatherEyes
+Wspólna tabela zadań dla wielu maszyn: zdjęcie bierze worker z czasową dzierżawą
+(lease) odnawianą heartbeatem, wygasłe dzierżawy wracają do puli, a alerty
+są deduplikowane kluczem idempotencji - dwa węzły nie robią tej samej pracy
+"""
+
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+if __name__ == "__main__":
+    # Uruchomienie jako skrypt (python storage/jobs.py) - katalog projektu na sys.path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.metrics import metrics
+from monitoring.log_config import get_logger
+from storage.results_store import ResultsStore
+
+logger = get_logger(__name__)
+
+JOBS_BACKEND_URL = os.getenv('JOBS_BACKEND_URL', 'sqlite:///data/jobs.db')
+# WAL wymaga pamięci współdzielonej - na wolumenie sieciowym (NFS/SMB) ustaw DELETE
+JOBS_SQLITE_JOURNAL = os.getenv('JOBS_SQLITE_JOURNAL', 'WAL')
+JOB_LEASE_S = float(os.getenv('JOB_LEASE_S', '120'))
+JOB_POLL_S = float(os.getenv('JOB_POLL_S', '5'))
+JOB_RETRY_DELAY_S = float(os.getenv('JOB_RETRY_DELAY_S', '30'))
+JOB_DEFER_DELAY_S = float(os.getenv('JOB_DEFER_DELAY_S', '300'))
+ALERT_DEDUP_WINDOW_S = float(os.getenv('ALERT_DEDUP_WINDOW_S', '900'))
+
+PRIORITIES = {'low': 0, 'normal': 1, 'high': 2}
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+
+
+def idempotency_key(*parts) -> str:
+    """
+    Klucz z treści alertu (bez znaczników czasu): ten sam alert z dwóch węzłów ma ten sam klucz.
+    Okno deduplikacji to TTL klucza w claim_once (przesuwne, np. ALERT_DEDUP_WINDOW_S) -
+    bez kubełków czasu, więc alerty po dwóch stronach granicy okna też są duplikatami.
+    """
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+class JobBackend:
+    """
+    Interfejs backendu kolejki (SQLite poniżej; inny backend - np. Postgres/Redis -
+    implementuje te same metody). Każda zmiana stanu zadania po claim() wymaga
+    tokenu dzierżawy: worker, któremu dzierżawa wygasła i została przejęta,
+    nie nadpisze wyniku nowego właściciela.
+    """
+
+    def enqueue(self, queue: str, items: Iterable[Dict]) -> int:
+        """Dodaje zadania {'key', ...}; istniejące klucze są pomijane. Zwraca liczbę nowych"""
+        raise NotImplementedError
+
+    def claim(self, queue: str, worker: str, lease_s: float, max_attempts: int) -> Optional[Dict]:
+        """Bierze jedno zadanie (oczekujące albo z wygasłą dzierżawą): {'key', 'payload', 'token', 'attempts'}"""
+        raise NotImplementedError
+
+    def renew(self, queue: str, worker: str, lease_s: float) -> int:
+        """Przedłuża wszystkie dzierżawy workera; zwraca ich liczbę"""
+        raise NotImplementedError
+
+    def finish(self, queue: str, key: str, token: int, status: str, result: Optional[Dict] = None,
+               error: Optional[str] = None, attempt_used: bool = True, delay_s: float = 0.0) -> bool:
+        """status: done / failed / pending (ponowienie najwcześniej po delay_s). False = dzierżawa utracona"""
+        raise NotImplementedError
+
+    def stats(self, queue: str) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def claim_once(self, key: str, owner: str, ttl_s: float) -> bool:
+        """Rezerwuje klucz idempotencji; False = ktoś już go użył (przed upływem ttl_s)"""
+        raise NotImplementedError
+
+    def renew_claim(self, key: str, owner: str, ttl_s: float) -> bool:
+        """Ustawia ważność klucza właściciela na ttl_s od teraz; False = klucz nie należy do owner"""
+        raise NotImplementedError
+
+    def release_claim(self, key: str, owner: str) -> bool:
+        """Zwalnia klucz właściciela (np. wysyłka się nie udała) - następna próba może go zająć"""
+        raise NotImplementedError
+
+
+class SQLiteJobBackend(JobBackend):
+    """
+    Tabela zadań w pliku SQLite (np. na współdzielonym wolumenie).
+    Zmiany w transakcjach BEGIN IMMEDIATE - blokada zapisu jest brana od razu,
+    więc dwóch workerów nie weźmie tego samego zadania.
+    """
+
+    def __init__(self, db_path: str = "data/jobs.db", journal_mode: str = JOBS_SQLITE_JOURNAL):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self._write() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    queue TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 1,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    owner TEXT,
+                    token INTEGER NOT NULL DEFAULT 0,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (queue, key)
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (queue, status, priority)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )""")
+
+    @contextmanager
+    def _write(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def enqueue(self, queue: str, items: Iterable[Dict]) -> int:
+        now = time.time()
+        rows = [(queue, item['key'], json.dumps(item, ensure_ascii=False),
+                 PRIORITIES.get(item.get('priority', 'normal'), 1), now) for item in items]
+        with self._write() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (queue, key, payload, priority, updated_at) VALUES (?, ?, ?, ?, ?)", rows)
+            return conn.total_changes - before
+
+    def claim(self, queue: str, worker: str, lease_s: float, max_attempts: int) -> Optional[Dict]:
+        now = time.time()
+        with self._write() as conn:
+            # Wygasła dzierżawa po ostatniej próbie (worker padał na tym zdjęciu) - nie w kółko
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', owner = NULL, error = 'lease expired', updated_at = ? "
+                "WHERE queue = ? AND status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, queue, now, max_attempts))
+            row = conn.execute(
+                "SELECT key, payload, status FROM jobs WHERE queue = ? AND "
+                "((status = 'pending' AND available_at <= ?) OR (status = 'leased' AND lease_until < ?)) "
+                "ORDER BY priority DESC, rowid LIMIT 1", (queue, now, now)).fetchone()
+            if row is None:
+                return None
+            key, payload, status = row
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', owner = ?, token = token + 1, attempts = attempts + 1, "
+                "lease_until = ?, updated_at = ? WHERE queue = ? AND key = ?",
+                (worker, now + lease_s, now, queue, key))
+            token, attempts = conn.execute("SELECT token, attempts FROM jobs WHERE queue = ? AND key = ?",
+                                           (queue, key)).fetchone()
+        metrics.inc('jobs_claimed_total', reclaimed=str(status == 'leased').lower())
+        return {'key': key, 'payload': json.loads(payload), 'token': token, 'attempts': attempts}
+
+    def renew(self, queue: str, worker: str, lease_s: float) -> int:
+        now = time.time()
+        with self._write() as conn:
+            return conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? "
+                "WHERE queue = ? AND owner = ? AND status = 'leased' AND lease_until >= ?",
+                (now + lease_s, now, queue, worker, now)).rowcount
+
+    def finish(self, queue: str, key: str, token: int, status: str, result: Optional[Dict] = None,
+               error: Optional[str] = None, attempt_used: bool = True, delay_s: float = 0.0) -> bool:
+        now = time.time()
+        with self._write() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, result = ?, error = ?, "
+                "attempts = attempts - ?, available_at = ?, updated_at = ? "
+                "WHERE queue = ? AND key = ? AND token = ? AND status = 'leased'",
+                (status, json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                 error, 0 if attempt_used else 1, now + delay_s, now, queue, key, token)).rowcount
+        if not updated:
+            metrics.inc('jobs_lease_lost_total')
+        return bool(updated)
+
+    def stats(self, queue: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs WHERE queue = ? GROUP BY status",
+                                     (queue,)).fetchall()
+        return {status: count for status, count in rows}
+
+    def claim_once(self, key: str, owner: str, ttl_s: float) -> bool:
+        now = time.time()
+        with self._write() as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND expires_at < ?", (key, now))
+            return conn.execute("INSERT OR IGNORE INTO idempotency_keys (key, owner, expires_at) VALUES (?, ?, ?)",
+                                (key, owner, now + ttl_s)).rowcount > 0
+
+    def renew_claim(self, key: str, owner: str, ttl_s: float) -> bool:
+        with self._write() as conn:
+            return conn.execute("UPDATE idempotency_keys SET expires_at = ? WHERE key = ? AND owner = ?",
+                                (time.time() + ttl_s, key, owner)).rowcount > 0
+
+    def release_claim(self, key: str, owner: str) -> bool:
+        with self._write() as conn:
+            return conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND owner = ?",
+                                (key, owner)).rowcount > 0
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def open_backend(url: str = JOBS_BACKEND_URL) -> JobBackend:
+    """'sqlite:///ścieżka' albo sama ścieżka pliku"""
+    if url.startswith('sqlite:///'):
+        return SQLiteJobBackend(url[len('sqlite:///'):])
+    if '://' not in url:
+        return SQLiteJobBackend(url)
+    raise ValueError(f"Nieobsługiwany backend zadań: {url} (dostępny: sqlite:///ścieżka)")
+
+
+class WorkerSession:
+    """
+    Worker jednego węzła dla kolejki `queue`: claims() bierze zadania po jednym,
+    wątek heartbeat odnawia dzierżawy co lease_s/3. Interfejs complete/fail/defer
+    jak BatchCheckpoint, więc batch_analyze.run_batch działa bez zmian.
+    Wynik trafia do lokalnej bazy wyników tylko wtedy, gdy dzierżawa nadal należy do tego workera.
+    """
+
+    def __init__(self, backend: JobBackend, queue: str, store: Optional[ResultsStore] = None,
+                 worker_id: Optional[str] = None, lease_s: float = JOB_LEASE_S,
+                 max_attempts: int = 3, poll_s: float = JOB_POLL_S):
+        self.backend = backend
+        self.queue = queue
+        self.job = queue
+        self.store = store
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.poll_s = poll_s
+        self._leases: Dict[str, Dict] = {}
+        self._stopped = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'WorkerSession':
+        self._heartbeat = threading.Thread(target=self._renew_loop, name=f"lease-heartbeat-{self.worker_id}",
+                                           daemon=True)
+        self._heartbeat.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopped.set()
+        self._heartbeat.join(timeout=5)
+
+    def _renew_loop(self):
+        while not self._stopped.wait(self.lease_s / 3):
+            if self._leases:
+                try:
+                    self.backend.renew(self.queue, self.worker_id, self.lease_s)
+                except sqlite3.Error:
+                    logger.exception("Lease renewal failed", extra={'worker': self.worker_id})
+
+    def claims(self) -> Iterator[Dict]:
+        """
+        Zadania do zrobienia teraz (element jak z discover_items); kończy się, gdy nie ma
+        czego wziąć. Dzierżawy innych workerów mogą jeszcze wygasnąć - patrz drained().
+        """
+        while not self._stopped.is_set():
+            job = self.backend.claim(self.queue, self.worker_id, self.lease_s, self.max_attempts)
+            if job is None:
+                return
+            self._leases[job['key']] = job
+            yield dict(job['payload'], key=job['key'])
+
+    def drained(self) -> bool:
+        """Nic nie czeka i nikt nie trzyma dzierżawy - kolejka skończona"""
+        stats = self.backend.stats(self.queue)
+        return not stats.get('pending') and not stats.get('leased')
+
+    def _finish(self, item: str, status: str, **kwargs) -> bool:
+        lease = self._leases.pop(item, None)
+        if lease is None:
+            return False
+        if not self.backend.finish(self.queue, item, lease['token'], status, **kwargs):
+            logger.warning("Lease lost - result discarded", extra={'worker': self.worker_id, 'item': item})
+            return False
+        return True
+
+    def complete(self, item: str, analysis: Dict) -> Optional[int]:
+        if self._finish(item, 'done', result=analysis) and self.store is not None:
+            return self.store.append_analysis(analysis)
+        return None
+
+    def fail(self, item: str, error: str):
+        """Ponowienie przez dowolny węzeł, dopóki zadanie nie wyczerpie limitu prób"""
+        attempts = self._leases.get(item, {}).get('attempts', self.max_attempts)
+        if attempts < self.max_attempts:
+            self._finish(item, 'pending', error=error, delay_s=JOB_RETRY_DELAY_S)
+        else:
+            self._finish(item, 'failed', error=error)
+
+    def defer(self, item: str, reason: str):
+        """Z powrotem do puli bez zużycia próby (np. budżet), dostępne po JOB_DEFER_DELAY_S"""
+        self._finish(item, 'pending', error=reason, attempt_used=False, delay_s=JOB_DEFER_DELAY_S)
+
+    def stats(self) -> Dict[str, int]:
+        return self.backend.stats(self.queue)
+
+# Test function
+def test_jobs():
+    """Test lease-based job claiming"""
+
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    print("🧾 Testing distributed jobs...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/jobs.db"
+        backend = open_backend(url)
+        items = [{'key': f"img_{i}.jpg", 'image_path': f"img_{i}.jpg"} for i in range(40)]
+        print(f"✅ Dodane: {backend.enqueue('event', items)}, ponownie: {backend.enqueue('event', items[:5])}")
+
+        # Worker, który padł z dzierżawą - zadanie wraca do puli po lease_s
+        lost = backend.claim('event', 'crashed-node', lease_s=0.2, max_attempts=3)
+
+        def node(name: str) -> List[str]:
+            done = []
+            with WorkerSession(open_backend(url), 'event', worker_id=name, lease_s=1) as session:
+                while not session.drained():
+                    for item in session.claims():
+                        time.sleep(0.01)
+                        session.complete(item['key'], {'weather_condition': 'sunny', 'image_path': item['image_path']})
+                        done.append(item['key'])
+                    time.sleep(0.1)
+            return done
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(node, [f"node-{i}" for i in range(4)]))
+
+        all_done = [key for done in results for key in done]
+        print(f"✅ Węzły: {[len(done) for done in results]}, razem {len(all_done)}, "
+              f"unikalne {len(set(all_done))}, przejęte po awarii: {lost['key'] in all_done}")
+        print(f"✅ Spóźniony wynik padniętego węzła odrzucony: "
+              f"{not backend.finish('event', lost['key'], lost['token'], 'done')}")
+        print(f"📊 {backend.stats('event')}")
+
+        key = idempotency_key('daily_summary', 'SHAMAN Event', '12.07.2026')
+        print(f"✅ Idempotencja alertu: node-1 {backend.claim_once(key, 'node-1', 3600)}, "
+              f"node-2 {backend.claim_once(key, 'node-2', 3600)}")
+        assert not backend.release_claim(key, 'node-2') and backend.release_claim(key, 'node-1')
+        print(f"✅ Po zwolnieniu (nieudana wysyłka) node-2 zajmuje klucz: {backend.claim_once(key, 'node-2', 60)}")
+        backend.close()
+
+if __name__ == "__main__":
+    test_jobs()
@@ -0,0 +1,230 @@
+"""
+Results Store for WeatherEyes
+Append-only magazyn wyników analiz i alertów (SQLite w trybie WAL)
+"""
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+TimeBound = Union[datetime, float, str, None]
+
+
+def _to_epoch(value: TimeBound) -> Optional[float]:
+    """Zamienia datetime / ISO string / epoch na epoch (float)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+def _dumps(obj: Dict) -> str:
+    """Kompaktowy JSON (bez wcięć i zbędnych spacji)"""
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class ResultsStore:
+    """
+    Dopisuje każdą analizę i każdy alert w momencie ich powstania.
+    Każdy zapis to osobna transakcja SQLite, więc przerwany proces nie zostawia
+    uszkodzonego pliku, a WAL pozwala czytać dane równolegle z zapisem.
+    """
+
+    def __init__(self, db_path: str = "data/weathereyes_results.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS analyses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts REAL NOT NULL,
+                    weather_condition TEXT,
+                    confidence REAL,
+                    image_path TEXT,
+                    source TEXT,
+                    payload TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_analyses_ts ON analyses (ts);
+                CREATE INDEX IF NOT EXISTS idx_analyses_condition_ts ON analyses (weather_condition, ts);
+
+                CREATE TABLE IF NOT EXISTS alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts REAL NOT NULL,
+                    alert_type TEXT,
+                    payload TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts (ts);
+                CREATE INDEX IF NOT EXISTS idx_alerts_type_ts ON alerts (alert_type, ts);
+
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts REAL NOT NULL,
+                    payload TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_runs_ts ON runs (ts);
+            """)
+
+    def _insert(self, sql: str, params: tuple) -> int:
+        with self._lock, self.conn:
+            cursor = self.conn.execute(sql, params)
+            return cursor.lastrowid
+
+    @contextmanager
+    def transaction(self):
+        """Połączenie w jednej transakcji (pod blokadą) - kilka zapisów atomowo"""
+        with self._lock, self.conn:
+            yield self.conn
+
+    @staticmethod
+    def insert_analysis(conn: sqlite3.Connection, analysis: Dict) -> int:
+        ts = _to_epoch(analysis.get('timestamp')) or datetime.now().timestamp()
+        cursor = conn.execute(
+            "INSERT INTO analyses (ts, weather_condition, confidence, image_path, source, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (ts, analysis.get('weather_condition'), analysis.get('confidence'),
+             analysis.get('image_path'), analysis.get('source'), _dumps(analysis))
+        )
+        return cursor.lastrowid
+
+    def append_analysis(self, analysis: Dict) -> int:
+        """Dopisuje pojedynczą analizę zdjęcia"""
+        with self.transaction() as conn:
+            return self.insert_analysis(conn, analysis)
+
+    def append_alert(self, alert: Dict) -> int:
+        """Dopisuje pojedynczy alert"""
+        ts = _to_epoch(alert.get('timestamp')) or datetime.now().timestamp()
+        return self._insert(
+            "INSERT INTO alerts (ts, alert_type, payload) VALUES (?, ?, ?)",
+            (ts, alert.get('type'), _dumps(alert))
+        )
+
+    def append_run(self, run: Dict) -> int:
+        """Dopisuje podsumowanie całego przebiegu (np. demo)"""
+        ts = _to_epoch(run.get('timestamp')) or datetime.now().timestamp()
+        return self._insert("INSERT INTO runs (ts, payload) VALUES (?, ?)", (ts, _dumps(run)))
+
+    def _query(self, table: str, filters: Dict[str, Optional[str]], since: TimeBound,
+               until: TimeBound, limit: Optional[int]) -> List[Dict]:
+        clauses, params = [], []
+        for column, value in filters.items():
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(_to_epoch(since))
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(_to_epoch(until))
+
+        sql = f"SELECT payload FROM {table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY ts DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def query_analyses(self, since: TimeBound = None, until: TimeBound = None,
+                       condition: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Zwraca analizy z zakresu czasu (najnowsze pierwsze), opcjonalnie dla jednej pogody"""
+        return self._query('analyses', {'weather_condition': condition}, since, until, limit)
+
+    def query_alerts(self, since: TimeBound = None, until: TimeBound = None,
+                     alert_type: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Zwraca alerty z zakresu czasu (najnowsze pierwsze)"""
+        return self._query('alerts', {'alert_type': alert_type}, since, until, limit)
+
+    def query_runs(self, limit: Optional[int] = 10) -> List[Dict]:
+        """Zwraca ostatnie podsumowania przebiegów"""
+        return self._query('runs', {}, None, None, limit)
+
+    def recent_analyses(self, hours: float = 24, condition: Optional[str] = None) -> List[Dict]:
+        """Analizy z ostatnich N godzin"""
+        return self.query_analyses(since=datetime.now() - timedelta(hours=hours), condition=condition)
+
+    def count_analyses(self, since: TimeBound = None, condition: Optional[str] = None) -> int:
+        """Liczy analizy bez ładowania ich treści"""
+        sql, params = "SELECT COUNT(*) FROM analyses WHERE 1=1", []
+        if since is not None:
+            sql += " AND ts >= ?"
+            params.append(_to_epoch(since))
+        if condition is not None:
+            sql += " AND weather_condition = ?"
+            params.append(condition)
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()[0]
+
+    def compact(self, keep_days: Optional[float] = 30, archive=None) -> Dict:
+        """
+        Usuwa wpisy starsze niż keep_days, przenosi WAL do pliku bazy
+        i odzyskuje miejsce na dysku. Z archive (storage.archive.ColumnarArchive)
+        analizy są najpierw dopisywane do archiwum kolumnowego, więc historia nie przepada.
+        """
+        removed = {}
+        archived = archive.import_results_store(self) if archive is not None else None
+        with self._lock:
+            if keep_days is not None:
+                cutoff = (datetime.now() - timedelta(days=keep_days)).timestamp()
+                with self.conn:
+                    for table in ('analyses', 'alerts', 'runs'):
+                        cursor = self.conn.execute(f"DELETE FROM {table} WHERE ts < ?", (cutoff,))
+                        removed[table] = cursor.rowcount
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.execute("VACUUM")
+
+        return {
+            'removed': removed,
+            'archived': archived,
+            'size_bytes': self.db_path.stat().st_size,
+            'timestamp': datetime.now().isoformat()
+        }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+# Test function
+def test_results_store():
+    """Test results store"""
+
+    print("🗄️ Testing Results Store...")
+
+    store = ResultsStore("data/test_results.db")
+    store.append_analysis({
+        'weather_condition': 'sunny',
+        'confidence': 0.91,
+        'image_path': 'demo_sunny.jpg',
+        'source': 'demo_openai_vision',
+        'timestamp': datetime.now().isoformat()
+    })
+    store.append_alert({'type': 'daily_summary', 'timestamp': datetime.now().isoformat()})
+
+    print(f"✅ Analizy (24h): {len(store.recent_analyses(24))}")
+    print(f"✅ Słoneczne: {store.count_analyses(condition='sunny')}")
+    print(f"✅ Alerty: {len(store.query_alerts(alert_type='daily_summary'))}")
+    print(f"🧹 Kompaktowanie: {store.compact(keep_days=30)}")
+    store.close()
+
+if __name__ == "__main__":
+    test_results_store()